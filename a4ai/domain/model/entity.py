@@ -1,5 +1,6 @@
 from infrastructure.errors.exceptions import ConsistencyError
 from a4ai.domain.model.events import DomainEvent
+from utility.mutators import validated_by_replay
 
 
 # =======================================================================================
@@ -46,6 +47,8 @@ class Entity(object):
         return self._version
 
     def validate_event_originator(self, event):
+        if validated_by_replay():  # replay validates every event at once before applying them
+            return
         if event.originator_id != self.id:
             raise ConsistencyError("Event originator id mismatch: {} != {}".
                                    format(event.originator_id, self.id))
@@ -0,0 +1,264 @@
+__author__ = 'Herminio'
+
+import numpy
+
+from a4ai.domain.model.observation.statistics import Statistics
+
+
+class ColumnarObservations(object):
+    """
+    Observations stored by columns in NumPy arrays, values are float64 and categorical attributes are dictionary
+    encoded, i.e.: an integer array of codes plus the list of labels
+
+    Attributes:
+        values (numpy.ndarray): Observation values, unknown ones are NaN
+        mask (numpy.ndarray): True for unknown (blank) values
+        area_types (numpy.ndarray): Area type code of each observation
+        area_type_labels (list of str): Area type for each code
+        indicators (numpy.ndarray): Indicator code of each observation
+        indicator_labels (list of str): Indicator for each code
+        years (numpy.ndarray): Year code of each observation
+        year_labels (list of str): Year for each code
+    """
+
+    def __init__(self, values, area_types, indicators, years):
+        """
+        Constructor for ColumnarObservations, columns are given as plain sequences of the same length
+
+        Args:
+            values (list): Observation values, "" or None for unknown values
+            area_types (list of str): Area type of each observation
+            indicators (list of str): Indicator of each observation
+            years (list of str): Year of each observation
+        """
+        self.mask = numpy.array([value == "" or value is None for value in values], dtype=bool)
+        self.values = numpy.array([numpy.nan if unknown else value for value, unknown in zip(values, self.mask)],
+                                  dtype=numpy.float64)
+        self.area_types, self.area_type_labels = _encode(area_types)
+        self.indicators, self.indicator_labels = _encode(indicators)
+        self.years, self.year_labels = _encode(years)
+
+    @classmethod
+    def from_observations(cls, observations):
+        """
+        Builds the columns from Observation entities
+
+        Args:
+            observations (list of Observation): Observations to store
+
+        Returns:
+            ColumnarObservations: The observations by columns
+        """
+        return cls(values=[obs.value for obs in observations], area_types=[obs.area_type for obs in observations],
+                   indicators=[obs.indicator for obs in observations], years=[obs.year for obs in observations])
+
+    @classmethod
+    def from_arrays(cls, values, mask, area_types, area_type_labels, indicators, indicator_labels, years,
+                    year_labels):
+        """
+        Wraps columns that are already encoded, e.g.: the ones of a memory-mapped snapshot, arrays are not copied
+
+        Args:
+            values (numpy.ndarray): Observation values as float64
+            mask (numpy.ndarray): True for unknown values
+            area_types (numpy.ndarray): Area type code of each observation
+            area_type_labels (list of str): Area type for each code
+            indicators (numpy.ndarray): Indicator code of each observation
+            indicator_labels (list of str): Indicator for each code
+            years (numpy.ndarray): Year code of each observation
+            year_labels (list of str): Year for each code
+
+        Returns:
+            ColumnarObservations: The observations by columns
+        """
+        columns = cls.__new__(cls)
+        columns.values, columns.mask = values, mask
+        columns.area_types, columns.area_type_labels = area_types, list(area_type_labels)
+        columns.indicators, columns.indicator_labels = indicators, list(indicator_labels)
+        columns.years, columns.year_labels = years, list(year_labels)
+        return columns
+
+    def __len__(self):
+        return len(self.values)
+
+    def statistics(self):
+        """
+        Returns the statistics of every observation
+
+        Returns:
+            ColumnarStatistics: Statistics of all the observations
+        """
+        return ColumnarStatistics(self)
+
+    def statistics_by_indicator_and_year(self):
+        """
+        Computes the statistics of every indicator and year at once
+
+        Returns:
+            dict: (indicator, year) to the statistics dictionary, as Statistics.to_dict returns it
+        """
+        groups = self.indicators * len(self.year_labels) + self.years
+        known = ~self.mask
+        by_group = {}
+
+        for prefix, rows in [("", known)] + [("_" + area_type.lower(), known & self.area_type_rows(area_type))
+                                             for area_type in [Statistics.DEVELOPING, Statistics.EMERGING]]:
+            for group, aggregates in _grouped_aggregates(groups[rows], self.values[rows]).items():
+                group_statistics = by_group.setdefault(group, _empty_statistics())
+                group_statistics["average" + prefix] = aggregates["average"]
+                group_statistics["median" + prefix] = aggregates["median"]
+                if prefix == "":
+                    group_statistics["max"] = aggregates["max"]
+                    group_statistics["min"] = aggregates["min"]
+
+        result = {}
+        for group in numpy.unique(groups):
+            indicator, year = divmod(int(group), len(self.year_labels))
+            result[(self.indicator_labels[indicator], self.year_labels[year])] = \
+                by_group.get(int(group), _empty_statistics())
+        return result
+
+    def area_type_rows(self, area_type):
+        if area_type not in self.area_type_labels:
+            return numpy.zeros(len(self.values), dtype=bool)
+        return self.area_types == self.area_type_labels.index(area_type)
+
+
+class ColumnarStatistics(object):
+    """
+    Statistics entity computed with vectorized operations over ColumnarObservations, it offers the same attributes
+    and dictionary representation as Statistics
+
+    Attributes:
+        average (float): Average value for given observations
+        median (float): Median value for given observations
+        average_developing (float): Average value for developing areas observations
+        average_emerging (float): Average value for emerging areas observations
+        median_developing (float): Median value for developing areas observations
+        median_emerging (float): Median value for emerging areas observations
+        max (float): Max value for given observations
+        min (float): Min value for given observations
+    """
+
+    def __init__(self, columns):
+        """
+        Constructor for ColumnarStatistics
+
+        Args:
+            columns (ColumnarObservations or list of Observation): Observations to calculate the statistics
+        """
+        if not isinstance(columns, ColumnarObservations):
+            columns = ColumnarObservations.from_observations(columns)
+        known = ~columns.mask
+        self._values = columns.values[known]
+        self._developing = columns.values[known & columns.area_type_rows(Statistics.DEVELOPING)]
+        self._emerging = columns.values[known & columns.area_type_rows(Statistics.EMERGING)]
+
+    @property
+    def average(self):
+        return _average(self._values)
+
+    @property
+    def median(self):
+        return _median(self._values)
+
+    @property
+    def average_developing(self):
+        return _average(self._developing)
+
+    @property
+    def median_developing(self):
+        return _median(self._developing)
+
+    @property
+    def average_emerging(self):
+        return _average(self._emerging)
+
+    @property
+    def median_emerging(self):
+        return _median(self._emerging)
+
+    @property
+    def max(self):
+        return float(self._values.max()) if len(self._values) > 0 else 0
+
+    @property
+    def min(self):
+        return float(self._values.min()) if len(self._values) > 0 else 0
+
+    def to_dict(self):
+        """
+        Converts self object to dictionary
+
+        Returns:
+            dict: Dictionary representation of self object
+        """
+        return {
+            'average': self.average,
+            'median': self.median,
+            'average_developing': self.average_developing,
+            'median_developing': self.median_developing,
+            'average_emerging': self.average_emerging,
+            'median_emerging': self.median_emerging,
+            'max': self.max,
+            'min': self.min
+        }
+
+
+def _average(values):
+    return float(values.mean()) if len(values) > 0 else 0
+
+
+def _median(values):
+    return float(numpy.median(values)) if len(values) > 0 else 0
+
+
+def _empty_statistics():
+    return dict((key, 0) for key in ['average', 'median', 'average_developing', 'median_developing',
+                                     'average_emerging', 'median_emerging', 'max', 'min'])
+
+
+def _encode(labels):
+    """
+    Dictionary encodes a sequence of labels
+
+    Returns:
+        (numpy.ndarray, list): Code of each label and the label of each code
+    """
+    codes, encoded = {}, []
+    for label in labels:
+        encoded.append(codes.setdefault(label, len(codes)))
+    decoded = [None] * len(codes)
+    for label, code in codes.items():
+        decoded[code] = label
+    return numpy.array(encoded, dtype=numpy.int64), decoded
+
+
+def _grouped_aggregates(groups, values):
+    """
+    Computes average, median, max and min of the values of every group in a single sort
+
+    Args:
+        groups (numpy.ndarray): Group of each value
+        values (numpy.ndarray): Values, without unknown ones
+
+    Returns:
+        dict: Group to a dictionary with average, median, max and min
+    """
+    if len(values) == 0:
+        return {}
+
+    order = numpy.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    starts = numpy.concatenate(([0], numpy.flatnonzero(groups[1:] != groups[:-1]) + 1))
+    counts = numpy.diff(numpy.concatenate((starts, [len(values)])))
+    ends = starts + counts
+
+    averages = numpy.add.reduceat(values, starts) / counts
+    lower_middle = starts + (counts - 1) // 2
+    upper_middle = starts + counts // 2
+    medians = (values[lower_middle] + values[upper_middle]) / 2.0
+
+    return dict((int(groups[start]), {"average": float(average), "median": float(median),
+                                      "max": float(values[end - 1]), "min": float(values[start])})
+                for start, end, average, median in zip(starts, ends, averages, medians))
@@ -0,0 +1,132 @@
+__author__ = 'Herminio'
+
+import math
+
+
+class GroupedStatistics(object):
+    """
+    Grouped statistics entity, statistics of the observations split by several group keys at once, e.g.: by
+    continent and by year, computed in a single scan over the observations
+
+    Attributes:
+        group_by (tuple of str): Group keys, some of GROUP_KEYS
+        percentiles (tuple of int): Percentiles calculated for each group, from 0 to 100
+    """
+    CONTINENT = "continent"
+    INCOME = "income"
+    AREA_TYPE = "area_type"
+    YEAR = "year"
+    GROUP_KEYS = (CONTINENT, INCOME, AREA_TYPE, YEAR)
+    PERCENTILES = (25, 75)
+
+    def __init__(self, records, group_by=GROUP_KEYS, percentiles=PERCENTILES):
+        """
+        Constructor for GroupedStatistics
+
+        Args:
+            records (iterable of dict): Observation records with value and one value for each group key, records
+                with blank value are not considered in calculation as in Statistics
+            group_by (tuple of str, optional): Group keys, default to GROUP_KEYS
+            percentiles (tuple of int, optional): Percentiles to calculate, default to PERCENTILES
+
+        Raises:
+            ValueError: If any group key is not one of GROUP_KEYS or any percentile is out of range
+        """
+        for key in group_by:
+            if key not in self.GROUP_KEYS:
+                raise ValueError("Unknown group key %s, valid ones are %s" % (key, ", ".join(self.GROUP_KEYS)))
+        for percent in percentiles:
+            if not 0 <= percent <= 100:
+                raise ValueError("Percentile %s out of range [0, 100]" % percent)
+
+        self.group_by = tuple(group_by)
+        self.percentiles = tuple(percentiles)
+        self._values = dict((key, {}) for key in self.group_by)
+
+        for record in records:
+            value = record["value"]
+            if value == "" or value is None:  # avoids unknown values
+                continue
+            for key in self.group_by:
+                self._values[key].setdefault(record.get(key), []).append(value)
+
+    @classmethod
+    def from_observations(cls, observations, incomes=None, group_by=GROUP_KEYS, percentiles=PERCENTILES):
+        """
+        Builds the grouped statistics from Observation entities
+
+        Args:
+            observations (list of Observation): Observations to calculate the statistics
+            incomes (dict, optional): Area iso3 code to income, needed to group by income as observations do not
+                store it
+            group_by (tuple of str, optional): Group keys, default to GROUP_KEYS
+            percentiles (tuple of int, optional): Percentiles to calculate, default to PERCENTILES
+
+        Returns:
+            GroupedStatistics: Statistics of the observations
+        """
+        incomes = {} if incomes is None else incomes
+        records = ({"value": obs.value, cls.CONTINENT: obs.continent, cls.INCOME: incomes.get(obs.area),
+                    cls.AREA_TYPE: obs.area_type, cls.YEAR: obs.year} for obs in observations)
+        return cls(records, group_by=group_by, percentiles=percentiles)
+
+    def groups(self, key):
+        """
+        Returns the statistics of every group of a group key
+
+        Args:
+            key (str): Group key, one of group_by
+
+        Returns:
+            dict: Group value to the dictionary of its statistics
+        """
+        return dict((group, self._statistics(values)) for group, values in self._values[key].items())
+
+    def to_dict(self):
+        """
+        Converts self object to dictionary
+
+        Returns:
+            dict: Group key to the statistics of each of its groups, e.g.: {"year": {"2014": {"average": ...}}}
+        """
+        return dict((key, self.groups(key)) for key in self.group_by)
+
+    def _statistics(self, values):
+        """
+        Calculates the statistics of the values of one group
+
+        Args:
+            values (list of float): Known values of the group
+
+        Returns:
+            dict: Count, average, median, standard deviation, max, min and percentiles of the values
+        """
+        values = sorted(values)
+        count = len(values)
+        average = math.fsum(values) / count
+        return {
+            'count': count,
+            'average': average,
+            'median': _percentile(values, 50),
+            'std_dev': math.sqrt(math.fsum((value - average) ** 2 for value in values) / count),
+            'max': values[-1],
+            'min': values[0],
+            'percentiles': dict((percent, _percentile(values, percent)) for percent in self.percentiles)
+        }
+
+
+def _percentile(values, percent):
+    """
+    Calculates a percentile interpolating linearly between the closest ranks
+
+    Args:
+        values (list of float): Sorted values, at least one
+        percent (int): Percentile, from 0 to 100
+
+    Returns:
+        float: Percentile of the values
+    """
+    rank = (len(values) - 1) * percent / 100.0
+    lower = int(math.floor(rank))
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
@@ -0,0 +1,135 @@
+__author__ = 'Herminio'
+
+import numpy
+
+
+class TimeSeries(object):
+    """
+    Time series entity, values of one indicator for several areas along every year, stored as an areas by years
+    NumPy matrix, so changes and tendencies of every area are computed at once
+
+    Note:
+        The previous value of an observation is the one of the closest previous year with a known value, so blank
+        values do not break the series. Observations without a known value or without a previous one have no change
+        and tendency 0.
+
+    Attributes:
+        areas (list of str): Area of each row
+        years (list of str): Year of each column, in ascending order
+        values (numpy.ndarray): Value of each area and year, NaN if unknown
+        previous_values (numpy.ndarray): Previous known value of each area and year, NaN if there is not any
+        changes (numpy.ndarray): Year over year change of each area and year, NaN if unknown
+        tendencies (numpy.ndarray): Tendency of each area and year, -1 decreasing, 0 equal, +1 increasing
+    """
+
+    def __init__(self, areas, years, values):
+        """
+        Constructor for TimeSeries, observations are given as columns of the same length
+
+        Args:
+            areas (list of str): Area of each observation
+            years (list of str): Year of each observation
+            values (list): Value of each observation, "" or None for unknown values
+        """
+        self.areas = sorted(set(areas))
+        self.years = sorted(set(years))
+        self._area_rows = dict((area, row) for row, area in enumerate(self.areas))
+        self._year_columns = dict((year, column) for column, year in enumerate(self.years))
+
+        self.values = numpy.full((len(self.areas), len(self.years)), numpy.nan)
+        rows = numpy.array([self._area_rows[area] for area in areas], dtype=numpy.int64)
+        columns = numpy.array([self._year_columns[year] for year in years], dtype=numpy.int64)
+        self.values[rows, columns] = [numpy.nan if value == "" or value is None else value for value in values]
+
+        # Column of the last known value up to each year, -1 if there is not any
+        known = ~numpy.isnan(self.values)
+        last_known = numpy.maximum.accumulate(numpy.where(known, numpy.arange(len(self.years)), -1), axis=1)
+        previous_column = numpy.hstack((numpy.full((len(self.areas), 1), -1, dtype=last_known.dtype),
+                                        last_known[:, :-1]))
+
+        self.previous_values = numpy.where(previous_column >= 0,
+                                           self.values[numpy.arange(len(self.areas))[:, None],
+                                                       numpy.maximum(previous_column, 0)],
+                                           numpy.nan)
+        self.changes = self.values - self.previous_values
+        self.tendencies = numpy.sign(numpy.nan_to_num(self.changes)).astype(numpy.int64)
+
+    def __len__(self):
+        return len(self.areas)
+
+    def tendency(self, area, year):
+        """
+        Returns the tendency of an area in a year
+
+        Args:
+            area (str): Area code
+            year (str): Year
+
+        Returns:
+            int: -1 decreasing, 0 equal, +1 increasing, 0 if the area or year are not in the series
+        """
+        position = self._position(area, year)
+        return 0 if position is None else int(self.tendencies[position])
+
+    def change(self, area, year):
+        """
+        Returns the year over year change of an area in a year
+
+        Args:
+            area (str): Area code
+            year (str): Year
+
+        Returns:
+            float: Change regarding the previous known value, None if unknown
+        """
+        position = self._position(area, year)
+        return None if position is None else _known(self.changes[position])
+
+    def previous_value(self, area, year):
+        """
+        Returns the previous known value of an area before a year
+
+        Args:
+            area (str): Area code
+            year (str): Year
+
+        Returns:
+            float: Value of the closest previous year with a known value, None if there is not any
+        """
+        position = self._position(area, year)
+        return None if position is None else _known(self.previous_values[position])
+
+    def series(self, area):
+        """
+        Returns the series of an area
+
+        Args:
+            area (str): Area code
+
+        Returns:
+            list of dict: Year, value, previous value, change and tendency of each year, None for unknown figures
+        """
+        row = self._area_rows.get(area)
+        if row is None:
+            return []
+        return [{'year': year, 'value': _known(self.values[row, column]),
+                 'previous_value': _known(self.previous_values[row, column]),
+                 'change': _known(self.changes[row, column]), 'tendency': int(self.tendencies[row, column])}
+                for column, year in enumerate(self.years)]
+
+    def to_dict(self):
+        """
+        Converts self object to dictionary
+
+        Returns:
+            dict: Area to its series
+        """
+        return dict((area, self.series(area)) for area in self.areas)
+
+    def _position(self, area, year):
+        row, column = self._area_rows.get(area), self._year_columns.get(year)
+        return None if row is None or column is None else (row, column)
+
+
+def _known(value):
+    return None if numpy.isnan(value) else float(value)
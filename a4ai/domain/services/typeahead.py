@@ -0,0 +1,68 @@
+__author__ = 'Herminio'
+
+import re
+from bisect import bisect_left
+
+from utility.text import fold, split_aliases
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class AreaTypeahead(object):
+    """
+    In-memory prefix index of areas for typeahead suggestions, areas are found by any word prefix of their name,
+    short name or search aliases, case and accent insensitive
+
+    Note:
+        Keys are kept in one sorted list, so the keys starting with a prefix are contiguous and found by binary
+        search without scanning the areas
+    """
+
+    def __init__(self, areas):
+        """
+        Constructor for AreaTypeahead
+
+        Args:
+            areas (list of Area): Areas to suggest, their order is the order of suggestions for equal keys
+        """
+        self._areas = list(areas)
+        entries = set()
+
+        for position, area in enumerate(self._areas):
+            for name in [area.name, area.short_name] + split_aliases(area.search):
+                key = fold(name) or u""
+                for word in _WORD.finditer(key):  # from every word, e.g.: "korea" for "Republic of Korea"
+                    entries.add((key[word.start():], position))
+
+        entries = sorted(entries)
+        self._keys = [key for key, _ in entries]
+        self._positions = [position for _, position in entries]
+
+    def __len__(self):
+        return len(self._areas)
+
+    def suggest(self, prefix, limit=10):
+        """
+        Returns the areas with a name starting with the given prefix
+
+        Args:
+            prefix (str): Text typed so far
+            limit (int, optional): Maximum number of suggestions, default to 10
+
+        Returns:
+            list of Area: Matching areas, shortest matching names first
+        """
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+
+        matches = {}
+        index = bisect_left(self._keys, prefix)
+        while index < len(self._keys) and self._keys[index].startswith(prefix):
+            position = self._positions[index]
+            matches[position] = min(matches.get(position, len(self._keys[index])), len(self._keys[index]))
+            index += 1
+
+        best = sorted(matches, key=lambda position: (matches[position], position))[:limit]
+        return [self._areas[position] for position in best]
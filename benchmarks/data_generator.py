@@ -0,0 +1,165 @@
+__author__ = 'Herminio'
+
+import random
+import string
+
+from infrastructure.mongo_repos.indexes import ensure_indexes
+
+CONTINENTS = [("AFR", "Africa"), ("AME", "Americas"), ("ASI", "Asia"), ("EUR", "Europe"), ("OCE", "Oceania")]
+INCOMES = ["LIC", "LMC", "UMC", "HIC"]
+AREA_TYPES = ["Developing", "Emerging"]
+SUBINDEXES = ["INFRASTRUCTURE", "ACCESS", "AFFORDABILITY"]
+URL_ROOT = "http://localhost/api/"
+
+
+def generate_areas(num_countries, rnd):
+    """
+    Generates continents and countries shaped like the documents of the areas collection
+
+    Args:
+        num_countries (int): Number of countries to generate, continents are always generated
+        rnd (Random): Random generator to use
+
+    Returns:
+        list of dict: Area documents, continents first
+    """
+    areas = []
+    for iso3, name in CONTINENTS:
+        areas.append({"iso3": iso3, "iso2": None, "iso_num": None, "name": name, "short_name": name,
+                      "area": None, "income": None, "type": None, "search": name})
+
+    used_codes = set(iso3 for iso3, _ in CONTINENTS)
+    for i in range(num_countries):
+        iso3 = _unique_code(rnd, 3, used_codes)
+        name = "Country %s" % iso3
+        areas.append({"iso3": iso3, "iso2": iso3[:2] + str(i % 10), "iso_num": str(i), "name": name,
+                      "short_name": name, "area": CONTINENTS[i % len(CONTINENTS)][0],
+                      "income": rnd.choice(INCOMES), "type": rnd.choice(AREA_TYPES),
+                      "search": "%s;Pais %s;Pays %s" % (name, iso3, iso3)})
+    return areas
+
+
+def generate_indicators(num_indicators):
+    """
+    Generates an indicator hierarchy (one index, some subindexes and primary or secondary indicators) shaped like
+    the documents built by IndicatorRepository.insert_indicator
+
+    Args:
+        num_indicators (int): Total number of indicators to generate
+
+    Returns:
+        list of dict: Indicator documents
+    """
+    indicators = [_indicator_document("INDEX", "Index", None, None)]
+    for subindex in SUBINDEXES:
+        indicators.append(_indicator_document(subindex, "SubIndex", "INDEX", None))
+
+    for i in range(max(num_indicators - len(indicators), 0)):
+        _type = "Primary" if i % 2 == 0 else "Secondary"
+        indicators.append(_indicator_document("IND_%03d" % i, _type, "INDEX", SUBINDEXES[i % len(SUBINDEXES)]))
+    return indicators
+
+
+def generate_observations(areas, indicators, years, rnd, blank_ratio=0.05):
+    """
+    Generates one observation per country, indicator and year shaped like the documents built by
+    ObservationRepository.insert_observation, ranking computed per indicator and year
+
+    Args:
+        areas (list of dict): Area documents, only countries get observations
+        indicators (list of dict): Indicator documents
+        years (list of str): Years to generate
+        rnd (Random): Random generator to use
+        blank_ratio (float, optional): Ratio of observations with an unknown ("") value
+
+    Returns:
+        generator of dict: Observation documents
+    """
+    countries = [area for area in areas if area["area"] is not None]
+    for indicator in indicators:
+        for year in years:
+            values = [("" if rnd.random() < blank_ratio else round(rnd.random() * 100, 2), country)
+                      for country in countries]
+            ranked = sorted([pair for pair in values if pair[0] != ""], key=lambda pair: -pair[0])
+            rankings = dict((pair[1]["iso3"], position + 1) for position, pair in enumerate(ranked))
+            for value, country in values:
+                yield {
+                    "area": country["iso3"], "area_name": country["name"], "short_name": country["short_name"],
+                    "continent": country["area"], "area_type": country["type"],
+                    "indicator": indicator["indicator"], "indicator_name": indicator["name"],
+                    "indicator_type": indicator["type"], "value": value, "year": year,
+                    "uri": "%sobservations/%s/%s/%s" % (URL_ROOT, indicator["indicator"], country["iso3"], year),
+                    "republish": True, "provider_name": indicator["provider_name"],
+                    "provider_url": indicator["provider_url"], "ranking": rankings.get(country["iso3"]),
+                    "ranking_type": None
+                }
+
+
+def seed_database(db, num_countries=200, num_indicators=100, num_years=10, seed=42, chunk_size=5000):
+    """
+    Drops and fills areas, indicators and observations collections with synthetic data and builds their indexes.
+    Default sizes are the production ones: about 200 areas x 100 indicators x 10 years
+
+    Args:
+        db (Database): Database handle to seed
+        num_countries (int, optional): Number of countries
+        num_indicators (int, optional): Number of indicators
+        num_years (int, optional): Number of years, ending in 2014
+        seed (int, optional): Seed for the random generator, same seed gives same data
+        chunk_size (int, optional): Number of observations per insert
+
+    Returns:
+        dict: Number of documents inserted per collection
+    """
+    rnd = random.Random(seed)
+    years = [str(year) for year in range(2015 - num_years, 2015)]
+    areas = generate_areas(num_countries, rnd)
+    indicators = generate_indicators(num_indicators)
+
+    for collection in ["areas", "indicators", "observations"]:
+        db[collection].drop()
+
+    db["areas"].insert(areas)
+    db["indicators"].insert(indicators)
+
+    total, chunk = 0, []
+    for observation in generate_observations(areas, indicators, years, rnd):
+        chunk.append(observation)
+        if len(chunk) == chunk_size:
+            db["observations"].insert(chunk)
+            total, chunk = total + len(chunk), []
+    if len(chunk) > 0:
+        db["observations"].insert(chunk)
+        total += len(chunk)
+
+    _enrich_countries_info(db, areas, indicators[:10], years[-1], rnd)
+    ensure_indexes(db)
+
+    return {"areas": len(areas), "indicators": len(indicators), "observations": total, "years": years}
+
+
+def _enrich_countries_info(db, areas, indicators, year, rnd):
+    for area in areas:
+        if area["area"] is None:
+            continue
+        info = dict((indicator["indicator"], {
+            "year": year, "value": round(rnd.random() * 100, 2),
+            "provider": {"name": indicator["provider_name"], "url": indicator["provider_url"]}
+        }) for indicator in indicators)
+        db["areas"].update({"iso3": area["iso3"]}, {"$set": {"info": info}})
+
+
+def _indicator_document(code, _type, index, subindex):
+    return {"indicator": code, "name": code.replace("_", " ").title(), "description": "Synthetic " + code,
+            "type": _type, "index": index, "subindex": subindex, "parent": subindex,
+            "uri": "%sindicators/%s" % (URL_ROOT, code), "republish": True,
+            "provider_name": "WF (Web Foundation)", "provider_url": "http://webfoundation.org/",
+            "is_percentage": False, "scale": None}
+
+
+def _unique_code(rnd, length, used_codes):
+    while True:
+        code = "".join(rnd.choice(string.ascii_uppercase) for _ in range(length))
+        if code not in used_codes:
+            used_codes.add(code)
+            return code
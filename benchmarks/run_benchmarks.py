@@ -0,0 +1,138 @@
+"""
+Benchmark suite for the repository and domain hot paths.
+
+Usage:
+    python -m benchmarks.run_benchmarks --backend memory --scale 0.1
+    python -m benchmarks.run_benchmarks --backend mongod --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --backend mongod --baseline benchmarks/baseline.json --fail-on-regression
+
+The mongod backend seeds (drops and fills) the database given by --db-name on the configured host, never the
+production one unless asked to. The memory backend requires mongomock.
+"""
+__author__ = 'Herminio'
+
+import argparse
+import sys
+
+from a4ai.domain.model.observation.statistics import Statistics
+from infrastructure.mongo_repos import config
+from infrastructure.mongo_repos.area_repository import AreaRepository
+from infrastructure.mongo_repos.indicator_repository import IndicatorRepository
+from infrastructure.mongo_repos.observation_repository import ObservationRepository
+from infrastructure.mongo_repos.instrumentation import InstrumentedDatabase, QueryRecorder
+from benchmarks.data_generator import seed_database, URL_ROOT
+from benchmarks.runner import run_benchmark, format_results, find_regressions, load_baseline, save_baseline
+
+
+def open_database(backend, db_name):
+    """
+    Opens the database handle for the given backend
+
+    Args:
+        backend (str): mongod for a local server, memory for an in-memory stand-in
+        db_name (str): Database name
+
+    Returns:
+        Database: Database handle
+    """
+    if backend == "memory":
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("The memory backend requires mongomock, install it or use --backend mongod")
+        return mongomock.MongoClient()[db_name]
+
+    from pymongo import MongoClient
+    return MongoClient(config.host, config.port)[db_name]
+
+
+def build_scenarios(db):
+    """
+    Builds the benchmark scenarios over a seeded database
+
+    Args:
+        db (Database): Seeded database handle, usually an InstrumentedDatabase
+
+    Returns:
+        list of (str, callable): Scenario names and functions
+    """
+    observations = ObservationRepository(url_root=URL_ROOT, db=db)
+    areas = AreaRepository(url_root=URL_ROOT, db=db)
+    indicators = IndicatorRepository(url_root=URL_ROOT, db=db)
+
+    latest_year = observations.get_year_array()["data"][0]
+    countries = [country.iso3 for country in areas.find_countries(order="iso3")]
+    some_countries = ",".join(countries[:10])
+    grouped_countries = ",".join(countries[:5])
+    indicator = "IND_000"
+    raw_observations = observations.find_observations(indicator_code=indicator, area_code="ALL")
+
+    return [
+        ("find_observations/indicator_year",
+         lambda: observations.find_observations(indicator_code=indicator, area_code="ALL", year=latest_year)),
+        ("find_observations/many_areas",
+         lambda: observations.find_observations(indicator_code=indicator, area_code=some_countries + ",HIC",
+                                                year=latest_year)),
+        ("find_observations/all_years",
+         lambda: observations.find_observations(indicator_code=indicator, area_code=grouped_countries)),
+        ("find_observations_statistics",
+         lambda: observations.find_observations_statistics(indicator_code=indicator, area_code="ALL",
+                                                           year=latest_year).to_dict()),
+        ("find_observations_visualisation",
+         lambda: observations.find_observations_visualisation(indicator_code=indicator, area_code=some_countries,
+                                                              year=latest_year).to_dict()),
+        ("find_observations_grouped_by_area_visualisation",
+         lambda: observations.find_observations_grouped_by_area_visualisation(
+             indicator_code=indicator, area_code=grouped_countries, year=latest_year).to_dict()),
+        ("area.find_areas", lambda: areas.find_areas(None)),
+        ("area.get_areas_info", lambda: areas.get_areas_info().to_dict()),
+        ("indicator.find_indicators", lambda: indicators.find_indicators()),
+        ("statistics/raw", lambda: Statistics(raw_observations).to_dict()),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the repository and domain hot paths")
+    parser.add_argument("--backend", choices=["mongod", "memory"], default="memory")
+    parser.add_argument("--db-name", default="a4ai_benchmark")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Fraction of the production size (200 areas x 100 indicators x 10 years)")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the data already in the database")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--only", help="Run only scenarios whose name contains this text")
+    parser.add_argument("--baseline", help="JSON baseline to compare against")
+    parser.add_argument("--save-baseline", help="Store the results as a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative p50 increase reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    db = open_database(args.backend, args.db_name)
+    if not args.no_seed:
+        sizes = seed_database(db, num_countries=max(int(200 * args.scale), 10),
+                              num_indicators=max(int(100 * args.scale), 5),
+                              num_years=max(int(10 * args.scale), 2))
+        print("Seeded %(areas)d areas, %(indicators)d indicators and %(observations)d observations" % sizes)
+
+    query_recorder = QueryRecorder()
+    results = [run_benchmark(name, function, query_recorder, iterations=args.iterations, warmup=args.warmup)
+               for name, function in build_scenarios(InstrumentedDatabase(db, query_recorder))
+               if args.only is None or args.only in name]
+
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    print(format_results(results, baseline, args.threshold))
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+
+    if baseline is not None and args.fail_on_regression:
+        regressions = find_regressions(results, baseline, args.threshold)
+        if len(regressions) > 0:
+            print("Regressions: " + ", ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
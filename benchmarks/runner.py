@@ -0,0 +1,151 @@
+__author__ = 'Herminio'
+
+import json
+from timeit import default_timer
+
+
+class BenchmarkResult(object):
+    """
+    Timing results of one benchmark scenario
+
+    Attributes:
+        name (str): Scenario name
+        timings (list of float): Seconds spent in each measured call
+        round_trips (float): Average database round-trips per call
+    """
+
+    def __init__(self, name, timings, round_trips):
+        self._name = name
+        self._timings = sorted(timings)
+        self._round_trips = round_trips
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def round_trips(self):
+        return self._round_trips
+
+    @property
+    def throughput(self):
+        """Calls per second"""
+        total = sum(self._timings)
+        return len(self._timings) / total if total > 0 else 0
+
+    def percentile(self, percent):
+        """
+        Nearest rank percentile of the call latencies
+
+        Args:
+            percent (int): Percentile to compute, from 0 to 100
+
+        Returns:
+            float: Latency in milliseconds
+        """
+        if len(self._timings) == 0:
+            return 0
+        rank = int(round(percent / 100.0 * (len(self._timings) - 1)))
+        return self._timings[rank] * 1000
+
+    def to_dict(self):
+        """
+        Converts self object to dictionary
+
+        Returns:
+            dict: Dictionary representation of self object
+        """
+        return {
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'throughput': self.throughput,
+            'round_trips': self.round_trips,
+            'calls': len(self._timings)
+        }
+
+
+def run_benchmark(name, function, query_recorder, iterations=20, warmup=2):
+    """
+    Runs a scenario several times, measuring the latency and database round-trips of every call
+
+    Args:
+        name (str): Scenario name
+        function (callable): Scenario to run, called without arguments
+        query_recorder (QueryRecorder): Recorder of the instrumented database used by the scenario
+        iterations (int, optional): Measured calls
+        warmup (int, optional): Calls made before measuring
+
+    Returns:
+        BenchmarkResult: Results for the scenario
+    """
+    for _ in range(warmup):
+        function()
+
+    query_recorder.reset()
+    timings = []
+    for _ in range(iterations):
+        start = default_timer()
+        function()
+        timings.append(default_timer() - start)
+
+    return BenchmarkResult(name, timings, query_recorder.queries / float(max(iterations, 1)))
+
+
+def format_results(results, baseline=None, threshold=0.1):
+    """
+    Formats results as a text table, comparing them against a baseline if given
+
+    Args:
+        results (list of BenchmarkResult): Results to format
+        baseline (dict, optional): Stored baseline as returned by load_baseline
+        threshold (float, optional): Relative p50 increase considered a regression
+
+    Returns:
+        str: Text table with one line per scenario
+    """
+    lines = ["%-50s %10s %10s %10s %12s %12s %s" % ("scenario", "p50 ms", "p95 ms", "p99 ms", "calls/s",
+                                                      "round-trips", "vs baseline")]
+    for result in results:
+        data = result.to_dict()
+        lines.append("%-50s %10.2f %10.2f %10.2f %12.2f %12.1f %s" % (
+            result.name, data['p50'], data['p95'], data['p99'], data['throughput'], data['round_trips'],
+            _compare(data, (baseline or {}).get(result.name), threshold)))
+    return "\n".join(lines)
+
+
+def find_regressions(results, baseline, threshold=0.1):
+    """
+    Finds scenarios slower than the baseline or issuing more round-trips
+
+    Args:
+        results (list of BenchmarkResult): Results to check
+        baseline (dict): Stored baseline as returned by load_baseline
+        threshold (float, optional): Relative p50 increase considered a regression
+
+    Returns:
+        list of str: Names of the scenarios that regressed
+    """
+    return [result.name for result in results
+            if _compare(result.to_dict(), baseline.get(result.name), threshold).startswith("REGRESSION")]
+
+
+def load_baseline(path):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(path, results):
+    with open(path, "w") as baseline_file:
+        json.dump(dict((result.name, result.to_dict()) for result in results), baseline_file, indent=2,
+                  sort_keys=True)
+
+
+def _compare(data, reference, threshold):
+    if reference is None:
+        return "-"
+    ratio = data['p50'] / reference['p50'] if reference['p50'] > 0 else 1.0
+    summary = "p50 x%.2f, round-trips %+.1f" % (ratio, data['round_trips'] - reference['round_trips'])
+    if ratio > 1 + threshold or data['round_trips'] > reference['round_trips']:
+        return "REGRESSION " + summary
+    return summary
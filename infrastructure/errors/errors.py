@@ -65,4 +65,60 @@ class ObservationRepositoryError(RepositoryError):
         Args:
             message (str): Error message for this exception
         """
-        super(ObservationRepositoryError, self).__init__(message=message, custom_header="Observation Error:")
\ No newline at end of file
+        super(ObservationRepositoryError, self).__init__(message=message, custom_header="Observation Error:")
+
+
+class PageTokenError(RepositoryError):
+    """
+    Exception for paginated queries with a wrong page token, it will print 'Page Error:' as title
+    """
+    def __init__(self, message):
+        """
+        Constructor for PageTokenError
+
+        Args:
+            message (str): Error message for this exception
+        """
+        super(PageTokenError, self).__init__(message=message, custom_header="Page Error:")
+
+
+class EventStoreError(RepositoryError):
+    """
+    Exception for the event store, it will print 'Event Store Error:' as title
+    """
+    def __init__(self, message):
+        """
+        Constructor for EventStoreError
+
+        Args:
+            message (str): Error message for this exception
+        """
+        super(EventStoreError, self).__init__(message=message, custom_header="Event Store Error:")
+
+
+class QueryBudgetExceededError(AssertionError):
+    """
+    Exception for code that sends more database queries than allowed, it is an AssertionError so test runners
+    report it as a failure
+
+    Attributes:
+        max_queries (int): Maximum number of queries allowed
+        queries (list of tuple): Collection, operation and filter of every query sent
+    """
+    def __init__(self, max_queries, queries):
+        """
+        Constructor for QueryBudgetExceededError
+
+        Args:
+            max_queries (int): Maximum number of queries allowed
+            queries (list of tuple): Collection, operation and filter of every query sent
+        """
+        self.max_queries = max_queries
+        self.queries = queries
+        super(QueryBudgetExceededError, self).__init__(self.message)
+
+    @property
+    def message(self):
+        lines = ["Query budget exceeded: %d queries sent, %d allowed" % (len(self.queries), self.max_queries)]
+        lines += ["    %s.%s %r" % query for query in self.queries]
+        return "\n".join(lines)
@@ -0,0 +1,364 @@
+__author__ = 'Herminio'
+
+import importlib
+import logging
+import os
+import pickle
+import struct
+import sys
+import threading
+
+from a4ai.domain.model.entity import Entity
+from a4ai.domain.model.events import DomainEvent, subscribe, unsubscribe
+from infrastructure.errors.errors import EventStoreError
+from infrastructure.errors.exceptions import ConsistencyError
+from utility.mutators import replay
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"A4AIEVT1"
+EVENT = 0
+SNAPSHOT = 1
+CREATED = 2  # event starting the stream of an aggregate
+RECORD_HEADER = struct.Struct("<BHI")  # kind, length of the aggregate id and length of the payload
+PICKLE_PROTOCOL = 2  # readable from python 2 and 3
+
+_type_names = {}
+_types = {}
+
+
+def is_domain_event(event):
+    return isinstance(event, DomainEvent)
+
+
+class FileEventStore(object):
+    """
+    Append-only log of domain events in a local file, with snapshots of the aggregates. Each record has a
+    RECORD_HEADER, the aggregate id and a pickled payload: the event type and attributes, or the version and state
+    of an aggregate. Once an aggregate has snapshot_every events after its latest snapshot a new one is appended, so
+    loading an aggregate reads at most one snapshot and snapshot_every events, however long its history is.
+
+    Note:
+        Aggregates are identified by their id, which is the id of their Created event, e.g.: the document id, later
+        events have it as originator_id. Events of aggregates without id are not stored. Adapters create the
+        aggregate again each time its document is read, a new Created event restarts the stream of the aggregate,
+        its earlier events and snapshot are not read anymore. A stream found inconsistent when its snapshot is due
+        is not loaded until the aggregate is created again, see inconsistent_aggregates. Events are buffered and
+        written batch_size at a time, in one write, events not flushed yet are lost if the process dies. The file is
+        indexed in memory on opening, just one process must append to it. A record truncated by a crash is dropped
+        on opening.
+    """
+
+    def __init__(self, path, batch_size=100, snapshot_every=100, fsync=False):
+        """
+        Constructor for FileEventStore, the log is created if it does not exist
+
+        Args:
+            path (str): Path of the log file
+            batch_size (int, optional): Number of events buffered before they are written, default to 100
+            snapshot_every (int, optional): Number of events of an aggregate between its snapshots, default to 100
+            fsync (bool, optional): True to sync the file to disk on every write, default to False
+
+        Raises:
+            ValueError: If batch_size or snapshot_every is not positive
+            EventStoreError: If the file is not an event log
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be positive, got %s" % batch_size)
+        if snapshot_every < 1:
+            raise ValueError("Snapshot interval must be positive, got %s" % snapshot_every)
+
+        self._path = path
+        self._batch_size = batch_size
+        self._snapshot_every = snapshot_every
+        self._fsync = fsync
+        self._lock = threading.RLock()
+        self._pending = []
+        self._snapshots = {}  # aggregate id to the offset of its latest snapshot
+        self._events = {}  # aggregate id to the offsets of its events after the latest snapshot
+        self._inconsistent = {}  # aggregate id to the error found replaying its events
+        self._open()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def inconsistent_aggregates(self):
+        """
+        Returns the aggregates whose events were found inconsistent when their snapshot was due, they are not
+        loaded nor snapshot until they are created again
+
+        Returns:
+            dict: Aggregate id to the error found
+        """
+        with self._lock:
+            self.flush()
+            return dict(self._inconsistent)
+
+    def subscribe(self):
+        """
+        Appends every domain event sent through publish from now on
+        """
+        subscribe(is_domain_event, self.append)
+
+    def unsubscribe(self):
+        unsubscribe(is_domain_event, self.append)
+
+    def append(self, event):
+        """
+        Buffers an event, the buffer is written once it has batch_size events
+
+        Args:
+            event (DomainEvent): Event with originator_id and originator_version
+        """
+        if _aggregate_id(event) is None:
+            logger.warning("Event %r of an aggregate without id is not stored", event)
+            return
+        with self._lock:
+            self._pending.append(event)
+            if len(self._pending) >= self._batch_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered events, then the snapshots of the aggregates that are due one
+
+        Returns:
+            int: Number of events written
+        """
+        with self._lock:
+            if len(self._pending) == 0:
+                return 0
+
+            records, offsets, offset = [], [], self._size
+            for event in self._pending:
+                aggregate_id = _aggregate_id(event)
+                kind = CREATED if isinstance(event, Entity.Created) else EVENT
+                record = _record(kind, aggregate_id, pickle.dumps(
+                    (_type_name(type(event)), dict(event.__dict__)), PICKLE_PROTOCOL))
+                records.append(record)
+                offsets.append((kind, aggregate_id, offset))
+                offset += len(record)
+            self._write(b"".join(records))
+
+            written, self._pending = len(self._pending), []
+            due = []
+            for kind, aggregate_id, offset in offsets:
+                if self._index(kind, aggregate_id, offset) == self._snapshot_every:
+                    due.append(aggregate_id)
+            for aggregate_id in due:  # flush runs inside publish, snapshot errors must not escape it
+                if aggregate_id in self._inconsistent:
+                    continue
+                try:
+                    self.snapshot(aggregate_id)
+                except ConsistencyError as error:
+                    self._inconsistent[aggregate_id] = str(error)
+                    logger.warning("Events of aggregate %s are inconsistent, it is not loaded until created again: %s",
+                                   aggregate_id, error)
+                except Exception:
+                    logger.exception("Snapshot of aggregate %s failed", aggregate_id)
+            return written
+
+    def snapshot(self, aggregate_id):
+        """
+        Appends a snapshot of an aggregate, rebuilt from its latest snapshot and events
+
+        Args:
+            aggregate_id: Id of the aggregate
+
+        Raises:
+            EventStoreError: If there are no events of the aggregate
+        """
+        with self._lock:
+            aggregate = self.load(aggregate_id)
+            aggregate_id, offset = _key(aggregate_id), self._size
+            self._write(_record(SNAPSHOT, aggregate_id, pickle.dumps(
+                (aggregate._version, aggregate), PICKLE_PROTOCOL)))
+            self._snapshots[aggregate_id] = offset
+            self._events[aggregate_id] = []
+
+    def load(self, aggregate_id):
+        """
+        Rebuilds an aggregate from its latest snapshot and the events after it, see utility.mutators.replay
+
+        Args:
+            aggregate_id: Id of the aggregate
+
+        Returns:
+            Entity: The aggregate, as its events left it, it could be discarded
+
+        Raises:
+            EventStoreError: If there are no events of the aggregate, or they were found inconsistent before
+            ConsistencyError: If the events of the aggregate do not follow each other
+        """
+        with self._lock:
+            self.flush()
+            aggregate_id = _key(aggregate_id)
+            if aggregate_id not in self._snapshots and aggregate_id not in self._events:
+                raise EventStoreError("No events for aggregate " + aggregate_id)
+            if aggregate_id in self._inconsistent:
+                raise EventStoreError("Events of aggregate %s are inconsistent: %s" %
+                                      (aggregate_id, self._inconsistent[aggregate_id]))
+
+            aggregate = None
+            if aggregate_id in self._snapshots:
+                aggregate = self._read(self._snapshots[aggregate_id])[1]
+            return replay([self._read(offset) for offset in self._events.get(aggregate_id, [])], aggregate)
+
+    def events(self):
+        """
+        Reads every event in the log, snapshots are skipped
+
+        Returns:
+            generator of DomainEvent: Events in the order they were appended
+        """
+        self.flush()
+        with open(self._path, "rb") as log:
+            log.seek(len(MAGIC))
+            while True:
+                header = log.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                kind, id_length, payload_length = RECORD_HEADER.unpack(header)
+                log.seek(id_length, os.SEEK_CUR)
+                payload = log.read(payload_length)
+                if kind != SNAPSHOT:
+                    yield _event(payload)
+
+    def close(self):
+        """
+        Writes the buffered events and closes the log, the store stops receiving published events
+        """
+        with self._lock:
+            self.unsubscribe()
+            self.flush()
+            self._writer.close()
+            self._reader.close()
+
+    def _open(self):
+        if not os.path.exists(self._path) or os.path.getsize(self._path) == 0:
+            with open(self._path, "wb") as log:
+                log.write(MAGIC)
+
+        self._reader = open(self._path, "rb")
+        if self._reader.read(len(MAGIC)) != MAGIC:
+            self._reader.close()
+            raise EventStoreError("%s is not an event log" % self._path)
+
+        size = os.path.getsize(self._path)
+        offset = len(MAGIC)
+        while offset < size:
+            header = self._reader.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            kind, id_length, payload_length = RECORD_HEADER.unpack(header)
+            end = offset + RECORD_HEADER.size + id_length + payload_length
+            if end > size:
+                break
+            self._index(kind, self._reader.read(id_length).decode("utf-8"), offset)
+            self._reader.seek(end)
+            offset = end
+
+        if offset < size:
+            logger.warning("Event log %s has a truncated record at %d, it is dropped", self._path, offset)
+            with open(self._path, "r+b") as log:
+                log.truncate(offset)
+        self._size = offset
+        self._writer = open(self._path, "ab")
+
+    def _index(self, kind, aggregate_id, offset):
+        """
+        Indexes a record, a snapshot or Created event starts the events of its aggregate again
+
+        Returns:
+            int: Number of events of the aggregate after its latest snapshot
+        """
+        if kind == SNAPSHOT:
+            self._snapshots[aggregate_id] = offset
+            self._events[aggregate_id] = []
+        elif kind == CREATED:
+            self._snapshots.pop(aggregate_id, None)
+            self._inconsistent.pop(aggregate_id, None)
+            self._events[aggregate_id] = [offset]
+        else:
+            self._events.setdefault(aggregate_id, []).append(offset)
+        return len(self._events[aggregate_id])
+
+    def _write(self, data):
+        self._writer.write(data)
+        self._writer.flush()
+        if self._fsync:
+            os.fsync(self._writer.fileno())
+        self._size += len(data)
+
+    def _read(self, offset):
+        """
+        Reads the record at an offset
+
+        Returns:
+            DomainEvent or (int, Entity): The event, or the version and aggregate of a snapshot
+        """
+        self._reader.seek(offset)
+        kind, id_length, payload_length = RECORD_HEADER.unpack(self._reader.read(RECORD_HEADER.size))
+        self._reader.seek(id_length, os.SEEK_CUR)
+        payload = self._reader.read(payload_length)
+        return pickle.loads(payload) if kind == SNAPSHOT else _event(payload)
+
+
+def _aggregate_id(event):
+    """
+    Returns the id of the aggregate of an event as text, aggregates take the id of their Created event if it has one
+    """
+    if isinstance(event, Entity.Created) and event.__dict__.get("id") is not None:
+        return _key(event.id)
+    return _key(event.originator_id)
+
+
+def _key(aggregate_id):
+    return None if aggregate_id is None else "%s" % aggregate_id  # e.g.: ObjectId document ids
+
+
+def _record(kind, aggregate_id, payload):
+    aggregate_id = aggregate_id.encode("utf-8")
+    return RECORD_HEADER.pack(kind, len(aggregate_id), len(payload)) + aggregate_id + payload
+
+
+def _event(payload):
+    type_name, attributes = pickle.loads(payload)
+    event_type = _event_type(type_name)
+    event = event_type.__new__(event_type)
+    event.__dict__.update(attributes)  # events are read-only, see DomainEvent.__setattr__
+    return event
+
+
+def _type_name(event_type):
+    """
+    Returns the module and qualified name of an event type, e.g.: a4ai.domain.model.area.country:Country.Created
+    """
+    name = _type_names.get(event_type)
+    if name is None:
+        qualified_name = getattr(event_type, "__qualname__", None)
+        if qualified_name is None:  # python 2, nested event types are looked up in the classes of their module
+            module = sys.modules[event_type.__module__]
+            if getattr(module, event_type.__name__, None) is event_type:
+                qualified_name = event_type.__name__
+            else:
+                qualified_name = next(("%s.%s" % (outer_name, event_type.__name__)
+                                       for outer_name, outer in vars(module).items()
+                                       if isinstance(outer, type) and
+                                       outer.__dict__.get(event_type.__name__) is event_type), None)
+            if qualified_name is None:
+                raise EventStoreError("Event type %r could not be named" % event_type)
+        name = _type_names[event_type] = "%s:%s" % (event_type.__module__, qualified_name)
+    return name
+
+
+def _event_type(name):
+    event_type = _types.get(name)
+    if event_type is None:
+        module_name, qualified_name = name.split(":")
+        event_type = importlib.import_module(module_name)
+        for attribute in qualified_name.split("."):
+            event_type = getattr(event_type, attribute)
+        _types[name] = event_type
+    return event_type
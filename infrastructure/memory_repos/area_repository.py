@@ -0,0 +1,250 @@
+__author__ = 'Herminio'
+
+from a4ai.domain.model.area import area
+from a4ai.domain.model.area.area_short_info import AreaShortInfo
+from a4ai.domain.model.area.indicator_info import IndicatorInfo, IndicatorInfoList
+from a4ai.domain.services.typeahead import AreaTypeahead
+from infrastructure.errors.errors import AreaRepositoryError
+from infrastructure.mongo_repos.area_repository import AreaDocumentAdapter, CountryDocumentAdapter, \
+    RegionDocumentAdapter
+from infrastructure.mongo_repos.utils import uri, normalize_income, normalize_area_type
+from utility.text import fold
+from .memory_store import MemoryStore, sort_documents
+
+
+class AreaRepository(area.Repository):
+    """
+    In-memory repository for Areas, it serves the same results as the mongodb one without querying the database
+    """
+
+    def __init__(self, url_root, store=None):
+        """
+        Constructor for AreaRepository
+
+        Args:
+            url_root (str): URL root where service is deployed, it will be used to compose URIs on areas
+            store (MemoryStore, optional): Loaded store to read from, by default the configured database is loaded
+        """
+        self._store = MemoryStore().load() if store is None else store
+        self._url_root = url_root
+
+    def find_by_name(self, area_name):
+        """
+        Finds one area by its name
+
+        Args:
+            area_name (str): Name or short name of the area to query, case and accent insensitive
+
+        Returns:
+            Area: The first area with the given name
+
+        Raises:
+            AreaRepositoryError: If there is not an area with the given name
+        """
+        matches = self._store.lookup("areas", "name_keys", fold(area_name))
+        if len(matches) == 0:  # areas stored before name keys
+            matches = [match for match in self._lookup_any([("name", area_name), ("name", area_name.upper()),
+                                                            ("name", area_name.title()), ("name", area_name.lower()),
+                                                            ("short_name", area_name)])
+                       if "name_keys" not in match]
+        if len(matches) == 0:
+            raise AreaRepositoryError("No area with name " + area_name)
+        area = dict(matches[0])
+        self.area_uri(area)
+        return AreaDocumentAdapter().transform_to_area(area)
+
+    def suggest_areas(self, prefix, limit=10):
+        """
+        Suggests areas for typeahead, from an in-memory prefix index over names, short names and search aliases
+        which is built on first use
+
+        Args:
+            prefix (str): Text typed so far, case and accent insensitive
+            limit (int, optional): Maximum number of suggestions, default to 10
+
+        Returns:
+            list of Area: Areas with a name word starting with the prefix, shortest matching names first
+        """
+        if 'typeahead' not in self.__dict__:
+            self.typeahead = AreaTypeahead(self.find_areas("name"))
+        return self.typeahead.suggest(prefix, limit)
+
+    def invalidate_caches(self):
+        """
+        Discards the typeahead index, it is built again on next use
+        """
+        self.__dict__.pop('typeahead', None)
+
+    def find_countries_by_code_or_income(self, area_code_or_income):
+        """
+        Finds countries by code or income if no area is found it will search by income
+
+        Args:
+            area_code_or_income (str): iso3, iso2, name or income(for a list of countries)
+
+        Returns:
+            Region with the given countries appended or a list of countries
+
+        Raises:
+            AreaRepositoryError: If not countries nor areas are found
+        """
+        area_code_or_income_upper = area_code_or_income.upper()
+        matches = self._lookup_any([("iso3", area_code_or_income), ("iso3", area_code_or_income_upper),
+                                    ("iso2", area_code_or_income), ("iso2", area_code_or_income_upper),
+                                    ("name", area_code_or_income)])
+
+        if len(matches) == 0:
+            return self.find_countries_by_continent_or_income_or_type(area_code_or_income_upper)
+
+        area = dict(matches[0])
+        self.set_continent_countries(area)
+        self.area_uri(area)
+        area["short_name"] = area["name"]
+
+        return AreaDocumentAdapter().transform_to_area(area)
+
+    def find_countries_by_continent_or_income_or_type(self, continent_or_income_or_type, order="iso3"):
+        """
+        Finds a list of countries by its continent, income or type
+
+        Args:
+            continent_or_income_or_type (str): Code for continent, income or type
+            order (str, optional): Attribute key to sort, default to iso3
+
+        Returns:
+            list of Country: countries with the given continent, income or type
+
+        Raises:
+            AreaRepositoryCountry: If no countries are found
+        """
+        order = "name" if order is None else order
+        matches = self._lookup_any([("area", continent_or_income_or_type),
+                                    ("income", normalize_income(continent_or_income_or_type)),
+                                    ("type", normalize_area_type(continent_or_income_or_type))])
+
+        if len(matches) == 0:
+            raise AreaRepositoryError("No countries for code " + continent_or_income_or_type)
+
+        country_list = []
+
+        for country in sort_documents(matches, order):
+            country = dict(country)
+            self.set_continent_countries(country)
+            self.area_uri(country)
+            country_list.append(country)
+
+        return CountryDocumentAdapter().transform_to_country_list(country_list)
+
+    def find_areas(self, order):
+        """
+        Finds all areas in the repository
+
+        Args:
+            order (str): Attribute of Area to sort by
+
+        Returns:
+            list of Area: All regions and countries
+        """
+        order = "name" if order is None else order
+        return self.find_continents(order) + self.find_countries(order)
+
+    def find_continents(self, order):
+        """
+        Finds all regions in the repository
+
+        Args:
+            order (str): Attribute of Region to sort by
+
+        Returns:
+            list of Region: All regions
+        """
+        order = "name" if order is None else order
+        continents = []
+
+        for continent in sort_documents(self._store.lookup("areas", "area", None), order):
+            continent = dict(continent)
+            continent["short_name"] = continent["name"]
+            self.set_continent_countries(continent)
+            self.area_uri(continent)
+            continents.append(continent)
+
+        return RegionDocumentAdapter().transform_to_region_list(continents)
+
+    def find_countries(self, order):
+        """
+        Finds all countries in the repository
+
+        Args:
+            order (str): Attribute of Country to sort by
+
+        Returns:
+            list of Country: All countries
+        """
+        order = "name" if order is None else order
+        countries = [country for country in self._store.all("areas") if country.get("area") is not None]
+        country_list = []
+
+        for country in sort_documents(countries, order):
+            country = dict(country)
+            self.area_uri(country)
+            country_list.append(country)
+
+        return CountryDocumentAdapter().transform_to_country_list(country_list)
+
+    def set_continent_countries(self, area):
+        """
+        Sets the countries that belong to a region
+
+        Args:
+            area (dict): Area document, it is modified
+        """
+        country_list = []
+
+        for country in sort_documents(self._store.lookup("areas", "area", area["iso3"]), "name"):
+            country = dict(country)
+            self.area_uri(country)
+            country_list.append(country)
+
+        if len(country_list) > 0:
+            area["countries"] = country_list
+
+    def area_uri(self, area):
+        """
+        Sets the URI to the given area
+
+        Args:
+            area (dict): Area document to set the URI
+        """
+        field = "iso3" if area["iso3"] is not None else "name"
+        uri(url_root=self._url_root, element=area, element_code=field, level="areas")
+
+    def get_areas_info(self):
+        all_countries = self.find_countries(None)
+        indicator_codes = set([info.indicator_code for country in all_countries for info in country.info])
+        indicators_info_list = IndicatorInfoList()
+        for indicator_code in indicator_codes:
+            areas = []
+            provider_name, provider_url = ('', '')
+            for area in all_countries:
+                for info_of_area in area.info:
+                    if info_of_area.indicator_code == indicator_code:
+                        areas.append(AreaShortInfo(area.iso3, info_of_area.value, info_of_area.year))
+                        provider_name, provider_url = (info_of_area.provider_name, info_of_area.provider_url)
+            indicator_info = IndicatorInfo(indicator_code, provider_name, provider_url)
+            indicator_info.values = areas
+            indicators_info_list.add_indicator_info(indicator_info)
+        return indicators_info_list
+
+    def _lookup_any(self, key_values):
+        """
+        Looks for the documents matching any of the given key and value pairs, as an $or query
+
+        Args:
+            key_values (list of (str, object)): Indexed keys and values
+
+        Returns:
+            list of dict: Matching documents in natural order without duplicates
+        """
+        matches = dict((id(document), document) for key, value in key_values
+                       for document in self._store.lookup("areas", key, value))
+        return self._store.in_natural_order("areas", matches.values())
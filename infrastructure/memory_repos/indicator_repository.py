@@ -0,0 +1,158 @@
+__author__ = 'Herminio'
+
+from a4ai.domain.model.indicator.indicator import Repository
+from infrastructure.errors.errors import IndicatorRepositoryError
+from infrastructure.mongo_repos.indicator_repository import IndicatorDocumentAdapter
+from .memory_store import MemoryStore
+
+
+class IndicatorRepository(Repository):
+    """
+    In-memory repository for Indicators, it serves the same results as the mongodb one without querying the database
+    """
+
+    def __init__(self, url_root, store=None):
+        """
+        Constructor for IndicatorRepository
+
+        Args:
+            url_root (str): URL root where service is deployed, it will be used to compose URIs on areas
+            store (MemoryStore, optional): Loaded store to read from, by default the configured database is loaded
+        """
+        self._store = MemoryStore().load() if store is None else store
+        self._url_root = url_root
+
+    def find_indicator_by_code(self, indicator_code):
+        """
+        Finds a indicator by its code, in this case the indicator attribute
+
+        Args:
+            indicator_code (str): Code of the indicator to query
+
+        Returns:
+            Indicator: The first indicator with the given code
+
+        Raises:
+            IndicatorRepositoryError: If there is not an indicator with the given code
+        """
+        indicator_code = indicator_code.upper()
+        if indicator_code == "OVERALL AFFORDABILITY DRIVERS INDEX":
+            indicator_code = "INDEX"
+        indicator = self._store.first("indicators", "indicator", indicator_code)
+
+        if indicator is None:
+            raise IndicatorRepositoryError("No indicator with code " + indicator_code)
+
+        indicator = dict(indicator)
+        indicator["children"] = self.find_indicator_children(indicator)
+
+        return IndicatorDocumentAdapter().transform_to_indicator(indicator)
+
+    def find_indicators(self):
+        """
+        Finds all indicators
+
+        Returns:
+            list of Indicator: All the indicators stored
+        """
+        return self.find_indicators_index() + self.find_indicators_sub_indexes() + self.find_indicators_indicators()
+
+    def find_indicators_index(self):
+        """
+        Finds all indicators whose type is Index
+
+        Returns:
+            list of Indicator: Indicators with type Index
+        """
+        return self.find_indicators_by_level("Index")
+
+    def find_indicators_sub_indexes(self):
+        """
+        Finds all indicators whose type is SubIndex
+
+        Returns:
+            list of Indicator: Indicators with type SubIndex
+        """
+        return self.find_indicators_by_level("SubIndex")
+
+    def find_indicators_primary(self, parent=None):
+        """
+        Finds all indicators whose type is Primary
+
+        Returns:
+            list of Indicator: Indicators with type Primary
+        """
+        return self.find_indicators_by_level("Primary", parent)
+
+    def find_indicators_secondary(self, parent=None):
+        """
+        Finds all indicators whose type is Secondary
+
+        Returns:
+            list of Indicator: Indicators with type Secondary
+        """
+        return self.find_indicators_by_level("Secondary", parent)
+
+    def find_indicators_indicators(self, parent=None):
+        """
+        Finds all indicators whose type is Primary or Secondary
+
+        Returns:
+            list of Indicator: Indicators with type Primary or Secondary
+        """
+        return self.find_indicators_primary(parent) + self.find_indicators_secondary(parent)
+
+    def find_indicators_by_level(self, level, parent=None):
+        """
+        Finds indicators whose type is equals to the given level, e.g.: Index, SubIndex, Primary or Secondary
+
+        Args:
+            level (str): Type of the indicators to search
+            parent (Indicator, optional): Parent indicator if more filter is required, default to None
+
+        Returns:
+            list of Indicator: Indicators that fit with the given filters
+        """
+        indicators = self._store.lookup("indicators", "type", level)
+
+        if parent is not None:
+            _type = parent.type.lower()
+            indicators = [indicator for indicator in indicators if indicator.get(_type) == parent.indicator]
+
+        processed_indicators = []
+
+        for indicator in indicators:
+            indicator = dict(indicator)
+            indicator["children"] = self.find_indicator_children(indicator)
+            processed_indicators.append(indicator)
+
+        return IndicatorDocumentAdapter().transform_to_indicator_list(processed_indicators)
+
+    def find_indicator_children(self, indicator):
+        """
+        Finds the children of the given indicator
+
+        Args:
+            indicator (dict): Parent indicator document
+
+        Returns:
+            list of dict: The children of the indicator
+        """
+        if indicator['type'] == 'Index':
+            indicators = [child for child in self._store.lookup("indicators", "index", indicator['indicator'])
+                          if child.get("type") == "SubIndex"]
+        elif indicator['type'] == 'SubIndex':
+            indicators = [child for child in self._store.lookup("indicators", "subindex", indicator['indicator'])
+                          if child.get("type") in ("Primary", "Secondary")]
+        else:
+            return []
+
+        processed_indicators = []
+
+        for child in indicators:
+            child = dict(child)
+            child["children"] = self.find_indicator_children(child)
+            self.indicator_uri(child)
+            processed_indicators.append(child)
+
+        return processed_indicators
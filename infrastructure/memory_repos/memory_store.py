@@ -0,0 +1,169 @@
+__author__ = 'Herminio'
+
+from numbers import Number
+
+from infrastructure.mongo_repos.config import port, db_name, host
+from infrastructure.mongo_repos.mongo_connection import connect_to_db
+
+
+class MemoryStore(object):
+    """
+    In-memory copy of the mongodb collections with hash indexes on the lookup keys used by the repositories
+
+    Note:
+        Documents are kept in natural (insertion) order, every lookup returns them in that order, so the results
+        are the same ones mongodb returns when no sort is given. Documents must not be modified by callers, the
+        repositories work on copies.
+    """
+    COLLECTIONS = ["areas", "indicators", "observations", "linked_observations"]
+    INDEXES = {
+        "areas": ["iso3", "iso2", "name", "short_name", "name_keys", "area", "income", "type"],
+        "indicators": ["indicator", "type", "index", "subindex"],
+        "observations": ["indicator", "area", "year"],
+        "linked_observations": []
+    }
+
+    def __init__(self, db=None):
+        """
+        Constructor for MemoryStore, data is not loaded until load is called
+
+        Args:
+            db (Database, optional): Database handle to load from instead of connecting to the configured one
+        """
+        self._db = connect_to_db(host=host, port=port, db_name=db_name) if db is None else db
+        self._documents = {}
+        self._positions = {}
+        self._indexes = {}
+        self._loaded = False
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def load(self):
+        """
+        Loads every collection from mongodb and builds its indexes, replacing any previously loaded data
+
+        Returns:
+            MemoryStore: self, so it could be chained on construction
+        """
+        documents, positions, indexes = {}, {}, {}
+        for collection in self.COLLECTIONS:
+            documents[collection] = list(self._db[collection].find())
+            positions[collection] = dict((id(document), position)
+                                         for position, document in enumerate(documents[collection]))
+            indexes[collection] = dict((key, self._build_index(documents[collection], key))
+                                       for key in self.INDEXES[collection])
+
+        self._documents, self._positions, self._indexes = documents, positions, indexes
+        self._loaded = True
+        return self
+
+    def all(self, collection):
+        """
+        Returns every document of a collection in natural order
+
+        Args:
+            collection (str): Collection name
+
+        Returns:
+            list of dict: Documents of the collection
+        """
+        return self._documents[collection]
+
+    def lookup(self, collection, key, value):
+        """
+        Returns the documents whose key is equal to value, a missing key is equal to None as in mongodb
+
+        Args:
+            collection (str): Collection name
+            key (str): Indexed key
+            value: Value to look for
+
+        Returns:
+            list of dict: Matching documents in natural order
+        """
+        return self._indexes[collection][key].get(value, [])
+
+    def lookup_many(self, collection, key, values):
+        """
+        Returns the documents whose key is any of the given values, as a $in query
+
+        Args:
+            collection (str): Collection name
+            key (str): Indexed key
+            values (list): Values to look for
+
+        Returns:
+            list of dict: Matching documents in natural order without duplicates
+        """
+        index = self._indexes[collection][key]
+        buckets = [index[value] for value in set(values) if value in index]
+        if len(buckets) == 1:
+            return buckets[0]
+
+        positions = self._positions[collection]
+        matches = dict((id(document), document) for bucket in buckets for document in bucket)
+        return sorted(matches.values(), key=lambda document: positions[id(document)])
+
+    def first(self, collection, key, value):
+        """
+        Returns the first document whose key is equal to value, as a find_one query
+
+        Returns:
+            dict: The document or None if there is no match
+        """
+        matches = self.lookup(collection, key, value)
+        return matches[0] if len(matches) > 0 else None
+
+    def distinct(self, collection, key):
+        """
+        Returns the distinct not None values of an indexed key
+
+        Returns:
+            list: Distinct values
+        """
+        return [value for value in self._indexes[collection][key].keys() if value is not None]
+
+    def in_natural_order(self, collection, documents):
+        positions = self._positions[collection]
+        return sorted(documents, key=lambda document: positions[id(document)])
+
+    @staticmethod
+    def _build_index(documents, key):
+        index = {}
+        for document in documents:
+            value = document.get(key)
+            for element in (value if isinstance(value, list) else [value]):  # multikey, as mongodb array indexes
+                bucket = index.setdefault(element, [])
+                if len(bucket) == 0 or bucket[-1] is not document:
+                    bucket.append(document)
+        return index
+
+
+def sort_documents(documents, order):
+    """
+    Sorts documents the way mongodb does: missing and None values first, then numbers and then strings
+
+    Args:
+        documents (list of dict): Documents to sort
+        order (str or list of (str, int)): Key to sort ascending by, or keys and directions as in mongodb sort
+
+    Returns:
+        list of dict: Sorted documents
+    """
+    if not isinstance(order, list):
+        order = [(order, 1)]
+    for key, direction in reversed(order):  # stable sorts, from the least significant key
+        documents = sorted(documents, key=lambda document: bson_order(document.get(key)), reverse=direction < 0)
+    return documents
+
+
+def bson_order(value):
+    if value is None:
+        return 0, 0
+    if isinstance(value, bool):
+        return 3, value
+    if isinstance(value, Number):
+        return 1, value
+    return 2, value
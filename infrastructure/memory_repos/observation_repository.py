@@ -0,0 +1,526 @@
+__author__ = 'Herminio'
+
+from a4ai.domain.model.observation.grouped_statistics import GroupedStatistics
+from a4ai.domain.model.observation.observation import Repository
+from infrastructure.errors.errors import IndicatorRepositoryError, AreaRepositoryError
+from infrastructure.mongo_repos.observation_repository import ObservationDocumentAdapter, YearDocumentAdapter, \
+    StatisticsDocumentAdapter, VisualisationDocumentAdapter, GroupedByAreaVisualisationDocumentAdapter, \
+    GroupedStatisticsDocumentAdapter, TimeSeriesDocumentAdapter
+from infrastructure.mongo_repos.indexes import RANKING_ORDER
+from infrastructure.mongo_repos.pagination import Page, check_page_size, decode_page_token, split_page
+from infrastructure.mongo_repos.utils import success, parse_years, normalize_area_type
+from .area_repository import AreaRepository
+from .indicator_repository import IndicatorRepository
+from .memory_store import MemoryStore, sort_documents, bson_order
+
+
+class ObservationRepository(Repository):
+    """
+    In-memory repository for Observations, it serves the same results as the mongodb one without querying the
+    database. Filters are built in the same mongodb format, so they are interchangeable with the mongodb repository
+    ones, but they are solved against the store hash indexes.
+    """
+
+    def __init__(self, url_root, store=None):
+        """
+        Constructor for ObservationRepository
+
+        Args:
+            url_root (str): URL root where service is deployed, it will be used to compose URIs on areas
+            store (MemoryStore, optional): Loaded store to read from, by default the configured database is loaded
+        """
+        self._store = MemoryStore().load() if store is None else store
+        self._indicator = IndicatorRepository(url_root=url_root, store=self._store)
+        self._area = AreaRepository(url_root=url_root, store=self._store)
+        self._url_root = url_root
+
+    def find_observations(self, indicator_code=None, area_code=None, year=None, area_type=None):
+        """
+        Returns all observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+        Returns:
+            list of Observation: Observation that satisfy the given filters in ranking order, observations without
+                ranking first
+        """
+        conditions = self._observations_conditions(indicator_code=indicator_code, area_code=area_code, year=year,
+                                                   area_type=area_type)
+
+        return self._transform_observations(sort_documents(self._select("observations", conditions), RANKING_ORDER),
+                                            complete_history=year is None)
+
+    def find_observations_page(self, indicator_code=None, area_code=None, year=None, area_type=None, page_size=100,
+                               page_token=None):
+        """
+        Returns one page of the observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            page_size (int, optional): Maximum number of observations of the page, default to 100
+            page_token (str, optional): next_page_token of the previous page, None for the first page
+        Returns:
+            Page: Observations of the page in the same order as find_observations and the next page token
+
+        Raises:
+            PageTokenError: If the page token is not valid
+        """
+        conditions = self._observations_conditions(indicator_code=indicator_code, area_code=area_code, year=year,
+                                                   area_type=area_type)
+        documents, next_page_token = self._paginate(self._select("observations", conditions), page_size, page_token)
+
+        return Page(self._transform_observations(documents), next_page_token)
+
+    def stream_observations(self, indicator_code=None, area_code=None, year=None, area_type=None, fields=None,
+                            batch_size=1000):
+        """
+        Iterates over copies of the observation documents that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            fields (list of str, optional): Fields to read, default to every field; indicator_name and area_name are
+                always set
+            batch_size (int, optional): Kept for compatibility with the mongodb repository, documents are already in
+                memory
+        Returns:
+            iterator of dict: Observation documents in ranking order, observations without ranking first
+
+        Raises:
+            ValueError: If the batch size is not positive
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be positive, got %s" % batch_size)
+
+        conditions = self._observations_conditions(indicator_code=indicator_code, area_code=area_code, year=year,
+                                                   area_type=area_type)
+        documents = sort_documents(self._select("observations", conditions), RANKING_ORDER)
+
+        return self._named_observations(documents, fields)
+
+    def _named_observations(self, observation_documents, fields):
+        for document in observation_documents:
+            observation = self._project(document, fields, ["indicator", "area"])
+            self.set_observation_country_and_indicator_name(observation)
+            yield observation
+
+    def _transform_observations(self, observation_documents, complete_history=False):
+        """
+        Sets the extra info of copies of observation documents and transforms them into Observation entities
+
+        Args:
+            observation_documents (iterable of dict): Observation documents from the store
+            complete_history (bool, optional): True if the documents include every year of their indicators and
+                areas, so tendencies are computed from them
+
+        Returns:
+            list of Observation: The observations in the same order
+        """
+        observation_list = []
+
+        for observation in observation_documents:
+            observation = dict(observation)
+            self.set_observation_country_and_indicator_name(observation)
+            observation["code"] = observation["area"]
+            observation["name"] = observation["area_name"]
+            observation_list.append(observation)
+
+        if len(observation_list) > 0:
+            history = observation_list
+            if not complete_history:
+                history = self._select("observations", [
+                    ("indicator", list(set(obs["indicator"] for obs in observation_list))),
+                    ("area", list(set(obs["area"] for obs in observation_list)))])
+            TimeSeriesDocumentAdapter().set_tendencies(observation_list, history)
+
+        return ObservationDocumentAdapter().transform_to_observation_list(observation_list)
+
+    def _observations_conditions(self, indicator_code=None, area_code=None, year=None, area_type=None):
+        """
+        Builds the (key, accepted values) conditions for observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+
+        Returns:
+            list of (str, list): Key and accepted values for each filtered key
+        """
+        conditions = []
+
+        if indicator_code is not None:
+            indicator_filter = self.get_indicators_by_code(indicator_code)
+
+            if indicator_filter is None:
+                raise IndicatorRepositoryError("No indicator with code " + indicator_code)
+
+            conditions += self._filter_conditions(indicator_filter)
+
+        if area_code is not None and area_code != "ALL":
+            area_filter = self.get_countries_by_code_name_or_income(area_code)
+
+            if area_filter is None:
+                raise AreaRepositoryError("No area with code " + area_code)
+
+            conditions += self._filter_conditions(area_filter["area_filter"])
+
+        year_filter = self.get_years(year)
+
+        if year_filter is not None:
+            conditions += self._filter_conditions(year_filter)
+
+        if area_type is not None:
+            conditions.append(("area_type", [normalize_area_type(area_type)]))
+
+        return conditions
+
+    def find_linked_observations(self, indicator_code=None, area_code=None, year=None, area_type=None, fields=None):
+        """
+        Returns copies of the linked observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            fields (list of str, optional): Fields of each linked observation, default to every field
+        Returns:
+            dict: Success with the linked observation documents
+        """
+        conditions = self._observations_conditions(indicator_code=indicator_code, area_code=area_code, year=year,
+                                                   area_type=area_type)
+
+        return success([self._project(obs, fields) for obs in self._select("linked_observations", conditions)])
+
+    def find_linked_observations_page(self, page_size=100, page_token=None, indicator_code=None, area_code=None,
+                                      year=None, area_type=None, fields=None):
+        """
+        Returns one page of the linked observations that satisfy the given filters
+
+        Args:
+            page_size (int, optional): Maximum number of linked observations of the page, default to 100
+            page_token (str, optional): next_page_token of the previous page, None for the first page, pages must be
+                read with the same filters
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            fields (list of str, optional): Fields of each linked observation, default to every field; ranking and
+                _id are always read, as pages are continued from them
+        Returns:
+            Page: Linked observation documents of the page and the next page token
+
+        Raises:
+            PageTokenError: If the page token is not valid
+        """
+        conditions = self._observations_conditions(indicator_code=indicator_code, area_code=area_code, year=year,
+                                                   area_type=area_type)
+        documents, next_page_token = self._paginate(self._select("linked_observations", conditions), page_size,
+                                                    page_token)
+
+        return Page([self._project(document, fields, ["ranking", "_id"]) for document in documents], next_page_token)
+
+    def stream_linked_observations(self, indicator_code=None, area_code=None, year=None, area_type=None,
+                                   fields=None, batch_size=1000):
+        """
+        Iterates over copies of the linked observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            fields (list of str, optional): Fields of each linked observation, default to every field
+            batch_size (int, optional): Kept for compatibility with the mongodb repository, documents are already in
+                memory
+        Returns:
+            iterator of dict: Linked observation documents in ranking order
+
+        Raises:
+            ValueError: If the batch size is not positive
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be positive, got %s" % batch_size)
+
+        conditions = self._observations_conditions(indicator_code=indicator_code, area_code=area_code, year=year,
+                                                   area_type=area_type)
+        documents = sort_documents(self._select("linked_observations", conditions), RANKING_ORDER)
+
+        return (self._project(document, fields) for document in documents)
+
+    def get_indicators_by_code(self, code):
+        """
+        Returns an indicator mongodb filter to use in other queries
+
+        Args:
+            code (str): Indicator code or codes, for many indicator codes, divide them using a ','
+
+        Returns:
+            dict: The filter for mongodb queries
+        """
+        if code.lower() == 'ALL'.lower():  # case does not matter
+            return {}
+
+        codes = code.upper().strip().split(",")
+
+        for code in codes:
+            if self._store.first("indicators", "indicator", code) is None:
+                return None
+
+        return {"indicator": {"$in": codes}}
+
+    def get_countries_by_code_name_or_income(self, code):
+        """
+        Returns an area mongodb filter to use in other queries
+
+        Args:
+            code (str): Area code or area codes, divide them using a ','
+
+        Returns:
+            dict: The filter for mongodb queries
+        """
+        country_codes = []
+        areas = []
+
+        for code in code.split(","):
+            code_upper = code.upper()
+            countries = [country for country in self._store.lookup("areas", "iso3", code_upper)
+                         if country.get("area") is not None] or \
+                self._store.lookup("areas", "iso2", code_upper) or \
+                self._store.lookup("areas", "name", code) or \
+                self._store.lookup("areas", "area", code) or \
+                self._store.lookup("areas", "income", code_upper)
+
+            if len(countries) == 0:
+                return None
+
+            for country in countries:
+                country_codes.append(country["iso3"])
+                areas.append(country["area"])
+
+        return {
+            "area_filter": {"area": {"$in": country_codes}},
+            "areas": areas,
+            "countries": country_codes
+        }
+
+    def get_years(self, year):
+        """
+        Returns a year mongodb filter to use in other queries
+
+        Args:
+            year (str): Year, years or LATEST (last year with observations), divide them using a ','
+
+        Returns:
+            dict: The filter for mongodb queries
+        """
+        if year is None:
+            return None
+
+        if year == 'LATEST':
+            return {"year": self.get_year_list()[0].value}
+
+        return {"year": {"$in": parse_years(year)}}
+
+    def get_year_list(self):
+        """
+        Returns all years with observations
+
+        Returns:
+            list of Year: All years with observations
+        """
+        years = sorted(self._store.distinct("observations", "year"), reverse=True)
+        return YearDocumentAdapter().transform_to_year_list([{"value": year} for year in years])
+
+    def get_year_array(self):
+        return success(sorted(self._store.distinct("observations", "year"), reverse=True))
+
+    def set_observation_country_and_indicator_name(self, observation):
+        """
+        Sets country an indicator name to the given observation
+
+        Args:
+            observation (dict): Observation document, it is modified
+        """
+        observation["indicator_name"] = self._store.first("indicators", "indicator", observation["indicator"])["name"]
+        observation["area_name"] = self._store.first("areas", "iso3", observation["area"])["name"]
+
+    def find_observations_statistics(self, indicator_code=None, area_code=None, year=None):
+        """
+        Returns statitics for observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+        Returns:
+            Statistics: Observations statistics that satisfy the filters
+        """
+        return StatisticsDocumentAdapter().transform_to_statistics(
+            self.find_observations(indicator_code=indicator_code, area_code=area_code, year=year))
+
+    def find_observations_grouped_statistics(self, indicator_code=None, area_code=None, year=None,
+                                             group_by=GroupedStatistics.GROUP_KEYS,
+                                             percentiles=GroupedStatistics.PERCENTILES):
+        """
+        Returns statistics for observations that satisfy the given filters split by several group keys, all of
+        them computed in one scan over the observations
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            group_by (tuple of str, optional): Group keys among continent, income, area_type and year, default to
+                all of them
+            percentiles (tuple of int, optional): Percentiles to calculate for each group, default to 25 and 75
+        Returns:
+            GroupedStatistics: Observations statistics for every group of every group key
+        """
+        conditions = self._observations_conditions(indicator_code=indicator_code, area_code=area_code, year=year)
+        areas = dict((area["iso3"], area) for area in self._store.all("areas"))
+
+        return GroupedStatisticsDocumentAdapter().transform_to_grouped_statistics(
+            self._select("observations", conditions), areas, group_by, percentiles)
+
+    def find_time_series(self, indicator_code, area_code=None):
+        """
+        Returns the time series of an indicator
+
+        Args:
+            indicator_code (str): The indicator code (indicator attribute in Indicator), just one indicator
+            area_code (str, optional): The area code for the observations, default to all areas
+        Returns:
+            TimeSeries: Values, year over year changes and tendencies of every area
+        """
+        conditions = self._observations_conditions(indicator_code=indicator_code, area_code=area_code)
+
+        return TimeSeriesDocumentAdapter().transform_to_time_series(self._select("observations", conditions))
+
+    def find_observations_visualisation(self, indicator_code=None, area_code=None, year=None):
+        """
+        Returns visualisation for observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+        Returns:
+            Visualisation: Observations visualisation that satisfy the filters
+        """
+        observations = self.find_observations(indicator_code=indicator_code, area_code=area_code, year=year)
+        observations_all_areas = self.find_observations(indicator_code=indicator_code, area_code='ALL', year=year)
+
+        return VisualisationDocumentAdapter().transform_to_visualisation(observations, observations_all_areas)
+
+    def find_observations_grouped_by_area_visualisation(self, indicator_code=None, area_code=None, year=None):
+        """
+        Returns grouped by area visualisation for observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+        Returns:
+            GroupedByAreaVisualisation: Observations grouped by area visualisation that satisfy the filters
+        """
+        area_code_splitted = area_code.split(',') if area_code is not None else None
+        observations = self.find_observations(indicator_code=indicator_code, area_code=area_code, year=year)
+        observations_all_areas = self.find_observations(indicator_code=indicator_code, area_code='ALL', year=year)
+        if area_code_splitted is None or len(area_code_splitted) == 0 or area_code == 'ALL':
+            area_code_splitted = [area.iso3 for area in self._area.find_countries(order="iso3")]
+
+        return GroupedByAreaVisualisationDocumentAdapter().transform_to_grouped_by_area_visualisation(
+            area_codes=area_code_splitted,
+            observations=observations,
+            observations_all_areas=observations_all_areas
+        )
+
+    @staticmethod
+    def _filter_conditions(_filter):
+        """
+        Translates an equality or $in mongodb filter into (key, accepted values) conditions
+
+        Args:
+            _filter (dict): Filter as returned by get_indicators_by_code, get_years or the area_filter
+
+        Returns:
+            list of (str, list): Key and accepted values for each filtered key
+        """
+        return [(key, value["$in"] if isinstance(value, dict) else [value]) for key, value in _filter.items()]
+
+    @staticmethod
+    def _paginate(documents, page_size, page_token):
+        """
+        Selects one page of documents in RANKING_ORDER, the same page the mongodb repository reads
+
+        Args:
+            documents (list of dict): Every document of the query
+            page_size (int): Maximum number of documents of the page
+            page_token (str): Token returned with the previous page, None for the first page
+
+        Returns:
+            (list of dict, str): Documents of the page and the token of the next page, None if it is the last one
+        """
+        check_page_size(page_size)
+        documents = sort_documents(documents, RANKING_ORDER)
+
+        if page_token is not None:
+            ranking, _id = decode_page_token(page_token)
+            after = (bson_order(ranking), bson_order(_id))
+            documents = [document for document in documents
+                         if (bson_order(document.get("ranking")), bson_order(document["_id"])) > after]
+
+        return split_page(documents[:page_size + 1], page_size)
+
+    @staticmethod
+    def _project(document, fields, required=()):
+        """
+        Copies the given fields of a document, as a mongodb projection reads them
+
+        Args:
+            document (dict): Document from the store
+            fields (list of str): Fields to copy, None to copy every field
+            required (list of str, optional): Fields copied even if they are not in fields
+
+        Returns:
+            dict: Copy of the document
+        """
+        if fields is None:
+            return dict(document)
+        return dict((field, document[field]) for field in list(fields) + list(required) if field in document)
+
+    def _select(self, collection, conditions):
+        """
+        Selects the documents satisfying every condition, the most selective indexed condition is solved with the
+        store indexes and the rest are checked on the candidates
+
+        Args:
+            collection (str): Collection name
+            conditions (list of (str, list)): Key and accepted values for each filtered key
+
+        Returns:
+            list of dict: Matching documents in natural order
+        """
+        indexed = [condition for condition in conditions if condition[0] in MemoryStore.INDEXES[collection]]
+
+        if len(indexed) == 0:
+            candidates = self._store.all(collection)
+        else:
+            candidates_per_condition = [(self._store.lookup_many(collection, condition[0], condition[1]), condition)
+                                        for condition in indexed]
+            candidates, solved = min(candidates_per_condition, key=lambda pair: len(pair[0]))
+            conditions = [condition for condition in conditions if condition is not solved]
+
+        checks = [(key, set(values)) for key, values in conditions]
+        return [document for document in candidates
+                if all(document.get(key) in values for key, values in checks)]
@@ -0,0 +1,287 @@
+__author__ = 'Herminio'
+
+import json
+import os
+import struct
+
+from infrastructure.errors.errors import IndicatorRepositoryError, AreaRepositoryError
+from infrastructure.mongo_repos.config import port, db_name, host
+from infrastructure.mongo_repos.mongo_connection import connect_to_db
+from infrastructure.mongo_repos.utils import parse_years, normalize_area_type
+
+MAGIC = b"A4AISNP1"
+FIELDS = {"value": 1, "year": 1, "indicator": 1, "area": 1, "ranking": 1, "area_type": 1, "_id": 0}
+CODE_COLUMNS = ["indicator", "area", "year", "area_type"]
+NO_RANKING = -1
+
+
+def write_snapshot(path, db=None):
+    """
+    Writes a columnar snapshot of the observations to serve reads without mongodb. The file has MAGIC, the length of
+    a JSON header and the header, then one array per column aligned to 8 bytes: values as float64, a missing value
+    mask, rankings as int64, NO_RANKING if unknown, and indicator, area, year and area type as int32 codes of the
+    header labels. Rows are sorted by indicator, year and ranking, so the header indexes the rows of each indicator
+    and year as one slice.
+
+    Note:
+        The file is written aside and renamed, processes reading the previous snapshot keep their mapping of it
+    Args:
+        path (str): Path of the snapshot file
+        db (Database, optional): Database handle to read from instead of connecting to the configured one
+
+    Returns:
+        int: Number of observations written
+    """
+    import numpy
+
+    db = connect_to_db(host=host, port=port, db_name=db_name) if db is None else db
+    rows = [(document["indicator"], document["year"], _ranking_order(document.get("ranking")), document["area"],
+             document.get("area_type"), document["value"]) for document in db["observations"].find({}, FIELDS)]
+    rows.sort(key=lambda row: row[:4])
+
+    labels = dict((column, {}) for column in CODE_COLUMNS)
+    codes = dict((column, []) for column in CODE_COLUMNS)
+    index = []
+    for position, (indicator, year, ranking, area, area_type, value) in enumerate(rows):
+        for column, label in zip(CODE_COLUMNS, [indicator, area, year, area_type]):
+            codes[column].append(labels[column].setdefault(label, len(labels[column])))
+        if len(index) == 0 or index[-1][:2] != [indicator, year]:
+            index.append([indicator, year, position, position])
+        index[-1][3] = position + 1
+
+    mask = numpy.array([value == "" or value is None for _, _, _, _, _, value in rows], dtype=bool)
+    columns = [
+        ("value", numpy.array([numpy.nan if unknown else row[5] for row, unknown in zip(rows, mask)],
+                              dtype=numpy.float64)),
+        ("mask", mask),
+        ("ranking", numpy.array([row[2] for row in rows], dtype=numpy.int64))
+    ] + [(column, numpy.array(codes[column], dtype=numpy.int32)) for column in CODE_COLUMNS]
+
+    offsets, offset = {}, 0
+    for name, array in columns:
+        offsets[name] = {"offset": offset, "dtype": array.dtype.str}
+        offset += _aligned(array.nbytes)
+
+    areas = dict((area["iso3"], [area.get("area"), area.get("income")])
+                 for area in db["areas"].find({}, {"iso3": 1, "area": 1, "income": 1, "_id": 0}))
+    header = json.dumps({
+        "rows": len(rows),
+        "columns": offsets,
+        "labels": dict((column, _decode(labels[column])) for column in CODE_COLUMNS),
+        "index": index,
+        "areas": areas
+    }).encode("utf-8")
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as snapshot:
+        snapshot.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        snapshot.write(b"\0" * (_aligned(snapshot.tell()) - snapshot.tell()))
+        for name, array in columns:
+            array.tofile(snapshot)
+            snapshot.write(b"\0" * (_aligned(array.nbytes) - array.nbytes))
+    os.rename(temporary_path, path)
+
+    return len(rows)
+
+
+class ObservationSnapshot(object):
+    """
+    Reader of a snapshot written by write_snapshot. The file is memory-mapped, so worker processes reading the same
+    snapshot share one copy of it in the page cache, and only the pages of the queried rows are read.
+
+    Note:
+        Observations are served as dictionaries with value, year, indicator, area, ranking and area_type, not as
+        Observation entities. Areas are filtered by iso3, continent or income, as the snapshot has no area names.
+    """
+
+    def __init__(self, path):
+        """
+        Constructor for ObservationSnapshot
+
+        Args:
+            path (str): Path of the snapshot file
+
+        Raises:
+            ValueError: If the file is not a snapshot
+        """
+        import numpy
+
+        with open(path, "rb") as snapshot:
+            if snapshot.read(len(MAGIC)) != MAGIC:
+                raise ValueError("%s is not an observations snapshot" % path)
+            header_length = struct.unpack("<Q", snapshot.read(8))[0]
+            header = json.loads(snapshot.read(header_length).decode("utf-8"))
+
+        self._rows = header["rows"]
+        self._labels = header["labels"]
+        self._areas = header["areas"]
+        self._index = {}
+        for indicator, year, start, stop in header["index"]:
+            self._index.setdefault(indicator, []).append((year, start, stop))
+        self._codes = dict((column, dict((label, code) for code, label in enumerate(self._labels[column])))
+                           for column in CODE_COLUMNS)
+
+        data_start = _aligned(len(MAGIC) + 8 + header_length)
+        self._file = numpy.memmap(path, dtype=numpy.uint8, mode="r")
+        self._columns = {}
+        for name, column in header["columns"].items():
+            dtype = numpy.dtype(column["dtype"])
+            start = data_start + column["offset"]
+            self._columns[name] = self._file[start:start + dtype.itemsize * self._rows].view(dtype)
+
+    def __len__(self):
+        return self._rows
+
+    def find_observations(self, indicator_code=None, area_code=None, year=None, area_type=None):
+        """
+        Returns the observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code or codes, divide them using a ','
+            area_code (str, optional): The area iso3, continent or income, divide them using a ','
+            year (str, optional): Year, years or LATEST, divide them using a ','
+            area_type (str, optional): The area type for the observation area
+        Returns:
+            list of dict: Observations with value, blank if unknown, year, indicator, area, ranking and area_type,
+                in ranking order, observations without ranking first and ties by indicator, year and area. Unlike
+                the repositories, which return Observation entities, these are plain dictionaries, as the snapshot
+                has no ids, names nor the rest of the fields Observation needs
+
+        Raises:
+            IndicatorRepositoryError: If any of the indicators does not exist
+            AreaRepositoryError: If the area does not exist
+        """
+        rows = self._select(indicator_code, area_code, year, area_type)
+        codes = [(column, self._labels[column], self._columns[column][rows]) for column in CODE_COLUMNS]
+        values, mask, rankings = [self._columns[name][rows] for name in ["value", "mask", "ranking"]]
+
+        observations = []
+        for position in range(len(rows)):
+            observation = dict((column, labels[column_codes[position]]) for column, labels, column_codes in codes)
+            observation["value"] = "" if mask[position] else float(values[position])
+            observation["ranking"] = None if rankings[position] == NO_RANKING else int(rankings[position])
+            observations.append(observation)
+        return observations
+
+    def find_observations_statistics(self, indicator_code=None, area_code=None, year=None):
+        """
+        Returns statistics for observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code or codes, divide them using a ','
+            area_code (str, optional): The area iso3, continent or income, divide them using a ','
+            year (str, optional): Year, years or LATEST, divide them using a ','
+        Returns:
+            ColumnarStatistics: Observations statistics that satisfy the filters, same figures as Statistics
+        """
+        return self._columnar_observations(self._select(indicator_code, area_code, year)).statistics()
+
+    def find_statistics_by_indicator_and_year(self, indicator_code="ALL", area_code=None, year=None):
+        """
+        Returns statistics for every indicator and year at once
+
+        Args:
+            indicator_code (str, optional): The indicator code or codes, default to all of them
+            area_code (str, optional): The area iso3, continent or income, divide them using a ','
+            year (str, optional): The year or years, default to all of them
+        Returns:
+            dict: (indicator, year) to the statistics dictionary, as Statistics.to_dict returns it
+        """
+        return self._columnar_observations(
+            self._select(indicator_code, area_code, year)).statistics_by_indicator_and_year()
+
+    def _columnar_observations(self, rows):
+        from a4ai.domain.model.observation.columnar_statistics import ColumnarObservations
+
+        return ColumnarObservations.from_arrays(
+            values=self._columns["value"][rows], mask=self._columns["mask"][rows],
+            area_types=self._columns["area_type"][rows], area_type_labels=self._labels["area_type"],
+            indicators=self._columns["indicator"][rows], indicator_labels=self._labels["indicator"],
+            years=self._columns["year"][rows], year_labels=self._labels["year"])
+
+    def _select(self, indicator_code=None, area_code=None, year=None, area_type=None):
+        """
+        Selects the rows satisfying the filters, the indicator and year ones are solved with the header index
+
+        Returns:
+            numpy.ndarray: Row numbers in ranking order
+        """
+        import numpy
+
+        years = self._years(year)
+
+        if indicator_code is None or indicator_code.lower() == "all":
+            rows = numpy.arange(self._rows)
+            if years is not None:
+                rows = self._rows_in(rows, "year", self._label_codes("year", years))
+        else:
+            slices = []
+            for code in indicator_code.upper().strip().split(","):
+                if code not in self._index:
+                    raise IndicatorRepositoryError("No indicator with code " + code)
+                slices += [numpy.arange(start, stop) for indicator_year, start, stop in self._index[code]
+                           if years is None or indicator_year in years]
+            rows = numpy.concatenate(slices) if len(slices) > 0 else numpy.arange(0)
+
+        if area_code is not None and area_code != "ALL":
+            rows = self._rows_in(rows, "area", self._area_codes(area_code))
+
+        if area_type is not None:
+            rows = self._rows_in(rows, "area_type", self._label_codes("area_type", [normalize_area_type(area_type)]))
+
+        return rows[numpy.argsort(self._columns["ranking"][rows], kind="mergesort")]
+
+    def _rows_in(self, rows, column, codes):
+        """
+        Keeps the rows whose code in a column is one of the given ones, checked with a lookup table of the codes
+        """
+        import numpy
+
+        accepted = numpy.zeros(len(self._labels[column]), dtype=bool)
+        accepted[codes] = True
+        return rows[accepted[self._columns[column][rows]]]
+
+    def _years(self, year):
+        if year is None:
+            return None
+        if year == "LATEST":
+            return [max(self._labels["year"])] if len(self._labels["year"]) > 0 else []
+        return parse_years(year)
+
+    def _label_codes(self, column, labels):
+        return [self._codes[column][label] for label in labels if label in self._codes[column]]
+
+    def _area_codes(self, area_code):
+        """
+        Returns the codes of the areas of every iso3, continent or income in area_code, divided using a ','
+
+        Raises:
+            AreaRepositoryError: If any of the codes does not match an area
+        """
+        codes = set()
+        for code in area_code.upper().split(","):
+            if code in self._codes["area"]:
+                codes.add(self._codes["area"][code])
+                continue
+
+            areas = [iso3 for iso3, groups in self._areas.items()
+                     if code in [(group or "").upper() for group in groups]]
+            if len(areas) == 0:
+                raise AreaRepositoryError("No area with code " + code)
+            codes.update(self._label_codes("area", areas))
+        return list(codes)
+
+
+def _ranking_order(ranking):
+    return NO_RANKING if ranking is None else ranking
+
+
+def _decode(codes):
+    labels = [None] * len(codes)
+    for label, code in codes.items():
+        labels[code] = label
+    return labels
+
+
+def _aligned(size):
+    return (size + 7) // 8 * 8
@@ -10,31 +10,37 @@ from a4ai.domain.model.area import area
 from a4ai.domain.model.area.country import create_country
 from a4ai.domain.model.area.region import create_region
 from config import port, db_name, host
-from .mongo_connection import connect_to_db
-from utils import uri
+from .mongo_connection import connect_to_db, register_after_fork
+from .instrumentation import record_cache_access
+from utils import uri, normalize_income, normalize_area_type
+from utility.text import fold, intern_text
+from a4ai.domain.services.typeahead import AreaTypeahead
 
 
 class AreaRepository(area.Repository):
     """
     Concrete mongodb repository for Areas.
     """
+    _query_recorder = None  # set by instrument_repository
 
-    def __init__(self, url_root):
+    def __init__(self, url_root, db=None):
         """
-        Constructor for AreaRepository
+        Constructor for AreaRepository, its caches are discarded in forked processes
 
         Args:
             url_root (str): URL root where service is deployed, it will be used to compose URIs on areas
+            db (Database, optional): Database handle to use instead of connecting to the configured one
         """
-        self._db = connect_to_db(host=host, port=port, db_name=db_name)
+        self._db = connect_to_db(host=host, port=port, db_name=db_name) if db is None else db
         self._url_root = url_root
+        register_after_fork(self, AreaRepository.invalidate_caches)
 
     def find_by_name(self, area_name):
         """
         Finds one area by its name
 
         Args:
-            area_name (str): Name of the area to query, case insensitive
+            area_name (str): Name or short name of the area to query, case and accent insensitive
 
         Returns:
             Area: The first area with the given name
@@ -42,18 +48,62 @@ class AreaRepository(area.Repository):
         Raises:
             AreaRepositoryError: If there is not an area with the given name
         """
-        area = self._db['areas'].find_one({"$or": [
-            {"name": area_name},
-            {"name": area_name.upper()},
-            {"name": area_name.title()},
-            {"name": area_name.lower()},
-            {"short_name": area_name}
-        ]})
+        area = self._db['areas'].find_one({"name_keys": fold(area_name)})
+        if area is None:  # areas stored before name keys, see migrations.add_area_name_keys
+            area = self._db['areas'].find_one({"name_keys": {"$exists": False}, "$or": [
+                {"name": area_name},
+                {"name": area_name.upper()},
+                {"name": area_name.title()},
+                {"name": area_name.lower()},
+                {"short_name": area_name}
+            ]})
         if area is None:
             raise AreaRepositoryError("No area with name " + area_name)
         self.area_uri(area)
         return AreaDocumentAdapter().transform_to_area(area)
 
+    def suggest_areas(self, prefix, limit=10):
+        """
+        Suggests areas for typeahead, from an in-memory prefix index over names, short names and search aliases
+        which is built on first use
+
+        Args:
+            prefix (str): Text typed so far, case and accent insensitive
+            limit (int, optional): Maximum number of suggestions, default to 10
+
+        Returns:
+            list of Area: Areas with a name word starting with the prefix, shortest matching names first
+        """
+        cached = 'typeahead' in self.__dict__
+        record_cache_access('typeahead', cached, self._query_recorder)
+        if not cached:
+            self.typeahead = AreaTypeahead(self.find_areas("name"))
+        return self.typeahead.suggest(prefix, limit)
+
+    def invalidate_caches(self):
+        """
+        Discards the typeahead index, it is built again on next use
+        """
+        self.__dict__.pop('typeahead', None)
+
+    def insert_area(self, area):
+        """
+        Inserts an area with its name lookup keys, income and type of countries are stored in canonical form
+
+        Args:
+            area (Area): Country or region to insert, the countries of a region are not inserted
+        """
+        area_dict = area.to_dict()
+        for key in ['id', 'uri', 'countries']:
+            area_dict.pop(key, None)
+        area_dict['name_keys'] = name_keys(area_dict)
+        if 'income' in area_dict:
+            area_dict['income'] = normalize_income(area_dict['income'])
+            area_dict['type'] = normalize_area_type(area_dict['type'])
+
+        self._db['areas'].insert(area_dict)
+        self.invalidate_caches()
+
     def find_countries_by_code_or_income(self, area_code_or_income):
         """
         Finds countries by code or income if no area is found it will search by income
@@ -106,13 +156,10 @@ class AreaRepository(area.Repository):
             AreaRepositoryCountry: If no countries are found
         """
         order = "name" if order is None else order
-        continent_or_income_or_type_upper = continent_or_income_or_type.upper()
-        continent_or_income_or_type_title = continent_or_income_or_type.title()  # Nowadays, this is the way it
-                                                                                 # is stored
-        countries = self._db['areas'].find({"$or": [
+        countries = self._db['areas'].find({"$or": [  # one indexed equality per field, stored in canonical form
             {"area": continent_or_income_or_type},
-            {"income": continent_or_income_or_type_upper},
-            {"type": continent_or_income_or_type_title}]},).sort(order, 1)
+            {"income": normalize_income(continent_or_income_or_type)},
+            {"type": normalize_area_type(continent_or_income_or_type)}]},).sort(order, 1)
 
         if countries.count() == 0:
             raise AreaRepositoryError("No countries for code " + continent_or_income_or_type)
@@ -241,6 +288,64 @@ class AreaRepository(area.Repository):
 
         self._db["areas"].update({"iso3": iso3}, {"$set": {"info": info_dict}})
 
+    def enrich_countries(self, indicator_codes=None):
+        """
+        Enriches every country with the latest known value of each indicator, values are taken from the
+        observations collection in one aggregation and written with one bulk operation
+
+        Note:
+            The info of each country is replaced as enrich_country does, countries without observations get an
+            empty info. The provider of each value is the one of its observation.
+        Args:
+            indicator_codes (list of str, optional): Indicators to include in the info, default to all of them
+
+        Returns:
+            int: Number of countries enriched
+        """
+        from bson.son import SON
+
+        match = {"value": {"$nin": ["", None]}}
+        if indicator_codes is not None:
+            match["indicator"] = {"$in": indicator_codes}
+
+        latest_values = self._db["observations"].aggregate([
+            {"$match": match},
+            # latest year first, sorted by the observations index, SON keeps the key order on python 2
+            {"$sort": SON([("area", 1), ("indicator", 1), ("year", -1)])},
+            {"$group": {
+                "_id": {"area": "$area", "indicator": "$indicator"},
+                "year": {"$first": "$year"},
+                "value": {"$first": "$value"},
+                "provider_name": {"$first": "$provider_name"},
+                "provider_url": {"$first": "$provider_url"}
+            }}
+        ], cursor={}, allowDiskUse=True)
+
+        info_by_country = dict((country["iso3"], {})
+                               for country in self._db["areas"].find({"area": {"$ne": None}}, {"iso3": 1}))
+        for latest_value in latest_values:
+            info = info_by_country.get(latest_value["_id"]["area"])
+            if info is None:  # observations of areas which are not countries
+                continue
+            info[latest_value["_id"]["indicator"]] = {
+                "year": latest_value["year"],
+                "value": latest_value["value"],
+                "provider": {
+                    "name": latest_value["provider_name"],
+                    "url": latest_value["provider_url"]
+                }
+            }
+
+        if len(info_by_country) == 0:
+            return 0
+
+        bulk = self._db["areas"].initialize_unordered_bulk_op()
+        for iso3, info in info_by_country.items():
+            bulk.find({"iso3": iso3}).update({"$set": {"info": info}})
+        bulk.execute()
+
+        return len(info_by_country)
+
     def get_areas_info(self):
         all_countries = self.find_countries(None)
         indicator_codes = set([info.indicator_code for country in all_countries for info in country.info])
@@ -260,9 +365,28 @@ class AreaRepository(area.Repository):
 
 
 
+def name_keys(area_document):
+    """
+    Returns the lookup keys of an area, its folded name and short name
+
+    Args:
+        area_document (dict): Area document in PyMongo format
+
+    Returns:
+        list of unicode: Distinct keys
+    """
+    keys = []
+    for name in [area_document.get('name'), area_document.get('short_name')]:
+        key = fold(name)
+        if key is not None and key not in keys:
+            keys.append(key)
+    return keys
+
+
 class CountryDocumentAdapter(object):
     """
-    Adapter class to transform countries from PyMongo format to Domain country objects
+    Adapter class to transform countries from PyMongo format to Domain country objects, names, codes, incomes and
+    types are interned
     """
     def transform_to_country(self, country_document):
         """
@@ -276,11 +400,12 @@ class CountryDocumentAdapter(object):
         """
         info=AreaInfoDocumentAdapter().transform_to_area_info_list(country_document['info'])\
                 if 'info' in country_document else []
-        return create_country(name=country_document['name'], short_name=country_document['short_name'],
-                              area=country_document['area'], uri=country_document['uri'],
-                              iso3=country_document['iso3'], iso2=country_document['iso2'],
-                              iso_num=country_document['iso_num'], income=country_document['income'],
-                              id=country_document['_id'], type=country_document['type'],
+        return create_country(name=intern_text(country_document['name']),
+                              short_name=intern_text(country_document['short_name']),
+                              area=intern_text(country_document['area']), uri=country_document['uri'],
+                              iso3=intern_text(country_document['iso3']), iso2=country_document['iso2'],
+                              iso_num=country_document['iso_num'], income=intern_text(country_document['income']),
+                              id=country_document['_id'], type=intern_text(country_document['type']),
                               search=country_document['search'],
                               info=info)
 
@@ -0,0 +1,154 @@
+__author__ = 'Herminio'
+
+import logging
+import threading
+from timeit import default_timer
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer(object):
+    """
+    Preloads the repository caches so first requests after a deploy do not pay for cold lookups. Areas, indicators
+    and the year catalog are loaded in parallel threads, then the popular observation sets are preloaded in
+    parallel too, as they need the other caches to be enriched.
+
+    Note:
+        A failing stage is logged and reported, warm-up goes on, as caches are also filled on first use. The
+        warmer is ready once every stage has finished.
+    """
+    def __init__(self, observation_repository, observation_sets=None, max_threads=4):
+        """
+        Constructor for CacheWarmer
+
+        Args:
+            observation_repository (ObservationRepository): Mongodb repository to warm, the area repository it holds
+                is warmed too
+            observation_sets (list of (str, str), optional): Indicator code and year of the observation sets to
+                preload, default to every Index and SubIndex indicator for the LATEST year
+            max_threads (int, optional): Maximum number of observation sets preloaded at once, default to 4
+        """
+        self._repository = observation_repository
+        self._observation_sets = observation_sets
+        self._max_threads = max_threads
+        self._ready = threading.Event()
+        self._report = {}
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until warm-up completes
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait, default to wait forever
+
+        Returns:
+            bool: True if warm-up completed
+        """
+        self._ready.wait(timeout)
+        return self._ready.is_set()
+
+    def start(self):
+        """
+        Runs warm-up in a background thread
+
+        Returns:
+            Thread: The started daemon thread
+        """
+        thread = threading.Thread(target=self.warm_up, name="cache-warmer")
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def warm_up(self):
+        """
+        Runs every stage and marks the warmer as ready
+
+        Returns:
+            dict: Stage name to its seconds, number of items loaded and error, if any, see report
+        """
+        start = default_timer()
+        self._ready.clear()
+        self._report = {}
+
+        self._run_parallel([("areas", self._warm_areas), ("indicators", self._warm_indicators),
+                            ("years", self._warm_years)])
+        self._run_stage("observations", self._warm_observations)
+
+        self._report["total"] = {"seconds": default_timer() - start, "items": None, "error": None}
+        self._ready.set()
+        logger.info("Caches warmed in %.1f ms", self._report["total"]["seconds"] * 1000)
+        return self.report()
+
+    def report(self):
+        """
+        Returns the timing of each stage of the last warm-up
+
+        Returns:
+            dict: Stage name, and total, to a dictionary with seconds, items and error
+        """
+        return dict((stage, dict(result)) for stage, result in self._report.items())
+
+    def _run_parallel(self, stages):
+        threads = [threading.Thread(target=self._run_stage, args=stage, name="cache-warmer-" + stage[0])
+                   for stage in stages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _run_stage(self, name, function):
+        start = default_timer()
+        items, error = None, None
+        try:
+            items = function()
+        except Exception as e:
+            error = repr(e)
+            logger.exception("Cache warm-up stage %s failed", name)
+        self._report[name] = {"seconds": default_timer() - start, "items": items, "error": error}
+
+    def _warm_areas(self):
+        areas = self._repository._local_areas()
+        self._repository._area.suggest_areas("")
+        return len(areas)
+
+    def _warm_indicators(self):
+        return len(self._repository._local_indicators())
+
+    def _warm_years(self):
+        return len(self._repository._year_catalog())
+
+    def _warm_observations(self):
+        observation_sets = self._observation_sets
+        if observation_sets is None:
+            observation_sets = [(code, "LATEST") for code, indicator in
+                                sorted(self._repository._local_indicators().items())
+                                if indicator.get("type") in ("Index", "SubIndex")]
+
+        pending = list(observation_sets)
+        lock = threading.Lock()
+        counts, errors = [], []
+
+        def preload():
+            while True:
+                with lock:
+                    if len(pending) == 0:
+                        return
+                    indicator_code, year = pending.pop(0)
+                try:
+                    counts.append(self._repository.preload_observations(indicator_code, year))
+                except Exception as e:
+                    errors.append("%s for %s: %r" % (indicator_code, year, e))
+
+        workers = [threading.Thread(target=preload) for _ in range(min(self._max_threads, len(pending)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if len(errors) > 0:
+            raise RuntimeError("Observation sets not preloaded: " + "; ".join(errors))
+        return sum(counts)
@@ -3,3 +3,4 @@ __author__ = 'guillermo'
 host = '127.0.0.1'
 port = 27017
 db_name = 'a4ai'
+slow_call_threshold = 0.5  # seconds, repository calls slower than this are logged
@@ -0,0 +1,113 @@
+__author__ = 'Herminio'
+
+import csv
+import json
+import logging
+from collections import OrderedDict
+from timeit import default_timer
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ["indicator", "indicator_name", "area", "area_name", "area_type", "year", "value", "ranking",
+                  "ranking_type"]
+FORMATS = ("csv", "jsonl")
+
+
+class ObservationExporter(object):
+    """
+    Streams observations from a repository to CSV or JSON Lines, rows are written as they are read from the
+    database cursor, so memory does not grow with the number of exported observations
+
+    Note:
+        Any repository with stream_observations could be exported, the mongodb and the memory ones have it
+    """
+
+    def __init__(self, observation_repository, batch_size=1000, progress_every=10000):
+        """
+        Constructor for ObservationExporter
+
+        Args:
+            observation_repository (ObservationRepository): Repository to read observations from
+            batch_size (int, optional): Number of documents read per round trip, default to 1000
+            progress_every (int, optional): Number of rows between progress reports, default to 10000
+        """
+        self._repository = observation_repository
+        self._batch_size = batch_size
+        self._progress_every = progress_every
+
+    def export(self, stream, output_format="csv", columns=None, indicator_code=None, area_code=None, year=None,
+               area_type=None, progress=None):
+        """
+        Writes the observations that satisfy the given filters to a stream
+
+        Args:
+            stream (file): Writable stream, binary on python 2 and text on python 3 for csv
+            output_format (str, optional): "csv", with a header row, or "jsonl", one JSON object per line, default to
+                "csv"
+            columns (list of str, optional): Observation fields to write in order, default to EXPORT_COLUMNS
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            progress (function, optional): Called with the rows written and the seconds spent so far every
+                progress_every rows and at the end
+
+        Returns:
+            dict: Rows written, seconds spent and rows per second
+
+        Raises:
+            ValueError: If the output format is unknown
+        """
+        if output_format not in FORMATS:
+            raise ValueError("Unknown export format %s, expected one of %s" % (output_format, ", ".join(FORMATS)))
+        columns = list(EXPORT_COLUMNS if columns is None else columns)
+
+        start = default_timer()
+        documents = self._repository.stream_observations(indicator_code=indicator_code, area_code=area_code,
+                                                         year=year, area_type=area_type, fields=columns,
+                                                         batch_size=self._batch_size)
+        write_row = _csv_writer(stream, columns) if output_format == "csv" else _jsonl_writer(stream, columns)
+
+        rows = 0
+        for document in documents:
+            write_row(document)
+            rows += 1
+            if rows % self._progress_every == 0:
+                self._report_progress(progress, rows, default_timer() - start)
+
+        seconds = default_timer() - start
+        if rows == 0 or rows % self._progress_every != 0:
+            self._report_progress(progress, rows, seconds)
+
+        return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds > 0 else None}
+
+    @staticmethod
+    def _report_progress(progress, rows, seconds):
+        logger.info("Exported %d observations in %.1f s (%.0f rows/s)", rows, seconds,
+                    rows / seconds if seconds > 0 else 0)
+        if progress is not None:
+            progress(rows, seconds)
+
+
+def _csv_writer(stream, columns):
+    writer = csv.writer(stream)
+    writer.writerow(columns)
+
+    def write_row(document):
+        writer.writerow([_csv_cell(document.get(column)) for column in columns])
+    return write_row
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if not isinstance(value, str) and hasattr(value, "encode"):  # unicode on python 2, csv writes bytes there
+        return value.encode("utf-8")
+    return value
+
+
+def _jsonl_writer(stream, columns):
+    def write_row(document):
+        stream.write(json.dumps(OrderedDict((column, document.get(column)) for column in columns), default=str))
+        stream.write("\n")
+    return write_row
@@ -0,0 +1,75 @@
+__author__ = 'Herminio'
+
+ASCENDING = 1  # as pymongo.ASCENDING, not imported to keep imports light
+
+# Order of find_observations results. Observations without ranking (null) come first, as mongodb sorts null values
+# before numbers, and _id breaks ties so the order is total and stable between queries
+RANKING_ORDER = [("ranking", ASCENDING), ("_id", ASCENDING)]
+
+# Key of an observation, (indicator, area, year) is unique. Area goes first so the index also serves area queries
+OBSERVATION_KEY = [("area", ASCENDING), ("indicator", ASCENDING), ("year", ASCENDING)]
+
+# Observations and linked observations are filtered the same way, see ObservationRepository._observations_search,
+# and read in RANKING_ORDER
+OBSERVATION_INDEXES = [
+    RANKING_ORDER,
+    [("indicator", ASCENDING), ("year", ASCENDING)] + RANKING_ORDER,
+    [("area_type", ASCENDING)]
+]
+
+INDEXES = {
+    "observations": OBSERVATION_INDEXES,
+    "linked_observations": OBSERVATION_INDEXES + [OBSERVATION_KEY],  # not unique, it serves the area queries
+    "areas": [
+        [("iso3", ASCENDING)],
+        [("iso2", ASCENDING)],
+        [("name", ASCENDING)],
+        [("name_keys", ASCENDING)],
+        [("area", ASCENDING)],
+        [("income", ASCENDING)],
+        [("type", ASCENDING)]
+    ],
+    "indicators": [
+        [("indicator", ASCENDING)],
+        [("type", ASCENDING)]
+    ]
+}
+
+UNIQUE_INDEXES = {
+    "observations": [
+        OBSERVATION_KEY
+    ]
+}
+
+
+def ensure_indexes(db, collections=None):
+    """
+    Creates the indexes used by the repositories queries, existing ones are not rebuilt
+
+    Args:
+        db (Database): Database where the collections are
+        collections (list of str, optional): Collections to index, default to every collection in INDEXES
+
+    Returns:
+        dict: Collection name to the list of its index keys, unique ones included
+    """
+    collections = sorted(INDEXES.keys()) if collections is None else collections
+
+    for collection in collections:
+        ensure_collection_indexes(db[collection], collection)
+
+    return dict((collection, INDEXES[collection] + UNIQUE_INDEXES.get(collection, [])) for collection in collections)
+
+
+def ensure_collection_indexes(collection, name):
+    """
+    Creates the indexes of one collection, it could be a copy of the collection under another name
+
+    Args:
+        collection (Collection): Collection to index
+        name (str): Name of the collection in INDEXES
+    """
+    for keys in INDEXES.get(name, []):
+        collection.ensure_index(keys)
+    for keys in UNIQUE_INDEXES.get(name, []):
+        collection.ensure_index(keys, unique=True)
@@ -5,8 +5,9 @@ from infrastructure.errors.errors import IndicatorRepositoryError
 from a4ai.domain.model.indicator.indicator import Repository, Indicator
 from config import port, db_name, host
 from .mongo_connection import connect_to_db
-from utils import error, success, uri, normalize_group_name
+from utils import error, success, uri, normalize_group_name, insert_in_chunks
 from a4ai.domain.model.indicator.indicator import create_indicator
+from utility.text import intern_text
 
 
 class IndicatorRepository(Repository):
@@ -14,14 +15,15 @@ class IndicatorRepository(Repository):
     Concrete mongodb repository for Indicators.
     """
 
-    def __init__(self, url_root):
+    def __init__(self, url_root, db=None):
         """
         Constructor for IndicatorRepository
 
         Args:
             url_root (str): URL root where service is deployed, it will be used to compose URIs on areas
+            db (Database, optional): Database handle to use instead of connecting to the configured one
         """
-        self._db = connect_to_db(host=host, port=port, db_name=db_name)
+        self._db = connect_to_db(host=host, port=port, db_name=db_name) if db is None else db
         self._url_root = url_root
 
     def find_indicator_by_code(self, indicator_code):
@@ -182,23 +184,49 @@ class IndicatorRepository(Repository):
 
     def insert_indicator(self, indicator, indicator_uri=None, component_name=None, subindex_name=None, index_name=None,
                          weight=None, provider_name=None, provider_url=None, is_percentage=None, scale=None):
-        indicator_dict = {}
-        indicator_dict["index"] = normalize_group_name(index_name)
-        indicator_dict["subindex"] = normalize_group_name(subindex_name)
-        indicator_dict["indicator"] = indicator.indicator
-        indicator_dict["name"] = indicator.name
-        indicator_dict["description"] = indicator.description
-        indicator_dict["type"] = indicator.type
-        indicator_dict["parent"] = normalize_group_name(component_name)
-        indicator_dict['uri'] = indicator_uri
-        indicator_dict['republish'] = indicator.republish
-        indicator_dict['provider_name'] = provider_name
-        indicator_dict['provider_url'] = provider_url
-        indicator_dict['is_percentage'] = is_percentage
-        indicator_dict['scale'] = scale
+        indicator_dict = indicator_document(indicator.indicator, indicator.name, indicator.description, indicator.type,
+                                            indicator.republish, indicator_uri=indicator_uri,
+                                            component_name=component_name, subindex_name=subindex_name,
+                                            index_name=index_name, provider_name=provider_name,
+                                            provider_url=provider_url, is_percentage=is_percentage, scale=scale)
 
         self._db['indicators'].insert(indicator_dict)
 
+    def insert_indicators(self, indicator_documents, chunk_size=5000):
+        """
+        Inserts indicator documents, as built by indicator_document, with one insert per chunk
+
+        Args:
+            indicator_documents (iterable of dict): Indicator documents to insert
+            chunk_size (int, optional): Number of documents per insert, default to 5000
+
+        Returns:
+            int: Number of indicators inserted
+        """
+        return insert_in_chunks(self._db['indicators'], indicator_documents, chunk_size)
+
+    def upsert_indicators(self, indicator_documents):
+        """
+        Replaces the stored indicators with the same code as the given documents, or inserts them, in one bulk
+        operation
+
+        Args:
+            indicator_documents (list of dict): Indicator documents, as built by indicator_document
+
+        Returns:
+            int: Number of indicators written
+        """
+        if len(indicator_documents) == 0:
+            return 0
+
+        bulk = self._db['indicators'].initialize_unordered_bulk_op()
+        for document in indicator_documents:
+            document = dict((key, value) for key, value in document.items() if key != "_id")
+            bulk.find({"indicator": document["indicator"]}).upsert().replace_one(document)
+        bulk.execute()
+
+        return len(indicator_documents)
+
     def update_indicator_weight(self, indicator_code, weight=None):
         indicator = self.find_indicator_by_code(indicator_code)
         if indicator["success"]:
@@ -207,9 +235,51 @@ class IndicatorRepository(Repository):
             self._db['indicators'].update({'_id': indicator["_id"]}, {"$set": indicator}, upsert=False)
 
 
+def indicator_document(code, name, description, _type, republish, indicator_uri=None, component_name=None,
+                       subindex_name=None, index_name=None, provider_name=None, provider_url=None, is_percentage=None,
+                       scale=None):
+    """
+    Builds the document stored for an indicator, group names are stored normalized
+
+    Args:
+        code (str): Code of the indicator (indicator attribute in Indicator)
+        name (str): Name of the indicator
+        description (str): Description of the indicator
+        _type (str): Type of the indicator, e.g.: Index, SubIndex, Component or Primary
+        republish (bool): True if republish is allowed
+        indicator_uri (str, optional): URI of the indicator
+        component_name (str, optional): Name of the parent component
+        subindex_name (str, optional): Name of the subindex
+        index_name (str, optional): Name of the index
+        provider_name (str, optional): Name of the provider
+        provider_url (str, optional): URL of the provider
+        is_percentage (bool, optional): True if values are percentages
+        scale (str, optional): Scale of the values
+
+    Returns:
+        dict: Indicator document in PyMongo format
+    """
+    indicator_dict = {}
+    indicator_dict["index"] = normalize_group_name(index_name)
+    indicator_dict["subindex"] = normalize_group_name(subindex_name)
+    indicator_dict["indicator"] = code
+    indicator_dict["name"] = name
+    indicator_dict["description"] = description
+    indicator_dict["type"] = _type
+    indicator_dict["parent"] = normalize_group_name(component_name)
+    indicator_dict['uri'] = indicator_uri
+    indicator_dict['republish'] = republish
+    indicator_dict['provider_name'] = provider_name
+    indicator_dict['provider_url'] = provider_url
+    indicator_dict['is_percentage'] = is_percentage
+    indicator_dict['scale'] = scale
+    return indicator_dict
+
+
 class IndicatorDocumentAdapter(object):
     """
-    Adapter class to transform indicators from PyMongo format to Domain indicator objects
+    Adapter class to transform indicators from PyMongo format to Domain indicator objects, names, codes, types and
+    providers are interned
     """
     def transform_to_indicator(self, indicator_document):
         """
@@ -222,16 +292,16 @@ class IndicatorDocumentAdapter(object):
             Indicator: Indicator object with the data in indicator_document
         """
         return create_indicator(id=indicator_document['_id'],
-                                index=indicator_document['index'],
-                                indicator=indicator_document['indicator'],
-                                name=indicator_document['name'],
-                                parent=indicator_document['parent'],
-                                subindex=indicator_document['subindex'],
-                                type=indicator_document['type'],
-                                provider_url=indicator_document['provider_url'],
+                                index=intern_text(indicator_document['index']),
+                                indicator=intern_text(indicator_document['indicator']),
+                                name=intern_text(indicator_document['name']),
+                                parent=intern_text(indicator_document['parent']),
+                                subindex=intern_text(indicator_document['subindex']),
+                                type=intern_text(indicator_document['type']),
+                                provider_url=intern_text(indicator_document['provider_url']),
                                 description=indicator_document['description'],
                                 uri=indicator_document['uri'],
-                                provider_name=indicator_document['provider_name'],
+                                provider_name=intern_text(indicator_document['provider_name']),
                                 republish=indicator_document['republish'],
                                 children=self.transform_to_indicator_list(indicator_document['children']),
                                 is_percentage=indicator_document['is_percentage'],
@@ -0,0 +1,577 @@
+__author__ = 'Herminio'
+
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from timeit import default_timer
+from types import GeneratorType
+
+from infrastructure.errors.errors import QueryBudgetExceededError
+
+logger = logging.getLogger(__name__)
+
+NESTED_REPOSITORIES = ["_indicator", "_area"]
+
+
+class CallRecord(object):
+    """
+    Database usage of one call to a public repository method
+
+    Attributes:
+        name (str): Call name, e.g.: ObservationRepository.find_observations
+        queries (list of tuple): Collection, operation and filter of every query sent
+        documents (int): Documents returned by the database
+        documents_scanned (int): Documents examined by the database, only known if queries are explained
+        database_seconds (float): Seconds spent waiting for the database
+        seconds (float): Seconds spent in the call, database time included
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = []
+        self.documents = 0
+        self.documents_scanned = 0
+        self.database_seconds = 0.0
+        self.seconds = 0.0
+
+
+class CallStatistics(object):
+    """
+    Accumulated database usage of one public repository method
+
+    Attributes:
+        calls (int): Number of calls to the method
+        queries (int): Queries sent to the database, a cursor count counts as one more query
+        documents (int): Documents returned by the database
+        documents_scanned (int): Documents examined by the database, only known if queries are explained
+        database_seconds (float): Seconds spent waiting for the database
+        seconds (float): Seconds spent in the method, database time included
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+        self.documents = 0
+        self.documents_scanned = 0
+        self.database_seconds = 0.0
+        self.seconds = 0.0
+
+    def add(self, record):
+        """
+        Accumulates one call
+
+        Args:
+            record (CallRecord): Usage of the call
+        """
+        self.calls += 1
+        self.queries += len(record.queries)
+        self.documents += record.documents
+        self.documents_scanned += record.documents_scanned
+        self.database_seconds += record.database_seconds
+        self.seconds += record.seconds
+
+    def to_dict(self):
+        """
+        Converts self object to dictionary
+
+        Returns:
+            dict: Dictionary representation of self object
+        """
+        return {
+            'calls': self.calls,
+            'queries': self.queries,
+            'documents': self.documents,
+            'documents_scanned': self.documents_scanned,
+            'database_seconds': self.database_seconds,
+            'seconds': self.seconds,
+            'queries_per_call': self.queries / float(self.calls) if self.calls > 0 else 0
+        }
+
+
+class QueryRecorder(object):
+    """
+    Records the queries sent through instrumented databases and attributes them to the outermost public repository
+    call being executed in the current thread. Queries made outside any repository call are attributed to None.
+
+    Attributes:
+        explain_queries (bool): If True every find is explained once iterated to know the documents scanned, it
+            doubles the queries so it should only be enabled while profiling
+    """
+
+    def __init__(self, explain_queries=False):
+        self.explain_queries = explain_queries
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._statistics = {}
+        self._caches = {}
+        self._listeners = []
+        self._queries = 0
+
+    @property
+    def queries(self):
+        """Total number of queries recorded"""
+        return self._queries
+
+    def statistics(self):
+        """
+        Returns the usage recorded per repository call
+
+        Returns:
+            dict: Call name, e.g.: ObservationRepository.find_observations, to CallStatistics dictionary
+        """
+        with self._lock:
+            return dict((name, statistics.to_dict()) for name, statistics in self._statistics.items())
+
+    def cache_statistics(self):
+        """
+        Returns the accesses recorded per cache
+
+        Returns:
+            dict: Cache name to a dictionary with hits, misses and hit_ratio
+        """
+        with self._lock:
+            return dict((name, {'hits': hits, 'misses': misses,
+                                'hit_ratio': hits / float(hits + misses) if hits + misses > 0 else 0})
+                        for name, (hits, misses) in self._caches.items())
+
+    def reset(self):
+        with self._lock:
+            self._statistics = {}
+            self._caches = {}
+            self._queries = 0
+
+    def add_listener(self, listener):
+        """
+        Adds a listener called with the CallRecord of every finished repository call, its exceptions are logged
+
+        Args:
+            listener (callable): Unary callable receiving a CallRecord
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def record_query(self, collection, operation, spec):
+        """
+        Records one query sent to the database
+
+        Args:
+            collection (str): Collection name
+            operation (str): Collection or cursor method, e.g.: find, find_one or count
+            spec (dict): Query filter, if any
+        """
+        query = (collection, operation, spec)
+        with self._lock:
+            self._queries += 1
+        record = self._current_record()
+        if record is None:
+            with self._lock:
+                self._statistics.setdefault(None, CallStatistics()).queries += 1
+        else:
+            record.queries.append(query)
+        for budget in self._budgets():
+            budget.append(query)
+
+    def record_documents(self, documents, seconds):
+        """
+        Records documents returned by the database and the time spent waiting for them
+
+        Args:
+            documents (int): Number of documents returned
+            seconds (float): Time spent in the database driver
+        """
+        record = self._current_record()
+        if record is None:
+            with self._lock:
+                statistics = self._statistics.setdefault(None, CallStatistics())
+                statistics.documents += documents
+                statistics.database_seconds += seconds
+        else:
+            record.documents += documents
+            record.database_seconds += seconds
+
+    def record_scanned(self, documents):
+        """
+        Records documents examined by the database to answer a query
+
+        Args:
+            documents (int): Number of documents examined
+        """
+        record = self._current_record()
+        if record is None:
+            with self._lock:
+                self._statistics.setdefault(None, CallStatistics()).documents_scanned += documents
+        else:
+            record.documents_scanned += documents
+
+    def record_cache_access(self, cache, hit):
+        """
+        Records one access to a repository cache
+
+        Args:
+            cache (str): Cache name
+            hit (bool): True if the value was cached, otherwise False
+        """
+        with self._lock:
+            hits, misses = self._caches.get(cache, (0, 0))
+            self._caches[cache] = (hits + 1, misses) if hit else (hits, misses + 1)
+
+    @contextmanager
+    def call(self, name, record=None):
+        """
+        Context manager attributing the queries made inside it to a repository call, nested calls are attributed to
+        the outermost one
+
+        Args:
+            name (str): Call name
+            record (CallRecord, optional): Record of a call going on, e.g.: a generator between its items, it is
+                not finished on exit, see finish
+
+        Yields:
+            CallRecord: Record the queries are attributed to, the one of the outermost call
+        """
+        stack = self._stack()
+        stack.append(name)
+        outermost = len(stack) == 1
+        if outermost:
+            self._local.record = CallRecord(name) if record is None else record
+        start = default_timer()
+        try:
+            yield self._local.record
+        finally:
+            stack.pop()
+            if outermost:
+                current, self._local.record = self._local.record, None
+                current.seconds += default_timer() - start
+                if record is None:
+                    self.finish(current)
+
+    def finish(self, record):
+        """
+        Accumulates a finished repository call and sends it to the listeners
+
+        Args:
+            record (CallRecord): Usage of the call
+        """
+        self._add(record)
+        for listener in self._listeners:
+            try:
+                listener(record)
+            except Exception:  # the result, or exception, of the call must not be replaced
+                logger.exception("Listener %r failed on call %s", listener, record.name)
+
+    @contextmanager
+    def budget(self, max_queries):
+        """
+        Context manager failing if the code inside it sends more than max_queries queries in this thread
+
+        Args:
+            max_queries (int): Maximum number of queries allowed
+
+        Raises:
+            QueryBudgetExceededError: On exit, if the budget was exceeded
+        """
+        queries = []
+        self._budgets().append(queries)
+        try:
+            yield queries
+        finally:
+            self._budgets().remove(queries)
+        if len(queries) > max_queries:
+            raise QueryBudgetExceededError(max_queries, queries)
+
+    def _add(self, record):
+        with self._lock:
+            self._statistics.setdefault(record.name, CallStatistics()).add(record)
+
+    def _current_record(self):
+        return getattr(self._local, "record", None)
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _budgets(self):
+        if not hasattr(self._local, "budgets"):
+            self._local.budgets = []
+        return self._local.budgets
+
+
+recorder = QueryRecorder()
+
+
+class InstrumentedDatabase(object):
+    """
+    Database handle wrapper that records every query, the documents returned and the time spent in the driver
+    """
+
+    def __init__(self, db, query_recorder=None):
+        """
+        Constructor for InstrumentedDatabase
+
+        Args:
+            db (Database): Database handle to wrap
+            query_recorder (QueryRecorder, optional): Recorder to report to, default to the module recorder
+        """
+        self._db = db
+        self._recorder = recorder if query_recorder is None else query_recorder
+
+    @property
+    def recorder(self):
+        return self._recorder
+
+    @property
+    def wrapped(self):
+        return self._db
+
+    def __getitem__(self, name):
+        return InstrumentedCollection(self._db[name], name, self._recorder)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class InstrumentedCollection(object):
+    """
+    Collection wrapper used by InstrumentedDatabase
+    """
+    _RECORDED = {"find_one", "distinct", "aggregate", "insert", "update", "remove", "save", "count",
+                 "find_and_modify", "group", "map_reduce"}
+
+    def __init__(self, collection, name, query_recorder):
+        self._collection = collection
+        self._name = name
+        self._recorder = query_recorder
+
+    def find(self, spec=None, *args, **kwargs):
+        self._recorder.record_query(self._name, "find", spec)
+        start = default_timer()
+        cursor = self._collection.find(spec, *args, **kwargs)
+        self._recorder.record_documents(0, default_timer() - start)
+        return InstrumentedCursor(cursor, self._name, spec, self._recorder)
+
+    def initialize_ordered_bulk_op(self):
+        return InstrumentedBulkOperation(self._collection.initialize_ordered_bulk_op(), self._name, self._recorder)
+
+    def initialize_unordered_bulk_op(self):
+        return InstrumentedBulkOperation(self._collection.initialize_unordered_bulk_op(), self._name, self._recorder)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name not in self._RECORDED:
+            return attribute
+
+        def recorded(*args, **kwargs):
+            self._recorder.record_query(self._name, name, args[0] if len(args) > 0 else kwargs.get("spec"))
+            start = default_timer()
+            result = attribute(*args, **kwargs)
+            documents = 1 if name == "find_one" and result is not None else 0
+            self._recorder.record_documents(documents, default_timer() - start)
+            return result
+        return recorded
+
+
+class InstrumentedBulkOperation(object):
+    """
+    Bulk operation wrapper used by InstrumentedCollection, the execution is recorded as one query
+    """
+
+    def __init__(self, bulk, collection, query_recorder):
+        self._bulk = bulk
+        self._collection = collection
+        self._recorder = query_recorder
+
+    def execute(self, *args, **kwargs):
+        self._recorder.record_query(self._collection, "bulk_write", None)
+        start = default_timer()
+        result = self._bulk.execute(*args, **kwargs)
+        self._recorder.record_documents(0, default_timer() - start)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._bulk, name)
+
+
+class InstrumentedCursor(object):
+    """
+    Cursor wrapper used by InstrumentedCollection, documents are recorded as they are iterated
+    """
+
+    def __init__(self, cursor, collection, spec, query_recorder):
+        self._cursor = cursor
+        self._collection = collection
+        self._spec = spec
+        self._recorder = query_recorder
+
+    def count(self, *args, **kwargs):
+        self._recorder.record_query(self._collection, "count", self._spec)
+        start = default_timer()
+        result = self._cursor.count(*args, **kwargs)
+        self._recorder.record_documents(0, default_timer() - start)
+        return result
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, *args, **kwargs):
+        self._cursor.limit(*args, **kwargs)
+        return self
+
+    def batch_size(self, *args, **kwargs):
+        self._cursor.batch_size(*args, **kwargs)
+        return self
+
+    def __iter__(self):
+        iterator = iter(self._cursor)
+        while True:
+            start = default_timer()
+            try:
+                document = next(iterator)
+            except StopIteration:
+                self._recorder.record_documents(0, default_timer() - start)
+                if self._recorder.explain_queries:
+                    self._recorder.record_scanned(documents_scanned(self._cursor.explain()))
+                return
+            self._recorder.record_documents(1, default_timer() - start)
+            yield document
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def instrument_repository(repository, query_recorder=None):
+    """
+    Instruments a mongodb repository: its database handle, and the ones of the repositories it holds in
+    NESTED_REPOSITORIES, are wrapped by an InstrumentedDatabase and its public methods attribute the queries they
+    make to themselves
+
+    Args:
+        repository: Repository to instrument, it is modified
+        query_recorder (QueryRecorder, optional): Recorder to report to, default to the module recorder
+
+    Returns:
+        The instrumented repository
+    """
+    query_recorder = recorder if query_recorder is None else query_recorder
+
+    if isinstance(repository._db, InstrumentedDatabase):
+        return repository
+
+    for name in NESTED_REPOSITORIES:  # other attributes, e.g.: driver objects, answer to any attribute name
+        nested = vars(repository).get(name)
+        if nested is not None:
+            instrument_repository(nested, query_recorder)
+
+    repository._db = InstrumentedDatabase(repository._db, query_recorder)
+    repository._query_recorder = query_recorder  # cache accesses are reported to it, see record_cache_access
+
+    for name in dir(type(repository)):
+        method = getattr(repository, name)
+        if not name.startswith("_") and callable(method):
+            setattr(repository, name, _recorded_call(method, "%s.%s" % (type(repository).__name__, name),
+                                                     query_recorder))
+
+    return repository
+
+
+def query_budget(max_queries, query_recorder=None):
+    """
+    Context manager failing if the code inside it sends more than max_queries queries through instrumented
+    databases. It is meant for tests, so N+1 regressions are caught automatically, e.g.:
+
+        with query_budget(5):
+            repository.find_observations(indicator_code="INDEX", year="2014")
+
+    Args:
+        max_queries (int): Maximum number of queries allowed
+        query_recorder (QueryRecorder, optional): Recorder to watch, default to the module recorder
+
+    Raises:
+        QueryBudgetExceededError: On exit, if the budget was exceeded
+    """
+    return (recorder if query_recorder is None else query_recorder).budget(max_queries)
+
+
+def assert_max_queries(max_queries, function, *args, **kwargs):
+    """
+    Calls function with the given arguments failing if it sends more than max_queries queries
+
+    Note:
+        A query_recorder keyword argument, the recorder to watch, is not passed to the function, default to the
+        module recorder
+    Returns:
+        The function result
+
+    Raises:
+        QueryBudgetExceededError: If the budget was exceeded
+    """
+    with query_budget(max_queries, kwargs.pop("query_recorder", None)):
+        return function(*args, **kwargs)
+
+
+def record_cache_access(cache, hit, query_recorder=None):
+    """
+    Records one access to a repository cache
+
+    Args:
+        cache (str): Cache name
+        hit (bool): True if the value was cached, otherwise False
+        query_recorder (QueryRecorder, optional): Recorder to report to, the one the repository was instrumented with,
+            default to the module recorder
+    """
+    (recorder if query_recorder is None else query_recorder).record_cache_access(cache, hit)
+
+
+def documents_scanned(explanation):
+    """
+    Extracts the number of documents examined from the explain output of a query, it understands both the legacy
+    format (nscannedObjects) and the executionStats one
+
+    Args:
+        explanation (dict): Output of Cursor.explain
+
+    Returns:
+        int: Documents examined, 0 if unknown
+    """
+    if "executionStats" in explanation:
+        return explanation["executionStats"].get("totalDocsExamined", 0)
+    return explanation.get("nscannedObjects", explanation.get("nscanned", 0))
+
+
+def _recorded_call(method, name, query_recorder):
+    @wraps(method)
+    def recorded(*args, **kwargs):
+        record, streamed = CallRecord(name), False
+        try:
+            with query_recorder.call(name, record) as current:
+                result = method(*args, **kwargs)
+                streamed = isinstance(result, GeneratorType)  # e.g.: stream_observations, iterated later
+        finally:
+            if current is record and not streamed:  # nested calls are attributed to the outermost one
+                query_recorder.finish(record)
+        if current is record and streamed:
+            return _recorded_generator(result, record, query_recorder)
+        return result
+    return recorded
+
+
+def _recorded_generator(generator, record, query_recorder):
+    """
+    Iterates a generator returned by a repository method inside the call of the method, so the queries sent while
+    it is iterated are attributed to it. The call is finished once the generator is exhausted or closed, the
+    consumer code between its items is not attributed to it.
+    """
+    try:
+        while True:
+            with query_recorder.call(record.name, record):
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        query_recorder.finish(record)
@@ -0,0 +1,234 @@
+__author__ = 'Herminio'
+
+import json
+import logging
+import threading
+
+from .config import slow_call_threshold
+from .instrumentation import recorder
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of call latencies with fixed buckets, as Prometheus histograms
+
+    Attributes:
+        buckets (tuple of float): Upper bounds of the buckets in seconds, an infinite bucket is always added
+        count (int): Number of observations
+        sum (float): Sum of the observed seconds
+    """
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, seconds):
+        """
+        Adds one observation
+
+        Args:
+            seconds (float): Observed latency
+        """
+        position = len(self.buckets)
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                position = index
+                break
+        self._counts[position] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        """
+        Returns the cumulative count of each bucket
+
+        Returns:
+            list of (str, int): Bucket upper bound, "+Inf" for the last one, and observations below it
+        """
+        result, total = [], 0
+        for bound, count in zip([repr(bound) for bound in self.buckets] + ["+Inf"], self._counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def percentile(self, percent):
+        """
+        Estimates a percentile as the upper bound of the bucket where it falls
+
+        Args:
+            percent (int): Percentile to estimate, from 0 to 100
+
+        Returns:
+            float: Estimated latency in seconds, None for the infinite bucket
+        """
+        if self.count == 0:
+            return 0
+        rank = percent / 100.0 * self.count
+        for index, (_, total) in enumerate(self.cumulative()):
+            if total >= rank:
+                return self.buckets[index] if index < len(self.buckets) else None
+
+    def to_dict(self):
+        """
+        Converts self object to dictionary
+
+        Returns:
+            dict: Dictionary representation of self object
+        """
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': self.cumulative(),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+
+class RepositoryMetrics(object):
+    """
+    Metrics of the public methods of instrumented repositories: latency histograms, queries sent, documents returned
+    and scanned, and cache hit ratios. Calls slower than the threshold are logged with the normalized filters of the
+    queries they sent.
+
+    Note:
+        Repositories must be instrumented with instrument_repository using the same recorder. Documents scanned are
+        only known if the recorder explains queries.
+    """
+
+    def __init__(self, query_recorder=None, threshold=slow_call_threshold):
+        """
+        Constructor for RepositoryMetrics, it starts listening to the recorder
+
+        Args:
+            query_recorder (QueryRecorder, optional): Recorder to listen to, default to the module recorder
+            threshold (float, optional): Seconds above which a call is logged as slow, None to disable, default to
+                config.slow_call_threshold
+        """
+        self._recorder = recorder if query_recorder is None else query_recorder
+        self._threshold = threshold
+        self._lock = threading.Lock()
+        self._methods = {}
+        self._recorder.add_listener(self.record_call)
+
+    def close(self):
+        """Stops listening to the recorder"""
+        self._recorder.remove_listener(self.record_call)
+
+    def record_call(self, record):
+        """
+        Accounts one finished repository call
+
+        Args:
+            record (CallRecord): Usage of the call
+        """
+        with self._lock:
+            method = self._methods.get(record.name)
+            if method is None:
+                method = self._methods[record.name] = {'latency': LatencyHistogram(), 'queries': 0,
+                                                       'documents_returned': 0, 'documents_scanned': 0}
+            method['latency'].observe(record.seconds)
+            method['queries'] += len(record.queries)
+            method['documents_returned'] += record.documents
+            method['documents_scanned'] += record.documents_scanned
+
+        if self._threshold is not None and record.seconds > self._threshold:
+            filters = []
+            for collection, operation, spec in record.queries:
+                normalized = "%s.%s %s" % (collection, operation, json.dumps(normalize_filter(spec), sort_keys=True))
+                if normalized not in filters:
+                    filters.append(normalized)
+            logger.warning("Slow repository call %s took %.1f ms with %d queries: %s", record.name,
+                           record.seconds * 1000, len(record.queries), "; ".join(filters))
+
+    def snapshot(self):
+        """
+        Returns the current metrics
+
+        Returns:
+            dict: Metrics per method and per cache
+        """
+        with self._lock:
+            methods = dict((name, {'latency': method['latency'].to_dict(), 'queries': method['queries'],
+                                   'documents_returned': method['documents_returned'],
+                                   'documents_scanned': method['documents_scanned']})
+                           for name, method in self._methods.items())
+        return {'methods': methods, 'caches': self._recorder.cache_statistics()}
+
+    def to_json(self):
+        """
+        Returns a JSON snapshot of the current metrics
+
+        Returns:
+            str: JSON document
+        """
+        return json.dumps(self.snapshot(), sort_keys=True)
+
+    def to_prometheus(self):
+        """
+        Returns the current metrics in Prometheus text exposition format
+
+        Returns:
+            str: Metrics text
+        """
+        snapshot = self.snapshot()
+        methods = sorted(snapshot['methods'].items())
+        lines = ["# HELP a4ai_repository_call_seconds Latency of public repository calls",
+                 "# TYPE a4ai_repository_call_seconds histogram"]
+        for name, method in methods:
+            label = 'method="%s"' % _escape(name)
+            for bound, count in method['latency']['buckets']:
+                lines.append('a4ai_repository_call_seconds_bucket{%s,le="%s"} %d' % (label, bound, count))
+            lines.append('a4ai_repository_call_seconds_sum{%s} %r' % (label, method['latency']['sum']))
+            lines.append('a4ai_repository_call_seconds_count{%s} %d' % (label, method['latency']['count']))
+
+        for metric, key, description in [("queries", "queries", "Queries sent to the database"),
+                                         ("documents_returned", "documents_returned", "Documents returned"),
+                                         ("documents_scanned", "documents_scanned", "Documents examined")]:
+            lines.append("# HELP a4ai_repository_%s_total %s by public repository calls" % (metric, description))
+            lines.append("# TYPE a4ai_repository_%s_total counter" % metric)
+            for name, method in methods:
+                lines.append('a4ai_repository_%s_total{method="%s"} %d' % (metric, _escape(name), method[key]))
+
+        caches = sorted(snapshot['caches'].items())
+        for metric, key, _type, description in [
+                ("cache_hits_total", "hits", "counter", "Values found in the repository caches"),
+                ("cache_misses_total", "misses", "counter", "Values not found in the repository caches"),
+                ("cache_hit_ratio", "hit_ratio", "gauge", "Ratio of the repository cache accesses that were hits")]:
+            lines.append("# HELP a4ai_repository_%s %s" % (metric, description))
+            lines.append("# TYPE a4ai_repository_%s %s" % (metric, _type))
+            for name, cache in caches:
+                lines.append('a4ai_repository_%s{cache="%s"} %r' % (metric, _escape(name), cache[key]))
+
+        return "\n".join(lines) + "\n"
+
+
+def normalize_filter(spec):
+    """
+    Normalizes a query filter replacing every value by "?", so filters with the same shape are equal, e.g.:
+    {"year": {"$in": ["2013", "2014"]}} becomes {"year": {"$in": ["?"]}}
+
+    Args:
+        spec: Query filter, a pipeline or None
+
+    Returns:
+        The normalized filter
+    """
+    if isinstance(spec, dict):
+        return dict((key, normalize_filter(value)) for key, value in spec.items())
+    if isinstance(spec, (list, tuple)):
+        if len(spec) > 0 and all(isinstance(value, (dict, list, tuple)) for value in spec):
+            return [normalize_filter(value) for value in spec]
+        return ["?"]
+    if spec is None:
+        return None
+    return "?"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
@@ -0,0 +1,106 @@
+__author__ = 'Herminio'
+
+import logging
+
+from utility.text import is_text
+from .indexes import ensure_indexes, OBSERVATION_KEY
+from .area_repository import name_keys
+from .utils import normalize_area_type, normalize_income
+
+logger = logging.getLogger(__name__)
+
+
+def add_area_name_keys(db):
+    """
+    Stores the name lookup keys of every area, as AreaRepository.insert_area does for new areas
+
+    Args:
+        db (Database): Database where the areas collection is
+
+    Returns:
+        int: Number of areas updated
+    """
+    areas = list(db["areas"].find({}, {"name": 1, "short_name": 1}))
+    if len(areas) == 0:
+        return 0
+
+    bulk = db["areas"].initialize_unordered_bulk_op()
+    for area in areas:
+        bulk.find({"_id": area["_id"]}).update({"$set": {"name_keys": name_keys(area)}})
+    bulk.execute()
+
+    return len(areas)
+
+
+def normalize_categorical_fields(db):
+    """
+    Rewrites area types of observations, and incomes and types of areas, in their canonical form, as
+    ObservationRepository.insert_observation and AreaRepository.insert_area store them. Just one update is sent for
+    each distinct non canonical value, values which are not texts are logged and left as they are
+
+    Args:
+        db (Database): Database where the observations and areas collections are
+
+    Returns:
+        int: Number of distinct values rewritten
+    """
+    rewritten = 0
+    for collection, field, normalize in [("observations", "area_type", normalize_area_type),
+                                         ("areas", "income", normalize_income),
+                                         ("areas", "type", normalize_area_type)]:
+        for value in db[collection].distinct(field):
+            if value is not None and not is_text(value):
+                logger.warning("Value %r of %s.%s is not a text, it is not normalized", value, collection, field)
+            elif value is not None and normalize(value) != value:
+                db[collection].update({field: value}, {"$set": {field: normalize(value)}}, multi=True)
+                rewritten += 1
+    return rewritten
+
+
+def deduplicate_observations(db):
+    """
+    Removes repeated observations of an indicator, area and year, the last inserted one is kept, and drops the non
+    unique index on that key, so the unique one could be built
+
+    Args:
+        db (Database): Database where the observations collection is
+
+    Returns:
+        int: Number of observations removed
+    """
+    duplicates = db["observations"].aggregate([
+        {"$group": {
+            "_id": {"indicator": "$indicator", "area": "$area", "year": "$year"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], cursor={}, allowDiskUse=True)
+
+    removed = [_id for duplicate in duplicates for _id in sorted(duplicate["ids"])[:-1]]
+    if len(removed) > 0:
+        db["observations"].remove({"_id": {"$in": removed}})
+
+    for name, index in db["observations"].index_information().items():
+        if index["key"] == OBSERVATION_KEY and not index.get("unique", False):
+            db["observations"].drop_index(name)
+
+    return len(removed)
+
+
+MIGRATIONS = [add_area_name_keys, normalize_categorical_fields, deduplicate_observations]
+
+
+def migrate(db):
+    """
+    Runs every migration in order and creates the indexes, migrations can be run again safely
+
+    Args:
+        db (Database): Database to migrate
+
+    Returns:
+        dict: Migration name to its result
+    """
+    results = dict((migration.__name__, migration(db)) for migration in MIGRATIONS)
+    ensure_indexes(db)
+    return results
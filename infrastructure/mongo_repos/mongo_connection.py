@@ -1,11 +1,119 @@
 __author__ = 'guillermo'
-from pymongo import MongoClient
+
+import logging
+import os
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+_pid = os.getpid()
+_after_fork = weakref.WeakKeyDictionary()
 
 
 def connect_to_db(host, port, db_name):
-    client = MongoClient(host, port)
-    db = client[db_name]
-    return db
+    """
+    Returns a handle to a mongodb database, the connection is opened on first use
+
+    Args:
+        host (str): Mongodb host
+        port (int): Mongodb port
+        db_name (str): Database name
+
+    Returns:
+        LazyDatabase: Database handle
+    """
+    return LazyDatabase(host, port, db_name)
+
+
+def register_after_fork(obj, function):
+    """
+    Registers a function to be called with an object in child processes after a fork, e.g.: to discard a client or
+    caches built by the parent. Objects are weakly referenced, their functions are dropped with them.
+
+    Args:
+        obj (object): Object to pass to the function
+        function (function): Function receiving the object
+    """
+    _after_fork.setdefault(obj, []).append(function)
+
+
+def check_fork():
+    """
+    Runs the registered after fork functions if the process was forked since the last check. It runs on its own
+    in the child where os.register_at_fork exists, python 3.7 on, and on every database access otherwise.
+
+    Returns:
+        bool: True if the process was forked
+    """
+    global _pid
+
+    pid = os.getpid()
+    if pid == _pid:
+        return False
+    _pid = pid
+    for obj, functions in list(_after_fork.items()):
+        for function in functions:
+            try:
+                function(obj)
+            except Exception:  # the rest of the objects must be reset anyway
+                logger.exception("After fork function %s failed", function)
+    return True
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=check_fork)
+
+
+class LazyDatabase(object):
+    """
+    Database handle that opens the MongoClient on first use, so repositories could be built, and pymongo imported,
+    without touching the network until the first query. It is used as a pymongo Database.
+
+    Note:
+        MongoClients are not fork-safe, a handle used in a forked child, e.g.: a worker of a pre-forking server
+        that loaded the app before forking, discards the parent client and opens its own one. The parent client is
+        not closed, as its sockets are still used by the parent.
+    """
+
+    def __init__(self, host, port, db_name):
+        self._host = host
+        self._port = port
+        self._db_name = db_name
+        self._reset()
+        register_after_fork(self, LazyDatabase._reset)
+
+    @property
+    def connected(self):
+        return self._database is not None
+
+    @property
+    def client(self):
+        return self._connect()[0]
+
+    @property
+    def database(self):
+        return self._connect()[1]
+
+    def _reset(self):
+        self._lock = threading.Lock()  # the parent lock could be held by a thread the child does not have
+        self._client = None
+        self._database = None
+
+    def _connect(self):
+        check_fork()
+        with self._lock:
+            if self._database is None:
+                from pymongo import MongoClient
 
+                self._client = MongoClient(self._host, self._port)
+                self._database = self._client[self._db_name]
+            return self._client, self._database
 
+    def __getitem__(self, name):
+        return self.database[name]
 
+    def __getattr__(self, name):
+        if name.startswith("_"):  # introspection, e.g.: hasattr, copy or pickle, must not connect
+            raise AttributeError(name)
+        return getattr(self.database, name)
@@ -8,29 +8,40 @@ from a4ai.domain.model.observation.observation import Repository, create_observa
 from a4ai.domain.model.observation.year import Year
 from infrastructure.errors.errors import IndicatorRepositoryError, AreaRepositoryError
 from config import port, db_name, host
-from .mongo_connection import connect_to_db
+from .mongo_connection import connect_to_db, register_after_fork
 from .indicator_repository import IndicatorRepository
 from .area_repository import AreaRepository
-from utils import success
+from .instrumentation import record_cache_access
+from .indexes import RANKING_ORDER
+from .pagination import Page, paginate
+from utility.text import intern_text
+from utils import success, parse_years, normalize_area_type, insert_in_chunks, content_hash, \
+    fields_projection
 from a4ai.domain.model.observation.statistics import Statistics
+from a4ai.domain.model.observation.grouped_statistics import GroupedStatistics
 
 
 class ObservationRepository(Repository):
     """
     Concrete mongodb repository for Observations.
     """
+    _query_recorder = None  # set by instrument_repository
 
-    def __init__(self, url_root):
+    def __init__(self, url_root, db=None):
         """
-        Constructor for ObservationRepository
+        Constructor for ObservationRepository, its caches are discarded in forked processes, they are read again
+        through the connection of the child
 
         Args:
             url_root (str): URL root where service is deployed, it will be used to compose URIs on areas
+            db (Database, optional): Database handle to use instead of connecting to the configured one
         """
-        self._db = connect_to_db(host=host, port=port, db_name=db_name)
-        self._indicator = IndicatorRepository(url_root=url_root)
-        self._area = AreaRepository(url_root=url_root)
+        self._db = connect_to_db(host=host, port=port, db_name=db_name) if db is None else db
+        self._indicator = IndicatorRepository(url_root=url_root, db=self._db)
+        self._area = AreaRepository(url_root=url_root, db=self._db)
         self._url_root = url_root
+        self._observation_sets = {}
+        register_after_fork(self, ObservationRepository.invalidate_caches)
 
     def find_observations(self, indicator_code=None, area_code=None, year=None, area_type=None):
         """
@@ -42,7 +53,165 @@ class ObservationRepository(Repository):
             year (str, optional): The year when observation was observed
             area_type (str, optional): The area type for the observation area
         Returns:
-            list of Observation: Observation that satisfy the given filters
+            list of Observation: Observation that satisfy the given filters in ranking order, observations without
+                ranking first
+        """
+        if (area_code is None or area_code == "ALL") and area_type is None:
+            preloaded = self._observation_sets.get((indicator_code, year))
+            record_cache_access('observation_sets', preloaded is not None, self._query_recorder)
+            if preloaded is not None:
+                return ObservationDocumentAdapter().transform_to_observation_list(preloaded)
+
+        search = self._observations_search(indicator_code=indicator_code, area_code=area_code, year=year,
+                                           area_type=area_type)
+
+        observations = self._db["observations"].find(search).sort(RANKING_ORDER)
+
+        return self._transform_observations(observations, complete_history=year is None)
+
+    def preload_observations(self, indicator_code=None, year=None):
+        """
+        Keeps in memory the observations of an indicator and year for every area, later find_observations calls with
+        the same indicator_code and year, and no area filters, are served without querying
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            year (str, optional): The year when observation was observed
+        Returns:
+            int: Number of observations preloaded
+        """
+        search = self._observations_search(indicator_code=indicator_code, year=year)
+        documents = self._enrich_observations(self._db["observations"].find(search).sort(RANKING_ORDER),
+                                              complete_history=year is None)
+        self._observation_sets[(indicator_code, year)] = documents
+        return len(documents)
+
+    def find_observations_page(self, indicator_code=None, area_code=None, year=None, area_type=None, page_size=100,
+                               page_token=None):
+        """
+        Returns one page of the observations that satisfy the given filters, pages are read by keyset on
+        (ranking, _id) so later pages are as fast as the first one
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            page_size (int, optional): Maximum number of observations of the page, default to 100
+            page_token (str, optional): next_page_token of the previous page, None for the first page
+        Returns:
+            Page: Observations of the page in the same order as find_observations and the next page token
+
+        Raises:
+            PageTokenError: If the page token is not valid
+        """
+        search = self._observations_search(indicator_code=indicator_code, area_code=area_code, year=year,
+                                           area_type=area_type)
+        documents, next_page_token = paginate(self._db["observations"], search, page_size, page_token)
+
+        return Page(self._transform_observations(documents), next_page_token)
+
+    def stream_observations(self, indicator_code=None, area_code=None, year=None, area_type=None, fields=None,
+                            batch_size=1000):
+        """
+        Iterates over the observation documents that satisfy the given filters, they are read from a batched cursor
+        so memory does not grow with the number of observations
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            fields (list of str, optional): Fields to read, default to every field; indicator_name and area_name are
+                always set from the indicator and area caches
+            batch_size (int, optional): Number of documents read per round trip, default to 1000
+        Returns:
+            iterator of dict: Observation documents in ranking order, observations without ranking first
+
+        Raises:
+            ValueError: If the batch size is not positive
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be positive, got %s" % batch_size)
+
+        search = self._observations_search(indicator_code=indicator_code, area_code=area_code, year=year,
+                                           area_type=area_type)
+        projection = fields_projection(fields, ["indicator", "area"])
+
+        cursor = self._db["observations"].find(search, projection).sort(RANKING_ORDER).batch_size(batch_size)
+
+        return self._named_observations(cursor)
+
+    def _named_observations(self, observation_documents):
+        for observation in observation_documents:
+            self.set_observation_country_and_indicator_name(observation)
+            yield observation
+
+    def _transform_observations(self, observation_documents, complete_history=False):
+        """
+        Sets the extra info of observation documents and transforms them into Observation entities
+
+        Args:
+            observation_documents (iterable of dict): Observation documents in PyMongo format
+            complete_history (bool, optional): True if the documents include every year of their indicators and
+                areas, so tendencies are computed from them, otherwise one more query is needed
+
+        Returns:
+            list of Observation: The observations in the same order
+        """
+        return ObservationDocumentAdapter().transform_to_observation_list(
+            self._enrich_observations(observation_documents, complete_history))
+
+    def _enrich_observations(self, observation_documents, complete_history=False):
+        """
+        Sets the extra info of observation documents: names, code and tendency
+
+        Args:
+            observation_documents (iterable of dict): Observation documents in PyMongo format
+            complete_history (bool, optional): True if the documents include every year of their indicators and
+                areas, so tendencies are computed from them, otherwise one more query is needed
+
+        Returns:
+            list of dict: The observation documents in the same order
+        """
+        observation_list = []
+
+        for observation in observation_documents:
+            # self.observation_uri(observation)
+            self.set_observation_country_and_indicator_name(observation)
+            observation_list.append(observation)
+            # Extra info
+            observation["code"] = observation["area"]
+            observation["name"] = observation["area_name"]
+            #observation["values"] = [ round(observation["value"], 2) ]
+
+        if len(observation_list) > 0:
+            history = observation_list
+            if not complete_history:  # tendencies need every year, just one more query for all of them
+                history = self._db["observations"].find(
+                    {"indicator": {"$in": list(set(obs["indicator"] for obs in observation_list))},
+                     "area": {"$in": list(set(obs["area"] for obs in observation_list))}},
+                    TimeSeriesDocumentAdapter.FIELDS)
+            TimeSeriesDocumentAdapter().set_tendencies(observation_list, history)
+
+        return observation_list
+
+    def _observations_search(self, indicator_code=None, area_code=None, year=None, area_type=None):
+        """
+        Builds the mongodb filter for observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+
+        Returns:
+            dict: The filter for mongodb queries
+
+        Raises:
+            IndicatorRepositoryError: If any of the indicators does not exist
+            AreaRepositoryError: If any of the areas does not exist
         """
         filters = []
 
@@ -72,35 +241,89 @@ class ObservationRepository(Repository):
             filters.append(year_filter)
 
         if area_type is not None:
-            filters.append({"$or": [
-                {"area_type": area_type},
-                {"area_type": area_type.upper()},
-                {"area_type": area_type.title()}
-            ]})
+            filters.append({"area_type": normalize_area_type(area_type)})
 
         search = {}
 
         if len(filters) > 0:
             search = {"$and": filters}
 
-        observations = self._db["observations"].find(search).sort([("ranked", 1)])
-        observation_list = []
+        return search
 
-        for observation in observations:
-            # self.observation_uri(observation)
-            self.set_observation_country_and_indicator_name(observation)
-            observation_list.append(observation)
-            # Extra info
-            observation["code"] = observation["area"]
-            observation["name"] = observation["area_name"]
-            #observation["values"] = [ round(observation["value"], 2) ]
-            #observation["previous-value"] = self.get_previous_value(observation)
+    def find_linked_observations(self, indicator_code=None, area_code=None, year=None, area_type=None, fields=None):
+        """
+        Returns the linked observations that satisfy the given filters
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            fields (list of str, optional): Fields of each linked observation, default to every field
+        Returns:
+            dict: Success with the linked observation documents
+        """
+        search = self._observations_search(indicator_code=indicator_code, area_code=area_code, year=year,
+                                           area_type=area_type)
+
+        return success([obs for obs in self._db['linked_observations'].find(search, fields_projection(fields))])
 
-        observations = ObservationDocumentAdapter().transform_to_observation_list(observation_list)
-        return sorted(observations, key=lambda obs: obs.ranking)  # returning the observations in ranking order
+    def find_linked_observations_page(self, page_size=100, page_token=None, indicator_code=None, area_code=None,
+                                      year=None, area_type=None, fields=None):
+        """
+        Returns one page of the linked observations that satisfy the given filters, read by keyset on
+        (ranking, _id)
+
+        Args:
+            page_size (int, optional): Maximum number of linked observations of the page, default to 100
+            page_token (str, optional): next_page_token of the previous page, None for the first page, pages must be
+                read with the same filters
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            fields (list of str, optional): Fields of each linked observation, default to every field; ranking and
+                _id are always read, as pages are continued from them
+        Returns:
+            Page: Linked observation documents of the page and the next page token
 
-    def find_linked_observations(self):
-        return success([obs for obs in self._db['linked_observations'].find()])
+        Raises:
+            PageTokenError: If the page token is not valid
+        """
+        search = self._observations_search(indicator_code=indicator_code, area_code=area_code, year=year,
+                                           area_type=area_type)
+        documents, next_page_token = paginate(self._db['linked_observations'], search, page_size, page_token,
+                                              fields_projection(fields, ["ranking", "_id"]))
+
+        return Page(documents, next_page_token)
+
+    def stream_linked_observations(self, indicator_code=None, area_code=None, year=None, area_type=None,
+                                   fields=None, batch_size=1000):
+        """
+        Iterates over the linked observations that satisfy the given filters, they are read from a batched cursor
+        so memory does not grow with the number of linked observations
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            area_type (str, optional): The area type for the observation area
+            fields (list of str, optional): Fields of each linked observation, default to every field
+            batch_size (int, optional): Number of documents read per round trip, default to 1000
+        Returns:
+            iterator of dict: Linked observation documents in ranking order
+
+        Raises:
+            ValueError: If the batch size is not positive
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be positive, got %s" % batch_size)
+
+        search = self._observations_search(indicator_code=indicator_code, area_code=area_code, year=year,
+                                           area_type=area_type)
+
+        return iter(self._db['linked_observations'].find(search, fields_projection(fields))
+                    .sort(RANKING_ORDER).batch_size(batch_size))
 
     def get_all_indicators(self):
         """
@@ -124,28 +347,34 @@ class ObservationRepository(Repository):
             return {}
 
         codes = code.upper().strip().split(",")
+        indicators = self._local_indicators()
 
         for code in codes:
             # Check that the indicator exists
-            indicator = self._db['indicators'].find_one({"indicator": code})
+            indicator = indicators.get(code) or self._db['indicators'].find_one({"indicator": code})
 
             if indicator is None:
                 return None
 
         return {"indicator": {"$in": codes}}
 
-    def get_countries_by_code_name_or_income(self, code):
+    def get_countries_by_code_name_or_income(self, code, batched=True):
         """
         Returns an area mongodb filter to use in other queries
 
         Args:
             code (str): Area code or area codes, divide them using a ','
+            batched (bool, optional): If True all the codes are resolved together with one $in query per lookup
+                key, otherwise each code is resolved on its own. Default to True
 
         Returns:
             dict: The filter for mongodb queries
         """
         codes = code.split(",")
 
+        if batched:
+            return self._get_countries_by_codes_batched(codes)
+
         country_codes = []
         areas = []
 
@@ -187,6 +416,68 @@ class ObservationRepository(Repository):
             "countries": country_codes
         }
 
+    def _get_countries_by_codes_batched(self, codes):
+        """
+        Resolves many area codes at once, issuing one $in query per lookup key instead of one cascade of queries
+        per code
+
+        Note:
+            Lookup keys are tried in the same order as in the one by one resolution: iso3 (only countries), iso2,
+            name, continent and income. Only the codes that are still unresolved are sent to the next lookup key,
+            so a code is always resolved by the first key that matches it.
+
+        Args:
+            codes (list of str): Area codes as given by the client
+
+        Returns:
+            dict: The filter for mongodb queries, None if any of the codes does not match an area
+        """
+        lookups = [
+            ("iso3", lambda code: code.upper(), {"area": {"$ne": None}}),
+            ("iso2", lambda code: code.upper(), {}),
+            ("name", lambda code: code, {}),
+            ("area", lambda code: code, {}),
+            ("income", lambda code: code.upper(), {})
+        ]
+        projection = {"iso3": 1, "iso2": 1, "name": 1, "area": 1, "income": 1}
+
+        resolved = {}
+        pending = list(set(codes))
+
+        for field, key_of, extra_filter in lookups:
+            if len(pending) == 0:
+                break
+
+            keys = {}
+            for code in pending:
+                keys.setdefault(key_of(code), []).append(code)
+
+            search = {field: {"$in": list(keys.keys())}}
+            search.update(extra_filter)
+
+            for country in self._db["areas"].find(search, projection):
+                for code in keys.get(country[field], []):
+                    resolved.setdefault(code, []).append(country)
+
+            pending = [code for code in pending if code not in resolved]
+
+        if len(pending) > 0:
+            return None
+
+        country_codes = []
+        areas = []
+
+        for code in codes:
+            for country in resolved[code]:
+                country_codes.append(country["iso3"])
+                areas.append(country["area"])
+
+        return {
+            "area_filter": {"area": {"$in": country_codes}},
+            "areas": areas,
+            "countries": country_codes
+        }
+
     def get_years(self, year):
         """
         Returns a year mongodb filter to use in other queries
@@ -204,21 +495,7 @@ class ObservationRepository(Repository):
             last_year = self.get_year_list()[0].value
             return {"year": last_year}
 
-        years = year.strip().split(",")
-
-        year_list = []
-
-        for year in years:
-            interval = year.split("-")
-
-            if len(interval) == 1 and interval[0].isdigit():
-                year_list.append(interval[0])
-            elif len(interval) == 2 and interval[0].isdigit() and interval[
-                1].isdigit():
-                for i in range(int(interval[0]), int(interval[1]) + 1):
-                    year_list.append(str(i))
-
-        return {"year": {"$in": year_list}}
+        return {"year": {"$in": parse_years(year)}}
 
     def get_year_list(self):
         """
@@ -227,12 +504,9 @@ class ObservationRepository(Repository):
         Returns:
             list of Year: All years with observations
         """
-        years = self._db['observations'].distinct("year")
-        years.sort(reverse = True)
-
         year_list = []
 
-        for year in years:
+        for year in self._year_catalog():
             year_list.append({
                 "value": year
             })
@@ -240,10 +514,14 @@ class ObservationRepository(Repository):
         return YearDocumentAdapter().transform_to_year_list(year_list)
 
     def get_year_array(self):
-        years = self._db['observations'].distinct("year")
-        years.sort(reverse=True)
+        return success(list(self._year_catalog()))
 
-        return success(years)
+    def _year_catalog(self):
+        cached = 'year_catalog' in self.__dict__
+        record_cache_access('year_catalog', cached, self._query_recorder)
+        if not cached:
+            self.year_catalog = sorted(self._db['observations'].distinct("year"), reverse=True)
+        return self.year_catalog
 
     def set_observation_country_and_indicator_name(self, observation):
         """
@@ -255,8 +533,10 @@ class ObservationRepository(Repository):
         indicator_code = observation["indicator"]
         area_code = observation["area"]
 
-        indicator = self._db["indicators"].find_one({"indicator": indicator_code})
-        area = self._db["areas"].find_one({"iso3": area_code})
+        # Cached lookups, areas and indicators stored after the cache was built are queried
+        indicator = self._local_indicators().get(indicator_code) or \
+            self._db["indicators"].find_one({"indicator": indicator_code})
+        area = self._local_areas().get(area_code) or self._db["areas"].find_one({"iso3": area_code})
 
         observation["indicator_name"] = indicator["name"]
         observation["area_name"] = area["name"]
@@ -276,47 +556,134 @@ class ObservationRepository(Repository):
         :return:
         """
 
-        observation_dict = {}
-        observation_dict['area'] = area_iso3_code
-        observation_dict['area_name'] = area_name
-        observation_dict['indicator'] = indicator_code
-        observation_dict['indicator_name'] = indicator_name
-        observation_dict['indicator_type'] = indicator_type
-        observation_dict['value'] = observation.value
-        observation_dict['year'] = str(observation.year.value)
-        observation_dict['uri'] = observation_uri
-        observation_dict['republish'] = republish
-        observation_dict['continent'] = area_code
-        observation_dict['short_name'] = short_name
-        observation_dict['provider_name'] = provider_name
-        observation_dict['provider_url'] = provider_url
-        observation_dict['area_type'] = area_type
-        observation_dict['ranking'] = ranking
-        observation_dict['ranking_type'] = ranking_type
+        observation_dict = observation_document(
+            observation.value, observation.year.value, observation_uri=observation_uri,
+            area_iso3_code=area_iso3_code, area_name=area_name, area_code=area_code, short_name=short_name,
+            area_type=area_type, indicator_code=indicator_code, indicator_name=indicator_name,
+            indicator_type=indicator_type, republish=republish, provider_name=provider_name,
+            provider_url=provider_url, ranking=ranking, ranking_type=ranking_type)
 
         self._db['observations'].insert(observation_dict)
+        self.__dict__.pop('year_catalog', None)
+        self._observation_sets = {}
+
+    def insert_observations(self, observation_documents, chunk_size=5000):
+        """
+        Inserts observation documents, as built by observation_document, with one insert per chunk
+
+        Args:
+            observation_documents (iterable of dict): Observation documents to insert
+            chunk_size (int, optional): Number of documents per insert, default to 5000
+
+        Returns:
+            int: Number of observations inserted
+        """
+        inserted = insert_in_chunks(self._db['observations'], observation_documents, chunk_size)
+        self.__dict__.pop('year_catalog', None)
+        self._observation_sets = {}
+        return inserted
+
+    def sync_observations(self, observation_documents, delete_missing=True):
+        """
+        Writes only the observations that changed, compared by content hash against the stored ones with the same
+        indicator, area and year. New and changed observations are upserted and, optionally, stored observations of
+        the synced indicators missing from the documents are deleted, all of them in one bulk operation
+
+        Note:
+            Stored observations without content hash, inserted before hashes were stored, are counted as updated
+        Args:
+            observation_documents (iterable of dict): Observation documents, as built by observation_document
+            delete_missing (bool, optional): True to delete stored observations of the synced indicators which are
+                not in the documents, default to True
+
+        Returns:
+            dict: Number of inserted, updated, unchanged and deleted observations
+        """
+        incoming = {}
+        for document in observation_documents:
+            document = dict((key, value) for key, value in document.items() if key != "_id")
+            document["content_hash"] = content_hash(document)
+            incoming[(document["indicator"], document["area"], document["year"])] = document
+
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        indicators = list(set(key[0] for key in incoming))
+        if len(indicators) == 0:
+            return counts
+
+        bulk = self._db['observations'].initialize_unordered_bulk_op()
+        stored_keys = set()
+        for stored in self._db['observations'].find({"indicator": {"$in": indicators}},
+                                                   {"indicator": 1, "area": 1, "year": 1, "content_hash": 1}):
+            key = (stored["indicator"], stored["area"], stored["year"])
+            stored_keys.add(key)
+            document = incoming.get(key)
+            if document is None:
+                if delete_missing:
+                    bulk.find({"_id": stored["_id"]}).remove_one()
+                    counts["deleted"] += 1
+            elif document["content_hash"] == stored.get("content_hash"):
+                counts["unchanged"] += 1
+            else:
+                bulk.find({"_id": stored["_id"]}).replace_one(document)
+                counts["updated"] += 1
+
+        for key, document in incoming.items():
+            if key not in stored_keys:
+                bulk.find({"indicator": key[0], "area": key[1], "year": key[2]}).upsert().replace_one(document)
+                counts["inserted"] += 1
+
+        if counts["inserted"] + counts["updated"] + counts["deleted"] > 0:
+            bulk.execute()
+            self.__dict__.pop('year_catalog', None)
+            self._observation_sets = {}
+
+        return counts
 
     def _look_for_continent_iso3(self, area_iso3_code):
-        if 'local_areas_dict' not in self.__dict__:   # Lazy initialization and just one query
-            self.local_areas_dict = self._build_local_areas_dict()
-        return self.local_areas_dict[area_iso3_code]['area']
+        return self._local_areas()[area_iso3_code]['area']
 
     def _look_for_short_name(self, area_iso3_code):
-        if 'local_areas_dict' not in self.__dict__:   # Lazy initialization and just one query
+        return self._local_areas()[area_iso3_code]['short_name']
+
+    def _local_areas(self):
+        cached = 'local_areas_dict' in self.__dict__
+        record_cache_access('local_areas_dict', cached, self._query_recorder)
+        if not cached:   # Lazy initialization and just one query
             self.local_areas_dict = self._build_local_areas_dict()
-        return self.local_areas_dict[area_iso3_code]['short_name']
+        return self.local_areas_dict
 
     def _build_local_areas_dict(self):
         result = {}
-        for country in self._area.find_countries(None)['data']:
-            result[country['iso3']] = country
+        fields = {"iso3": 1, "name": 1, "area": 1, "short_name": 1, "income": 1, "type": 1}
+        for area in self._db['areas'].find({}, fields):
+            result[area['iso3']] = area
         return result
 
+    def _local_indicators(self):
+        cached = 'local_indicators_dict' in self.__dict__
+        record_cache_access('local_indicators_dict', cached, self._query_recorder)
+        if not cached:
+            self.local_indicators_dict = dict(
+                (indicator['indicator'], indicator)
+                for indicator in self._db['indicators'].find({}, {"indicator": 1, "name": 1, "type": 1}))
+        return self.local_indicators_dict
+
+    def invalidate_caches(self):
+        """
+        Discards every cached area, indicator, year and preloaded observation, they are read again on next use
+        """
+        for cache in ['local_areas_dict', 'local_indicators_dict', 'year_catalog']:
+            self.__dict__.pop(cache, None)
+        self._observation_sets = {}
+        self._area.invalidate_caches()
+
     def update_observation_ranking_type(self, obs, ranking_type):
         self._db['observations'].update({'_id': obs.id}, {"$set": {'ranking_type': ranking_type}}, upsert=False)
+        self._observation_sets = {}  # preloaded sets could hold the observation
 
     def update_observation_ranking(self, obs, ranking):
         self._db['observations'].update({'_id': obs.id}, {"$set": {'ranking': ranking}}, upsert=False)
+        self._observation_sets = {}  # preloaded sets could hold the observation, sorted by ranking
 
     @staticmethod
     def _look_for_computation(comp_type, observation):
@@ -341,6 +708,79 @@ class ObservationRepository(Repository):
         return StatisticsDocumentAdapter().transform_to_statistics(
             self.find_observations(indicator_code=indicator_code, area_code=area_code, year=year))
 
+    def find_observations_columnar_statistics(self, indicator_code=None, area_code=None, year=None):
+        """
+        Returns statistics for observations that satisfy the given filters computed in columnar mode: only the
+        needed fields are read, without building Observation entities, and loaded into NumPy arrays
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+        Returns:
+            ColumnarStatistics: Observations statistics that satisfy the filters, same figures as Statistics
+        """
+        return self._find_columnar_observations(indicator_code=indicator_code, area_code=area_code,
+                                                year=year).statistics()
+
+    def find_statistics_by_indicator_and_year(self, indicator_code="ALL", area_code=None, year=None):
+        """
+        Returns statistics for every indicator and year at once, computed in columnar mode
+
+        Args:
+            indicator_code (str, optional): The indicator code or codes, default to all of them
+            area_code (str, optional): The area code for the observations
+            year (str, optional): The year or years, default to all of them
+        Returns:
+            dict: (indicator, year) to the statistics dictionary, as Statistics.to_dict returns it
+        """
+        return self._find_columnar_observations(indicator_code=indicator_code, area_code=area_code,
+                                                year=year).statistics_by_indicator_and_year()
+
+    def _find_columnar_observations(self, indicator_code=None, area_code=None, year=None):
+        search = self._observations_search(indicator_code=indicator_code, area_code=area_code, year=year)
+        documents = self._db["observations"].find(search, ColumnarObservationsDocumentAdapter.FIELDS)
+        return ColumnarObservationsDocumentAdapter().transform_to_columnar_observations(documents)
+
+    def find_observations_grouped_statistics(self, indicator_code=None, area_code=None, year=None,
+                                             group_by=GroupedStatistics.GROUP_KEYS,
+                                             percentiles=GroupedStatistics.PERCENTILES):
+        """
+        Returns statistics for observations that satisfy the given filters split by several group keys, all of
+        them computed in one scan over the observations
+
+        Args:
+            indicator_code (str, optional): The indicator code (indicator attribute in Indicator)
+            area_code (str, optional): The area code for the observation
+            year (str, optional): The year when observation was observed
+            group_by (tuple of str, optional): Group keys among continent, income, area_type and year, default to
+                all of them
+            percentiles (tuple of int, optional): Percentiles to calculate for each group, default to 25 and 75
+        Returns:
+            GroupedStatistics: Observations statistics for every group of every group key
+        """
+        search = self._observations_search(indicator_code=indicator_code, area_code=area_code, year=year)
+        documents = self._db["observations"].find(search, GroupedStatisticsDocumentAdapter.FIELDS)
+        incomes = self._local_areas() if GroupedStatistics.INCOME in group_by else {}
+
+        return GroupedStatisticsDocumentAdapter().transform_to_grouped_statistics(documents, incomes, group_by,
+                                                                                  percentiles)
+
+    def find_time_series(self, indicator_code, area_code=None):
+        """
+        Returns the time series of an indicator, its observations for every year are read in one query
+
+        Args:
+            indicator_code (str): The indicator code (indicator attribute in Indicator), just one indicator
+            area_code (str, optional): The area code for the observations, default to all areas
+        Returns:
+            TimeSeries: Values, year over year changes and tendencies of every area
+        """
+        search = self._observations_search(indicator_code=indicator_code, area_code=area_code)
+        documents = self._db["observations"].find(search, TimeSeriesDocumentAdapter.FIELDS)
+
+        return TimeSeriesDocumentAdapter().transform_to_time_series(documents)
+
     def find_observations_visualisation(self, indicator_code=None, area_code=None, year=None):
         """
         Returns visualisation for observations that satisfy the given filters
@@ -372,7 +812,7 @@ class ObservationRepository(Repository):
         observations = self.find_observations(indicator_code=indicator_code, area_code=area_code, year=year)
         observations_all_areas = self.find_observations(indicator_code=indicator_code, area_code='ALL', year=year)
         if area_code_splitted is None or len(area_code_splitted) == 0 or area_code == 'ALL':
-            areas = AreaRepository(url_root=self._url_root).find_countries(order="iso3")
+            areas = self._area.find_countries(order="iso3")
             area_code_splitted = [area.iso3 for area in areas]
 
         return GroupedByAreaVisualisationDocumentAdapter().transform_to_grouped_by_area_visualisation(
@@ -382,9 +822,60 @@ class ObservationRepository(Repository):
         )
 
 
+def observation_document(value, year, observation_uri=None, area_iso3_code=None, area_name=None, area_code=None,
+                         short_name=None, area_type=None, indicator_code=None, indicator_name=None, indicator_type=None,
+                         republish=True, provider_name="WF (Web Foundation)", provider_url="http://webfoundation.org/",
+                         ranking=None, ranking_type=None):
+    """
+    Builds the document stored for an observation, area type is stored in canonical form and the hash of its
+    content is stored too, so re-imports could tell changed observations apart
+
+    Args:
+        value (float or str): Value of the observation, blank if there is no valid value
+        year (str or int): Year of the observation
+        observation_uri (str, optional): URI of the observation
+        area_iso3_code (str, optional): Iso3 of the area
+        area_name (str, optional): Name of the area
+        area_code (str, optional): Continent of the area
+        short_name (str, optional): Short name of the area
+        area_type (str, optional): Area type, i.g.: Emerging or Developing
+        indicator_code (str, optional): Code of the indicator
+        indicator_name (str, optional): Name of the indicator
+        indicator_type (str, optional): Type of the indicator
+        republish (bool, optional): True if republish is allowed, default to True
+        provider_name (str, optional): Name of the provider, default to the Web Foundation
+        provider_url (str, optional): URL of the provider, default to the Web Foundation one
+        ranking (int, optional): Ranking of the observation
+        ranking_type (str, optional): Ranking type of the observation
+
+    Returns:
+        dict: Observation document in PyMongo format
+    """
+    observation_dict = {}
+    observation_dict['area'] = area_iso3_code
+    observation_dict['area_name'] = area_name
+    observation_dict['indicator'] = indicator_code
+    observation_dict['indicator_name'] = indicator_name
+    observation_dict['indicator_type'] = indicator_type
+    observation_dict['value'] = value
+    observation_dict['year'] = str(year)
+    observation_dict['uri'] = observation_uri
+    observation_dict['republish'] = republish
+    observation_dict['continent'] = area_code
+    observation_dict['short_name'] = short_name
+    observation_dict['provider_name'] = provider_name
+    observation_dict['provider_url'] = provider_url
+    observation_dict['area_type'] = normalize_area_type(area_type)
+    observation_dict['ranking'] = ranking
+    observation_dict['ranking_type'] = ranking_type
+    observation_dict['content_hash'] = content_hash(observation_dict)
+    return observation_dict
+
+
 class ObservationDocumentAdapter(object):
     """
-    Adapter class to transform observations from PyMongo format to Domain observations objects
+    Adapter class to transform observations from PyMongo format to Domain observations objects, repeated texts as
+    names, codes and providers are interned, so every observation shares one copy of them
     """
     def transform_to_observation(self, observation_document):
         """
@@ -396,23 +887,24 @@ class ObservationDocumentAdapter(object):
         Returns:
             Observation: Observation object with the data in observation_document
         """
-        return create_observation(provider_url=observation_document['provider_url'],
-                                  indicator=observation_document['indicator'],
-                                  indicator_name=observation_document['indicator_name'],
-                                  indicator_type=observation_document['indicator_type'],
-                                  short_name=observation_document['short_name'],
-                                  area=observation_document['area'],
-                                  area_name=observation_document['area_name'],
+        return create_observation(provider_url=intern_text(observation_document['provider_url']),
+                                  indicator=intern_text(observation_document['indicator']),
+                                  indicator_name=intern_text(observation_document['indicator_name']),
+                                  indicator_type=intern_text(observation_document['indicator_type']),
+                                  short_name=intern_text(observation_document['short_name']),
+                                  area=intern_text(observation_document['area']),
+                                  area_name=intern_text(observation_document['area_name']),
                                   uri=observation_document['uri'],
                                   value=observation_document['value'],
-                                  year=observation_document['year'],
-                                  provider_name=observation_document['provider_name'],
+                                  year=intern_text(observation_document['year']),
+                                  provider_name=intern_text(observation_document['provider_name']),
                                   id=observation_document['_id'],
-                                  continent=observation_document['continent'],
+                                  continent=intern_text(observation_document['continent']),
+                                  tendency=observation_document.get('tendency', 0),
                                   republish=observation_document['republish'],
-                                  area_type=observation_document['area_type'],
+                                  area_type=intern_text(observation_document['area_type']),
                                   ranking=observation_document['ranking'],
-                                  ranking_type=observation_document['ranking_type'])
+                                  ranking_type=intern_text(observation_document['ranking_type']))
 
     def transform_to_observation_list(self, observation_document_list):
         """
@@ -474,6 +966,106 @@ class StatisticsDocumentAdapter(object):
         return Statistics(observations)
 
 
+class ColumnarObservationsDocumentAdapter(object):
+    """
+    Adapter class to transform observations from PyMongo format to Domain ColumnarObservations objects
+    """
+    FIELDS = {"value": 1, "area_type": 1, "indicator": 1, "year": 1, "_id": 0}
+
+    def transform_to_columnar_observations(self, observation_documents):
+        """
+        Transforms observation documents into columns
+
+        Args:
+            observation_documents (iterable of dict): Observation documents in PyMongo format, at least with FIELDS
+
+        Returns:
+            ColumnarObservations: The observations by columns
+        """
+        from a4ai.domain.model.observation.columnar_statistics import ColumnarObservations
+
+        values, area_types, indicators, years = [], [], [], []
+        for document in observation_documents:
+            values.append(document["value"])
+            area_types.append(document.get("area_type"))
+            indicators.append(document["indicator"])
+            years.append(document["year"])
+        return ColumnarObservations(values=values, area_types=area_types, indicators=indicators, years=years)
+
+
+class GroupedStatisticsDocumentAdapter(object):
+    """
+    Adapter class to transform observations from PyMongo format to Domain GroupedStatistics objects
+    """
+    FIELDS = {"value": 1, "area": 1, "continent": 1, "area_type": 1, "year": 1, "_id": 0}
+
+    def transform_to_grouped_statistics(self, observation_documents, areas, group_by, percentiles):
+        """
+        Transforms observation documents into grouped statistics
+
+        Args:
+            observation_documents (iterable of dict): Observation documents in PyMongo format, at least with FIELDS
+            areas (dict): Area documents by iso3 code, where the income of each observation is taken from
+            group_by (tuple of str): Group keys
+            percentiles (tuple of int): Percentiles to calculate for each group
+
+        Returns:
+            GroupedStatistics: Statistics of the observations
+        """
+        records = ({"value": document["value"],
+                    GroupedStatistics.CONTINENT: document.get("continent"),
+                    GroupedStatistics.INCOME: areas.get(document["area"], {}).get("income"),
+                    GroupedStatistics.AREA_TYPE: document.get("area_type"),
+                    GroupedStatistics.YEAR: document["year"]} for document in observation_documents)
+        return GroupedStatistics(records, group_by=group_by, percentiles=percentiles)
+
+
+class TimeSeriesDocumentAdapter(object):
+    """
+    Adapter class to transform observations from PyMongo format to Domain TimeSeries objects
+    """
+    FIELDS = {"indicator": 1, "area": 1, "year": 1, "value": 1, "_id": 0}
+
+    def transform_to_time_series(self, observation_documents):
+        """
+        Transforms observation documents of one indicator into its time series
+
+        Args:
+            observation_documents (iterable of dict): Observation documents in PyMongo format, at least with FIELDS
+
+        Returns:
+            TimeSeries: Time series of the observations
+        """
+        from a4ai.domain.model.observation.time_series import TimeSeries
+
+        areas, years, values = [], [], []
+        for document in observation_documents:
+            areas.append(document["area"])
+            years.append(document["year"])
+            values.append(document["value"])
+        return TimeSeries(areas=areas, years=years, values=values)
+
+    def set_tendencies(self, observation_documents, history_documents):
+        """
+        Sets the tendency of each observation document, time series are built once per indicator
+
+        Args:
+            observation_documents (list of dict): Observation documents in PyMongo format, they are modified
+            history_documents (iterable of dict): Observation documents for every year of the same indicators and
+                areas, at least with FIELDS
+        """
+        by_indicator = {}
+        for document in history_documents:
+            by_indicator.setdefault(document["indicator"], []).append(document)
+
+        time_series = dict((indicator, self.transform_to_time_series(documents))
+                           for indicator, documents in by_indicator.items())
+
+        for document in observation_documents:
+            series = time_series.get(document["indicator"])
+            document["tendency"] = 0 if series is None else series.tendency(document["area"], document["year"])
+
+
 class VisualisationDocumentAdapter(object):
     """
     Adapter class to transform observations from PyMongo format to Domain Visualisation objects
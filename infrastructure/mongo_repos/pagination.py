@@ -0,0 +1,155 @@
+__author__ = 'Herminio'
+
+import base64
+import binascii
+import json
+
+from infrastructure.errors.errors import PageTokenError
+from .indexes import RANKING_ORDER
+
+
+class Page(object):
+    """
+    One page of a paginated query
+
+    Attributes:
+        items (list): Items of the page, in the query order
+        next_page_token (str): Opaque token to request the next page, None if this is the last one
+    """
+
+    def __init__(self, items, next_page_token=None):
+        self.items = items
+        self.next_page_token = next_page_token
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def to_dict(self):
+        """
+        Converts self object to dictionary, items are converted with their to_dict if they have it
+
+        Returns:
+            dict: Dictionary representation of self object
+        """
+        return {
+            'items': [item.to_dict() if hasattr(item, 'to_dict') else item for item in self.items],
+            'next_page_token': self.next_page_token
+        }
+
+
+def encode_page_token(document):
+    """
+    Builds the token of the page following a document, the continuation key is its (ranking, _id)
+
+    Args:
+        document (dict): Last document of a page in PyMongo format
+
+    Returns:
+        str: Opaque page token
+    """
+    from bson.objectid import ObjectId
+
+    _id = document["_id"]
+    key = [document.get("ranking"), str(_id) if isinstance(_id, ObjectId) else _id, isinstance(_id, ObjectId)]
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_page_token(page_token):
+    """
+    Extracts the continuation key from a page token
+
+    Args:
+        page_token (str): Token returned with the previous page
+
+    Returns:
+        (int, object): Ranking and _id of the last document of the previous page
+
+    Raises:
+        PageTokenError: If the token was not built by encode_page_token
+    """
+    from bson.errors import InvalidId
+    from bson.objectid import ObjectId
+
+    try:
+        ranking, _id, is_object_id = json.loads(base64.urlsafe_b64decode(str(page_token)).decode("utf-8"))
+        return ranking, ObjectId(_id) if is_object_id else _id
+    except (TypeError, ValueError, binascii.Error, InvalidId) as e:
+        raise PageTokenError("Invalid page token %s: %s" % (page_token, e))
+
+
+def after_key_filter(ranking, _id):
+    """
+    Builds the mongodb filter for documents after a continuation key in RANKING_ORDER, null rankings sort first
+
+    Args:
+        ranking (int): Ranking of the continuation key, could be None
+        _id: _id of the continuation key
+
+    Returns:
+        dict: The filter for mongodb queries
+    """
+    if ranking is None:
+        return {"$or": [{"ranking": None, "_id": {"$gt": _id}}, {"ranking": {"$ne": None}}]}
+    return {"$or": [{"ranking": ranking, "_id": {"$gt": _id}}, {"ranking": {"$gt": ranking}}]}
+
+
+def paginate(collection, search, page_size, page_token=None, projection=None):
+    """
+    Reads one page of documents in RANKING_ORDER, resuming after the continuation key of the token instead of
+    skipping documents, so every page costs the same
+
+    Args:
+        collection (Collection): Collection to query
+        search (dict): The filter for mongodb queries
+        page_size (int): Maximum number of documents of the page
+        page_token (str, optional): Token returned with the previous page, None for the first page
+        projection (dict, optional): Fields to read
+
+    Returns:
+        (list of dict, str): Documents of the page and the token of the next page, None if it is the last one
+
+    Raises:
+        PageTokenError: If the token is not valid
+        ValueError: If the page size is not positive
+    """
+    check_page_size(page_size)
+
+    if page_token is not None:
+        after = after_key_filter(*decode_page_token(page_token))
+        search = after if len(search) == 0 else {"$and": [search, after]}
+
+    return split_page(list(collection.find(search, projection).sort(RANKING_ORDER).limit(page_size + 1)), page_size)
+
+
+def check_page_size(page_size):
+    """
+    Checks that a page size is valid
+
+    Args:
+        page_size (int): Maximum number of documents of a page
+
+    Raises:
+        ValueError: If the page size is not positive
+    """
+    if page_size < 1:
+        raise ValueError("Page size must be positive, got %s" % page_size)
+
+
+def split_page(documents, page_size):
+    """
+    Splits the documents of a page from the rest
+
+    Args:
+        documents (list of dict): Documents in RANKING_ORDER, from the first one of the page
+        page_size (int): Maximum number of documents of the page
+
+    Returns:
+        (list of dict, str): Documents of the page and the token of the next page, None if it is the last one
+    """
+    if len(documents) <= page_size:
+        return documents, None
+    documents = documents[:page_size]
+    return documents, encode_page_token(documents[-1])
@@ -0,0 +1,295 @@
+__author__ = 'Herminio'
+
+import logging
+import multiprocessing
+from timeit import default_timer
+
+from infrastructure.errors.errors import AreaRepositoryError
+from .indicator_repository import indicator_document
+from .observation_repository import observation_document
+from .staging import StagingLoad
+from .utils import insert_in_chunks
+
+logger = logging.getLogger(__name__)
+
+INDICATORS_SHEET = "Indicators"
+INDICATOR_COLUMNS = ["indicator", "name", "description", "type", "component", "subindex", "index", "provider_name",
+                     "provider_url", "is_percentage", "scale", "republish"]
+REQUIRED_INDICATOR_COLUMNS = ["indicator", "name", "type"]
+
+
+class SpreadsheetImporter(object):
+    """
+    Imports the index workbook into the database. The workbook has an Indicators sheet, with a header row naming
+    INDICATOR_COLUMNS in any order, and one sheet per indicator named by its code. Each indicator sheet has a header
+    row with ISO3 followed by the years, and one row per country with its values, blank if unknown.
+
+    Note:
+        Sheets are parsed in parallel worker processes, each one opening the workbook on its own. Documents are the
+        ones built by insert_indicator and insert_observation, rankings are computed per indicator and year from
+        higher to lower value. Areas must be already stored. Unless the workbook is reloaded or synced, its
+        indicators and observations must not, as documents are inserted without checking for duplicates.
+    """
+
+    def __init__(self, observation_repository, processes=None, chunk_size=5000):
+        """
+        Constructor for SpreadsheetImporter
+
+        Args:
+            observation_repository (ObservationRepository): Mongodb repository to import into, its indicator and
+                area repositories are used too
+            processes (int, optional): Number of parsing processes, default to the number of CPUs
+            chunk_size (int, optional): Number of documents per insert, default to 5000
+        """
+        self._repository = observation_repository
+        self._processes = processes or multiprocessing.cpu_count()
+        self._chunk_size = chunk_size
+        self._report = {}
+
+    def import_workbook(self, path, provider_name="WF (Web Foundation)", provider_url="http://webfoundation.org/",
+                        reload=False, sync=False):
+        """
+        Parses the workbook, inserts its indicators and observations and enriches the countries
+
+        Args:
+            path (str): Path of the xls workbook
+            provider_name (str, optional): Provider of indicators without one, default to the Web Foundation
+            provider_url (str, optional): Provider URL of indicators without one, default to the Web Foundation one
+            reload (bool, optional): True to replace every indicator and observation with the workbook ones, they are
+                loaded into staging collections and swapped in once indexed, so readers never see a partial load.
+                Default to False, to insert into the live collections
+            sync (bool, optional): True to write just the indicators and observations that changed since the last
+                import, see ObservationRepository.sync_observations, the sync counts are reported in the
+                sync_observations stage. Default to False
+
+        Returns:
+            dict: Stage name, and total, to a dictionary with seconds and number of items, see report
+
+        Raises:
+            ValueError: If the Indicators sheet or any of its required columns is missing
+            AreaRepositoryError: If any country of the workbook is not stored, nothing is inserted then
+        """
+        start = default_timer()
+        self._report = {}
+        url_root = self._repository._url_root
+
+        indicator_rows = self._stage("indicators_sheet", lambda: _read_sheet((path, INDICATORS_SHEET))[1])
+        indicators = self._stage("indicator_documents", lambda: [
+            _indicator_document(row, url_root, provider_name, provider_url) for row in _indicator_rows(indicator_rows)])
+        indicators_by_code = dict((indicator["indicator"], indicator) for indicator in indicators)
+
+        sheets = self._stage("parse", lambda: self._parse_sheets(path, indicators_by_code))
+        observations = self._stage("observation_documents",
+                                   lambda: self._observation_documents(sheets, indicators_by_code))
+
+        if reload:
+            self._reload(indicators, observations)
+        elif sync:
+            self._stage("upsert_indicators", lambda: self._repository._indicator.upsert_indicators(indicators))
+            self._stage("sync_observations", lambda: self._repository.sync_observations(observations))
+            self._repository.invalidate_caches()
+        else:
+            self._stage("insert_indicators",
+                        lambda: self._repository._indicator.insert_indicators(indicators, self._chunk_size))
+            self._stage("insert_observations",
+                        lambda: self._repository.insert_observations(observations, self._chunk_size))
+            self._repository.invalidate_caches()
+        self._stage("enrich_countries", lambda: self._repository._area.enrich_countries())
+
+        self._report["total"] = {"seconds": default_timer() - start, "items": len(observations)}
+        logger.info("Workbook %s imported in %.1f s", path, self._report["total"]["seconds"])
+        return self.report()
+
+    def report(self):
+        """
+        Returns the timing of each stage of the last import
+
+        Returns:
+            dict: Stage name, and total, to a dictionary with seconds and items
+        """
+        return dict((stage, dict(result)) for stage, result in self._report.items())
+
+    def _stage(self, name, function):
+        start = default_timer()
+        result = function()
+        if isinstance(result, dict):  # counts by kind, they are reported too
+            self._report[name] = dict(result, items=sum(result.values()))
+        else:
+            self._report[name] = {"items": result if isinstance(result, int) else len(result)}
+        self._report[name]["seconds"] = default_timer() - start
+        logger.info("Import stage %s: %d items in %.1f ms", name, self._report[name]["items"],
+                    self._report[name]["seconds"] * 1000)
+        return result
+
+    def _reload(self, indicators, observations):
+        staging = StagingLoad(self._repository._db, ["indicators", "observations"])
+        try:
+            self._stage("insert_indicators",
+                        lambda: insert_in_chunks(staging.collection("indicators"), indicators, self._chunk_size))
+            self._stage("insert_observations",
+                        lambda: insert_in_chunks(staging.collection("observations"), observations, self._chunk_size))
+            self._stage("build_indexes", staging.build_indexes)
+        except Exception:
+            staging.abort()
+            raise
+        self._stage("swap", staging.swap)
+        self._repository.invalidate_caches()
+
+    def _parse_sheets(self, path, indicators_by_code):
+        import xlrd
+
+        book = xlrd.open_workbook(path, on_demand=True)
+        try:
+            names = [name for name in book.sheet_names() if name in indicators_by_code]
+        finally:
+            book.release_resources()
+
+        tasks = [(path, name) for name in names]
+        processes = min(self._processes, len(tasks))
+        if processes <= 1:
+            return [_parse_observation_sheet(task) for task in tasks]
+
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(_parse_observation_sheet, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _observation_documents(self, sheets, indicators_by_code):
+        areas = self._repository._local_areas()
+        unknown = sorted(set(iso3 for _, rows in sheets for iso3, _, _ in rows if iso3 not in areas))
+        if len(unknown) > 0:
+            raise AreaRepositoryError("No area with code " + ", ".join(unknown))
+
+        url_root = self._repository._url_root
+        documents = []
+        for code, rows in sheets:
+            indicator = indicators_by_code[code]
+            rankings = _rankings(rows)
+            for iso3, year, value in rows:
+                area = areas[iso3]
+                documents.append(observation_document(
+                    value, year, observation_uri="%sobservations/%s/%s/%s" % (url_root, code, iso3, year),
+                    area_iso3_code=iso3, area_name=area.get("name"), area_code=area.get("area"),
+                    short_name=area.get("short_name"), area_type=area.get("type"), indicator_code=code,
+                    indicator_name=indicator["name"], indicator_type=indicator["type"],
+                    republish=indicator["republish"], provider_name=indicator["provider_name"],
+                    provider_url=indicator["provider_url"], ranking=rankings.get((iso3, year))))
+        return documents
+
+
+def _read_sheet(task):
+    """
+    Reads the cell values of a sheet, run in worker processes
+
+    Args:
+        task ((str, str)): Workbook path and sheet name
+
+    Returns:
+        (str, list of list): Sheet name and its rows of cell values
+    """
+    import xlrd
+
+    path, name = task
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        if name not in book.sheet_names():
+            raise ValueError("Workbook %s has no %s sheet" % (path, name))
+        sheet = book.sheet_by_name(name)
+        return name, [sheet.row_values(row) for row in range(sheet.nrows)]
+    finally:
+        book.release_resources()
+
+
+def _parse_observation_sheet(task):
+    """
+    Parses an indicator sheet into observation values, run in worker processes
+
+    Args:
+        task ((str, str)): Workbook path and sheet name
+
+    Returns:
+        (str, list of (str, str, float or str)): Sheet name and the iso3, year and value of each cell, value is blank
+            if unknown
+    """
+    name, rows = _read_sheet(task)
+    if len(rows) == 0:
+        return name, []
+
+    years = [_text(year) for year in rows[0][1:]]
+    observations = []
+    for row in rows[1:]:
+        iso3 = _text(row[0]).upper()
+        if iso3 == "":
+            continue
+        for year, value in zip(years, row[1:]):
+            if year != "":
+                observations.append((iso3, year, value if isinstance(value, float) else ""))
+    return name, observations
+
+
+def _indicator_rows(rows):
+    if len(rows) == 0:
+        raise ValueError("Sheet %s is empty" % INDICATORS_SHEET)
+
+    header = [_text(cell).lower().replace(" ", "_") for cell in rows[0]]
+    missing = [column for column in REQUIRED_INDICATOR_COLUMNS if column not in header]
+    if len(missing) > 0:
+        raise ValueError("Sheet %s has no %s column" % (INDICATORS_SHEET, ", ".join(missing)))
+
+    for row in rows[1:]:
+        values = dict((column, value) for column, value in zip(header, row) if column in INDICATOR_COLUMNS)
+        if _text(values["indicator"]) != "":
+            yield values
+
+
+def _indicator_document(row, url_root, provider_name, provider_url):
+    code = _text(row["indicator"])
+    return indicator_document(
+        code, _text(row["name"]), _text(row.get("description")) or None, _text(row["type"]),
+        _flag(row.get("republish"), True), indicator_uri="%sindicators/%s" % (url_root, code),
+        component_name=_text(row.get("component")) or None, subindex_name=_text(row.get("subindex")) or None,
+        index_name=_text(row.get("index")) or None, provider_name=_text(row.get("provider_name")) or provider_name,
+        provider_url=_text(row.get("provider_url")) or provider_url,
+        is_percentage=_flag(row.get("is_percentage"), None), scale=_text(row.get("scale")) or None)
+
+
+def _rankings(rows):
+    """
+    Ranks the known values of each year from higher to lower, starting at 1
+
+    Args:
+        rows (list of (str, str, float or str)): Iso3, year and value of each observation
+
+    Returns:
+        dict: (iso3, year) to its ranking, observations without value are not ranked
+    """
+    rankings = {}
+    known = sorted([(year, -value, iso3) for iso3, year, value in rows if value != ""])
+    position, current_year = 0, None
+    for year, _, iso3 in known:
+        position = position + 1 if year == current_year else 1
+        current_year = year
+        rankings[(iso3, year)] = position
+    return rankings
+
+
+def _text(cell):
+    """
+    Returns a cell as text, numbers without decimals are written as integers, e.g.: 2014.0 is "2014"
+    """
+    if cell is None:
+        return ""
+    if isinstance(cell, float):
+        return str(int(cell)) if cell.is_integer() else str(cell)
+    if isinstance(cell, int):  # boolean cells
+        return str(cell)
+    return cell.strip()
+
+
+def _flag(cell, default):
+    text = _text(cell).lower()
+    if text == "":
+        return default
+    return text in ("1", "yes", "y", "true")
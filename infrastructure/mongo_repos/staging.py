@@ -0,0 +1,80 @@
+__author__ = 'Herminio'
+
+import logging
+
+from .indexes import ensure_collection_indexes
+
+logger = logging.getLogger(__name__)
+
+STAGING_SUFFIX = "_staging"
+
+
+class StagingLoad(object):
+    """
+    Loads whole collections into staging copies that readers do not see, then swaps them in. Staging collections
+    are indexed once after the load, instead of updating live indexes on every insert, and each one replaces its
+    live collection with an atomic rename.
+
+    Note:
+        Each collection is swapped atomically, so readers see either its old or its new documents, collections are
+        swapped one after another.
+    """
+
+    def __init__(self, db, collections):
+        """
+        Constructor for StagingLoad, previous staging copies of the collections are dropped
+
+        Args:
+            db (Database): Database where the collections are
+            collections (list of str): Names of the live collections to replace
+        """
+        self._db = db
+        self._collections = list(collections)
+        self.abort()
+
+    def collection(self, name):
+        """
+        Returns the staging copy of a collection to load into
+
+        Args:
+            name (str): Name of the live collection
+
+        Returns:
+            Collection: Staging collection
+
+        Raises:
+            ValueError: If the collection is not one of the staged ones
+        """
+        if name not in self._collections:
+            raise ValueError("Collection %s is not staged" % name)
+        return self._db[name + STAGING_SUFFIX]
+
+    def build_indexes(self):
+        """
+        Builds the indexes of every staging collection once they are loaded
+
+        Returns:
+            int: Number of collections indexed
+        """
+        for name in self._collections:
+            ensure_collection_indexes(self.collection(name), name)
+        return len(self._collections)
+
+    def swap(self):
+        """
+        Renames every staging collection to its live name, dropping the live one
+
+        Returns:
+            int: Number of collections swapped
+        """
+        for name in self._collections:
+            self.collection(name).rename(name, dropTarget=True)
+            logger.info("Collection %s swapped in", name)
+        return len(self._collections)
+
+    def abort(self):
+        """
+        Drops every staging collection, live collections are left as they were
+        """
+        for name in self._collections:
+            self._db[name + STAGING_SUFFIX].drop()
@@ -1,5 +1,7 @@
 __author__ = 'guillermo'
 
+import hashlib
+import json
 import random
 
 
@@ -31,9 +33,116 @@ def normalize_group_name(original):
         return result
 
 
+def normalize_area_type(area_type):
+    """
+    Returns the canonical form of an area type or country type, e.g.: DEVELOPING becomes Developing
+
+    Args:
+        area_type (str): Area type in any case, could be None
+
+    Returns:
+        str: Title case area type, None if area_type is None
+    """
+    return None if area_type is None else area_type.strip().title()
+
+
+def normalize_income(income):
+    """
+    Returns the canonical form of an income code, e.g.: lmc becomes LMC
+
+    Args:
+        income (str): Income code in any case, could be None
+
+    Returns:
+        str: Upper case income code, None if income is None
+    """
+    return None if income is None else income.strip().upper()
+
+
+def parse_years(year):
+    """
+    Parses a year literal into the list of years it stands for
+
+    Args:
+        year (str): Year or years divided by ',', each one could be an interval, e.g.: 2012,2014-2016
+
+    Returns:
+        list of str: Years, invalid ones are ignored
+    """
+    year_list = []
+
+    for year in year.strip().split(","):
+        interval = year.split("-")
+
+        if len(interval) == 1 and interval[0].isdigit():
+            year_list.append(interval[0])
+        elif len(interval) == 2 and interval[0].isdigit() and interval[1].isdigit():
+            for i in range(int(interval[0]), int(interval[1]) + 1):
+                year_list.append(str(i))
+
+    return year_list
+
+
 def random_int(first, last):
     return random.randint(first, last)
 
 
 def random_float(first, last):
     return random.random() * (first - last) + first + 1
+
+
+def insert_in_chunks(collection, documents, chunk_size=5000):
+    """
+    Inserts documents with one insert per chunk, documents are read lazily so just one chunk is kept in memory
+
+    Args:
+        collection (Collection): Collection to insert into
+        documents (iterable of dict): Documents to insert
+        chunk_size (int, optional): Number of documents per insert, default to 5000
+
+    Returns:
+        int: Number of documents inserted
+    """
+    total, chunk = 0, []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) == chunk_size:
+            collection.insert(chunk)
+            total, chunk = total + len(chunk), []
+    if len(chunk) > 0:
+        collection.insert(chunk)
+        total += len(chunk)
+    return total
+
+
+def content_hash(document):
+    """
+    Returns a hash of the content of a document, _id and content_hash fields are left out, so equal documents
+    stored twice have the same hash
+
+    Args:
+        document (dict): Document in PyMongo format
+
+    Returns:
+        str: Hexadecimal md5 digest
+    """
+    content = dict((key, value) for key, value in document.items() if key not in ("_id", "content_hash"))
+    return hashlib.md5(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def fields_projection(fields, required=()):
+    """
+    Builds the projection reading just the given fields, _id is read only if it is one of them
+
+    Args:
+        fields (list of str): Fields to read, None to read every field
+        required (list of str, optional): Fields read even if they are not in fields
+
+    Returns:
+        dict: Projection for mongodb queries, None to read every field
+    """
+    if fields is None:
+        return None
+    projection = dict((field, 1) for field in list(fields) + list(required))
+    projection["_id"] = 1 if "_id" in projection else 0
+    return projection
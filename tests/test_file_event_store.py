@@ -0,0 +1,103 @@
+__author__ = 'Herminio'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from a4ai.domain.model.area.country import create_country
+from a4ai.domain.model.indicator.indicator import create_indicator
+from a4ai.domain.model.observation.observation import create_observation
+from infrastructure.errors.errors import EventStoreError
+from infrastructure.event_store.file_event_store import FileEventStore
+
+
+class FileEventStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "events.log")
+        self.store = FileEventStore(self.path, batch_size=2, snapshot_every=3)
+        self.store.subscribe()
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_aggregate_is_rebuilt_from_snapshot_and_events(self):
+        country = create_country(id="ESP", name="Spain", iso3="ESP")
+        observation = create_observation(id="obs", indicator="ABC", area="ESP", value=2.0, year="2014")
+        for _ in range(7):
+            observation.reference_area(country)
+
+        loaded = self.store.load("obs")
+        self.assertEqual(observation.version, loaded.version)
+        self.assertEqual(2.0, loaded.value)
+        self.assertEqual("ESP", loaded._ref_area_id)
+
+    def test_reopened_log_drops_truncated_record(self):
+        country = create_country(id="ESP", name="Spain", iso3="ESP")
+        observation = create_observation(id="obs", indicator="ABC", area="ESP", value=2.0, year="2014")
+        observation.reference_area(country)
+        self.store.close()
+        with open(self.path, "ab") as log:
+            log.write(b"\x00\x03\x00truncated")
+
+        self.store = FileEventStore(self.path, batch_size=2, snapshot_every=3)
+        self.assertEqual(2, self.store.load("obs").version)
+        self.assertEqual(3, sum(1 for _ in self.store.events()))
+
+    def test_unknown_aggregate_is_not_loaded(self):
+        self.assertRaises(EventStoreError, self.store.load, "unknown")
+
+
+    def test_document_hydrated_repeatedly_is_loaded(self):
+        for name in ["First", "Second", "Third", "Fourth", "Fifth"]:
+            create_indicator(id="abc", indicator="ABC", name=name)
+
+        indicator = self.store.load("abc")
+        self.assertEqual("Fifth", indicator.name)
+        self.assertEqual(1, indicator.version)
+
+    def test_events_after_latest_creation_are_replayed(self):
+        country = create_country(id="ESP", name="Spain", iso3="ESP")
+        for _ in range(4):
+            create_observation(id="obs", indicator="ABC", area="ESP", value=1.0, year="2014")
+        observation = create_observation(id="obs", indicator="ABC", area="ESP", value=2.0, year="2014")
+        observation.reference_area(country)
+
+        loaded = self.store.load("obs")
+        self.assertEqual(2.0, loaded.value)
+        self.assertEqual(2, loaded.version)
+
+        self.store.close()
+        self.store = FileEventStore(self.path, batch_size=2, snapshot_every=3)
+        self.assertEqual(2, self.store.load("obs").version)
+
+    def test_failed_snapshot_does_not_escape_publish(self):
+        country = create_country(id="ESP", name="Spain", iso3="ESP")
+        first = create_observation(id="obs", indicator="ABC", area="ESP", value=1.0, year="2014")
+        second = create_observation(id="obs", indicator="ABC", area="ESP", value=1.0, year="2014")
+        first.reference_area(country)
+        second.reference_area(country)  # same version as the previous event, the snapshot fails
+
+        self.assertEqual(5, sum(1 for _ in self.store.events()))
+        self.assertIn("obs", self.store.inconsistent_aggregates())
+        self.assertRaises(EventStoreError, self.store.load, "obs")
+
+    def test_inconsistent_aggregate_is_loaded_once_created_again(self):
+        country = create_country(id="ESP", name="Spain", iso3="ESP")
+        first = create_observation(id="obs", indicator="ABC", area="ESP", value=1.0, year="2014")
+        second = create_observation(id="obs", indicator="ABC", area="ESP", value=1.0, year="2014")
+        first.reference_area(country)
+        second.reference_area(country)
+        for _ in range(3):
+            second.reference_area(country)  # no snapshot is tried again
+
+        create_observation(id="obs", indicator="ABC", area="ESP", value=3.0, year="2014")
+        self.assertEqual({}, self.store.inconsistent_aggregates())
+        self.assertEqual(3.0, self.store.load("obs").value)
+
+
+if __name__ == '__main__':
+    unittest.main()
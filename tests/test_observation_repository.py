@@ -0,0 +1,65 @@
+__author__ = 'Herminio'
+
+import unittest
+import uuid
+
+try:
+    import mongomock
+except ImportError:  # tests needing a database are skipped
+    mongomock = None
+
+from infrastructure.mongo_repos.instrumentation import QueryRecorder, instrument_repository
+from infrastructure.mongo_repos.observation_repository import ObservationRepository, observation_document
+
+
+def observations_database():
+    db = mongomock.MongoClient()["a4ai_test_%s" % uuid.uuid4().hex]  # clients could share their databases
+    db["areas"].insert([{"iso3": iso3, "name": iso3, "short_name": iso3, "area": "Africa", "income": "LIC",
+                         "type": "Developing"} for iso3 in ["AAA", "BBB"]])
+    db["indicators"].insert([{"indicator": "IND_000", "name": "Indicator", "type": "Primary"}])
+    db["observations"].insert([observation_document(
+        value, "2014", area_iso3_code=iso3, area_name=iso3, area_code="Africa", short_name=iso3,
+        area_type="Developing", indicator_code="IND_000", indicator_name="Indicator", indicator_type="Primary",
+        ranking=ranking) for iso3, value, ranking in [("AAA", 2.0, 1), ("BBB", 1.0, 2)]])
+    return db
+
+
+@unittest.skipIf(mongomock is None, "mongomock is not installed")
+class PreloadedObservationsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = ObservationRepository(url_root="http://localhost/", db=observations_database())
+
+    def test_updated_ranking_is_not_served_from_preloaded_observations(self):
+        self.repository.preload_observations("IND_000", "2014")
+        first = self.repository.find_observations(indicator_code="IND_000", year="2014")[0]
+
+        self.repository.update_observation_ranking(first, 99)
+
+        observations = self.repository.find_observations(indicator_code="IND_000", year="2014")
+        self.assertEqual(["BBB", "AAA"], [observation.area for observation in observations])
+        self.assertEqual(99, observations[1].ranking)
+
+
+@unittest.skipIf(mongomock is None, "mongomock is not installed")
+class InstrumentedRepositoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.recorder = QueryRecorder()
+        self.repository = instrument_repository(
+            ObservationRepository(url_root="http://localhost/", db=observations_database()), self.recorder)
+
+    def test_streamed_queries_are_attributed_to_the_stream_call(self):
+        stream = self.repository.stream_observations(indicator_code="IND_000")
+        self.assertEqual({}, self.recorder.statistics())
+
+        self.assertEqual(2, len(list(stream)))
+
+        statistics = self.recorder.statistics()
+        self.assertEqual(["ObservationRepository.stream_observations"], list(statistics))
+        self.assertEqual(1, statistics["ObservationRepository.stream_observations"]["calls"])
+        self.assertTrue(statistics["ObservationRepository.stream_observations"]["queries"] > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
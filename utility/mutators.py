@@ -1,5 +1,10 @@
+import threading
+from collections import OrderedDict
+
 from singledispatch import singledispatch
 
+from infrastructure.errors.exceptions import ConsistencyError
+
 
 # =======================================================================================
 # Mutators - all aggregate creation and mutation is performed by the generic when()
@@ -15,3 +20,124 @@ def when(event):
 
     Dispatch on the type of the first arg, hence (event, self) """
     raise NotImplementedError("No _when() implementation for {!r}".format(event))
+
+
+# =======================================================================================
+# Replay - rebuild aggregates from event streams, the when() implementation of each event
+# type is resolved once per replay instead of once per event.
+# =======================================================================================
+def replay(events, obj=None):
+    """Rebuild an aggregate by replaying its events.
+
+    Originator ids and versions of every event are validated before any event is
+    applied, so an inconsistent stream leaves obj untouched, and the when()
+    implementations do not validate each event again.
+
+    Args:
+        events: Iterable of the events of one aggregate, in version order.
+        obj: The aggregate to apply the events to, e.g.: a snapshot. If None the
+            first event must be the one creating the aggregate.
+
+    Returns:
+        The aggregate with every event applied.
+
+    Raises:
+        ConsistencyError: If an event belongs to another aggregate or its version
+            does not follow the previous one.
+    """
+    events = list(events)
+    handlers = {}
+    if obj is None:
+        if len(events) == 0:
+            raise ConsistencyError("No events to create an aggregate from")
+        obj = _handler(handlers, events[0])(events[0])
+        events = events[1:]
+    return _apply_all(handlers, obj, events)
+
+
+def replay_all(events, aggregates=None):
+    """Rebuild many aggregates from one event stream in a single pass.
+
+    Events are routed to their aggregates as they are read, events with
+    originator_version 0 create new aggregates, as the factories emit them. The
+    events of each aggregate are then validated at once and applied.
+
+    The factories are called again each time a stored aggregate is read, so the
+    same id could be created many times. A new creation restarts the stream of
+    its aggregate, the aggregate given for it, if any, and the events queued
+    before the creation are dropped.
+
+    Args:
+        events: Iterable of the events of any aggregates, in version order for
+            each of them.
+        aggregates: Optional dictionary of aggregate id to the aggregate to apply
+            its events to, e.g.: snapshots. It is not modified.
+
+    Returns:
+        An OrderedDict of aggregate id to the rebuilt aggregate, given aggregates
+        first and then new ones in order of their latest creation.
+
+    Raises:
+        ConsistencyError: If an event belongs to an unknown aggregate or its
+            version does not follow the previous one of its aggregate.
+    """
+    handlers = {}
+    streams = OrderedDict((aggregate_id, (obj, [])) for aggregate_id, obj in (aggregates or {}).items())
+    for event in events:
+        stream = streams.get(event.originator_id)
+        if stream is not None:
+            stream[1].append(event)
+        elif event.originator_version == 0:
+            obj = _handler(handlers, event)(event)
+            streams.pop(obj.id, None)  # created again, see above
+            streams[obj.id] = (obj, [])
+        else:
+            raise ConsistencyError("Event for unknown aggregate: {!r}".format(event))
+
+    return OrderedDict((aggregate_id, _apply_all(handlers, obj, stream_events))
+                       for aggregate_id, (obj, stream_events) in streams.items())
+
+
+def validated_by_replay():
+    """True while replay applies events of this thread it has already validated.
+
+    Entity.validate_event_originator does not check each event again then.
+    """
+    return getattr(_replaying, "validated", False)
+
+
+_replaying = threading.local()
+
+
+def _apply_all(handlers, obj, events):
+    if len(events) == 0:
+        return obj
+    if obj.discarded:
+        raise ConsistencyError("Event {!r} for a discarded aggregate".format(events[0]))
+
+    _validate_originators(events, obj.id, obj.version)
+    previous, _replaying.validated = validated_by_replay(), True
+    try:
+        for event in events:
+            obj = _handler(handlers, event)(event, obj)
+    finally:
+        _replaying.validated = previous
+    return obj
+
+
+def _handler(handlers, event):
+    event_type = type(event)
+    handler = handlers.get(event_type)
+    if handler is None:
+        handler = handlers[event_type] = when.dispatch(event_type)
+    return handler
+
+
+def _validate_originators(events, originator_id, version):
+    for expected_version, event in enumerate(events, version):
+        if event.originator_id != originator_id:
+            raise ConsistencyError("Event originator id mismatch: {} != {}".
+                                   format(event.originator_id, originator_id))
+        if event.originator_version != expected_version:
+            raise ConsistencyError("Event originator version mismatch: {} != {}".
+                                   format(event.originator_version, expected_version))
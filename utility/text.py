@@ -0,0 +1,77 @@
+__author__ = 'Herminio'
+
+import unicodedata
+
+
+def fold(text):
+    """
+    Folds a text for case and accent insensitive comparisons: accents are removed, letters are lowered and
+    whitespace is collapsed, e.g.: "  Cafe  AU lait" with an acute accent on the first e becomes "cafe au lait"
+
+    Args:
+        text (str): Text to fold, utf-8 if it is not unicode
+
+    Returns:
+        unicode: Folded text, None if text is None
+    """
+    if text is None:
+        return None
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    decomposed = unicodedata.normalize("NFKD", text)
+    return u" ".join(u"".join(char for char in decomposed if not unicodedata.combining(char)).lower().split())
+
+
+def split_aliases(search):
+    """
+    Splits a search field of ';' separated names
+
+    Args:
+        search (str): Names divided by ';', could be None
+
+    Returns:
+        list of str: Non blank names
+    """
+    if search is None:
+        return []
+    return [alias.strip() for alias in search.split(";") if alias.strip() != ""]
+
+
+try:
+    _TEXT_TYPES = (str, unicode)
+except NameError:  # python 3
+    _TEXT_TYPES = (str,)
+
+_interned = {}
+MAX_INTERNED = 100000
+
+
+def is_text(value):
+    """
+    Returns True if the value is a text, str or unicode on python 2
+    """
+    return isinstance(value, _TEXT_TYPES)
+
+
+def intern_text(text):
+    """
+    Returns the shared copy of a text, equal texts interned before are the same object, so low cardinality values,
+    e.g.: provider or area names, are stored once however many entities hold them
+
+    Note:
+        Once MAX_INTERNED texts are shared new ones are returned as they are, so high cardinality values passed by
+        mistake do not grow the shared dictionary forever
+    Args:
+        text (str): Text to intern, values which are not texts, as None, are returned as they are
+
+    Returns:
+        str: Shared copy of the text
+    """
+    if not is_text(text):
+        return text
+    shared = _interned.get(text)
+    if shared is None:
+        if len(_interned) >= MAX_INTERNED:
+            return text
+        shared = _interned.setdefault(text, text)
+    return shared
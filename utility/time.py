@@ -3,5 +3,3 @@ import datetime
 
 def utc_now():
     return datetime.datetime.time(datetime.datetime.utcnow())
-
-print(utc_now())
\ No newline at end of file